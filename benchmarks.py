@@ -0,0 +1,345 @@
+# benchmarks.py
+"""
+Benchmark harness for the hot paths, on synthetic data (no network, models or
+dataset needed):
+
+  risk    compute_daily_risks_from_owm (python/numpy engines) and
+          compute_daily_risks_batch over N locations × 40 3-hourly buckets
+  api     /recommend and /list_diseases latency percentiles via TestClient,
+          over a synthetic processed.jsonl-shaped corpus (compiled + mmapped)
+  ingest  clean_sources (clean_text + KeywordTagger) and chunk.chunk_text rates
+  image   per-stage leaf preprocessing and lesion heatmap time
+
+    python benchmarks.py --suite risk api --out bench.json
+    python benchmarks.py --out new.json --compare bench.json
+
+Results are JSON ({"meta": ..., "results": {suite: {case: metrics}}}) so runs
+can be diffed; --compare prints the ratio for every shared timing metric and
+flags regressions above --tolerance.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, List
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+NLP_DIR = os.path.join(REPO_DIR, "nlp_layer")
+
+SUITES = ("risk", "api", "ingest", "image")
+DISEASES = ["late blight", "early blight", "bacterial spot", "leaf curl virus", "aphids", "healthy"]
+ACTIONS = ["spray", "irrigation", "fertilizer", "other"]
+WORDS = ("leaf crop soil fungicide spray copper mancozeb yield irrigation potato tomato "
+         "lesion spot blight virus vector aphid whitefly humidity rain temperature field "
+         "farmer advisory dose water week early late severe monitor sanitation").split()
+
+# ---------------------------
+# Timing helpers
+# ---------------------------
+
+def timed(fn: Callable, repeat: int = 5, number: int = 1) -> Dict[str, float]:
+    """Best/median seconds per call over `repeat` rounds of `number` calls."""
+    fn()  # warm-up
+    rounds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - t0) / number)
+    return {"best_s": min(rounds), "median_s": float(np.median(rounds))}
+
+def latencies(fn: Callable, n: int = 200) -> Dict[str, float]:
+    fn()
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {"p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99),
+            "mean_ms": float(np.mean(samples))}
+
+# ---------------------------
+# Synthetic data
+# ---------------------------
+
+def synth_forecast(rng: random.Random, buckets: int = 40, start: datetime = datetime(2025, 9, 4)) -> List[dict]:
+    """One OWM /forecast `list` (3-hourly buckets)."""
+    out = []
+    for k in range(buckets):
+        item = {
+            "dt_txt": (start + timedelta(hours=3 * k)).strftime("%Y-%m-%d %H:%M:%S"),
+            "main": {"temp": round(rng.uniform(12, 38), 2), "humidity": rng.randint(35, 100)},
+            "wind": {"speed": round(rng.uniform(0, 9), 2)},
+        }
+        if rng.random() < 0.35:
+            item["rain"] = {"3h": round(rng.expovariate(1.0), 2)}
+        out.append(item)
+    return out
+
+def synth_forecasts(n: int, buckets: int = 40, seed: int = 0) -> Dict[str, List[dict]]:
+    rng = random.Random(seed)
+    return {f"loc{i}": synth_forecast(rng, buckets) for i in range(n)}
+
+def synth_text(rng: random.Random, n_words: int, keywords=()) -> str:
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    for kw in keywords:
+        words[rng.randrange(n_words)] = kw
+    return " ".join(words)
+
+def synth_corpus(n_docs: int, words_per_doc: int = 300, seed: int = 0) -> List[dict]:
+    """Records shaped like nlp_layer/data/processed.jsonl."""
+    rng = random.Random(seed)
+    return [{
+        "id": f"doc{i}_0",
+        "title": f"Advisory {i}",
+        "text": synth_text(rng, words_per_doc),
+        "summary_en": synth_text(rng, 40),
+        "summary_hi": "",
+        "diseases": rng.choice(DISEASES),
+        "region": "India",
+        "language": "en",
+        "action_type": rng.choice(ACTIONS),
+    } for i in range(n_docs)]
+
+def synth_sources(n_docs: int, words_per_doc: int = 2000, keywords=(), seed: int = 0) -> List[str]:
+    """Raw extracted PDF text: ragged whitespace, "Page N" markers, keyword hits."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n_docs):
+        words = synth_text(rng, words_per_doc, rng.sample(list(keywords), min(2, len(keywords)))).split()
+        for p in range(1, words_per_doc // 400 + 1):
+            words.insert(rng.randrange(len(words)), f"Page {p}")
+        texts.append(rng.choice(["  ", "\n", " \t "]).join(words))
+    return texts
+
+def synth_leaves(n: int, size: int = 512, seed: int = 0) -> List[np.ndarray]:
+    """Green elliptical leaf with brown lesions on a skin/soil-coloured background."""
+    import cv2
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        a = np.empty((size, int(size * 1.33), 3), np.uint8)
+        a[:] = rng.integers(60, 200, 3)
+        h, w = a.shape[:2]
+        cv2.ellipse(a, (w // 2, h // 2), (int(w * 0.35), int(h * 0.4)), int(rng.integers(0, 180)),
+                    0, 360, tuple(int(c) for c in rng.integers([20, 110, 20], [70, 190, 70])), -1)
+        for _ in range(int(rng.integers(2, 8))):
+            center = (int(rng.integers(w * 0.3, w * 0.7)), int(rng.integers(h * 0.3, h * 0.7)))
+            cv2.circle(a, center, int(rng.integers(size // 40, size // 12)), (120, 80, 30), -1)
+        noise = rng.integers(-12, 12, a.shape)
+        out.append(np.clip(a.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return out
+
+# ---------------------------
+# Suites
+# ---------------------------
+
+def bench_risk(args) -> Dict[str, dict]:
+    from risk_rules import compute_daily_risks_batch, compute_daily_risks_from_owm
+
+    forecasts = synth_forecasts(args.locations, args.buckets, args.seed)
+    one = next(iter(forecasts.values()))
+    res = {}
+    for engine in ("python", "numpy"):
+        t = timed(lambda: compute_daily_risks_from_owm(one, engine=engine), args.repeat, 50)
+        res[f"single_{engine}"] = {**t, "locations_per_s": 1.0 / t["best_s"]}
+    for engine in ("python", "numpy"):
+        t = timed(lambda: compute_daily_risks_batch(forecasts, engine=engine, min_pool_size=10 ** 9),
+                  args.repeat)
+        res[f"batch_{engine}_inprocess"] = {**t, "locations": args.locations,
+                                            "locations_per_s": args.locations / t["best_s"]}
+    if args.locations >= 512:
+        t = timed(lambda: compute_daily_risks_batch(forecasts), max(1, args.repeat // 2))
+        res["batch_pool"] = {**t, "locations": args.locations, "locations_per_s": args.locations / t["best_s"]}
+    return res
+
+def bench_api(args) -> Dict[str, dict]:
+    sys.path.insert(0, os.path.join(NLP_DIR, "api"))
+    sys.path.insert(0, os.path.join(NLP_DIR, "scripts"))
+    import tempfile
+    from corpus_store import CorpusStore, compile_corpus
+
+    corpus = synth_corpus(args.docs, args.doc_words, args.seed)
+    res = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "processed.corpus")
+        t0 = time.perf_counter()
+        compile_corpus(corpus, path)
+        res["corpus_compile"] = {"seconds": time.perf_counter() - t0, "bytes": os.path.getsize(path)}
+        # main2 loads its corpus at import: point it at the synthetic one, never nlp_layer/data
+        os.environ["NLP_DATA_DIR"] = tmp
+        import main2
+        t0 = time.perf_counter()
+        store = CorpusStore(path)
+        res["corpus_open"] = {"seconds": time.perf_counter() - t0, "docs": len(store)}
+        t0 = time.perf_counter()
+        index = main2.SearchIndex(store)
+        res["index_build"] = {"seconds": time.perf_counter() - t0, "docs": len(store)}
+        main2.data, main2.index = store, index  # also when main2 was imported earlier
+        _api_latencies(main2, args, res)
+    return res
+
+def _api_latencies(main2, args, res):
+    from fastapi.testclient import TestClient
+    client = TestClient(main2.app)
+    rng = random.Random(1)
+    cases = {
+        "list_diseases": lambda: client.get("/list_diseases"),
+        "recommend_disease": lambda: client.get("/recommend", params={"disease": rng.choice(DISEASES)}),
+        "recommend_q": lambda: client.get("/recommend", params={
+            "q": " ".join(rng.sample(WORDS, 3)), "limit": 10}),
+        "recommend_disease_q": lambda: client.get("/recommend", params={
+            "disease": rng.choice(DISEASES), "q": " ".join(rng.sample(WORDS, 2))}),
+    }
+    for name, fn in cases.items():
+        res[name] = latencies(fn, args.requests)
+
+def bench_ingest(args) -> Dict[str, dict]:
+    sys.path.insert(0, os.path.join(NLP_DIR, "scripts"))
+    from chunk import chunk_text
+    from clean_sources import KeywordTagger, clean_text, load_mappings
+
+    mappings = load_mappings()
+    tagger = KeywordTagger(mappings)
+    texts = synth_sources(args.sources, args.source_words, [m["keyword"] for m in mappings], args.seed)
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    words = sum(len(t.split()) for t in texts)
+
+    def clean_all():
+        for t in texts:
+            tagger.tag(clean_text(t))
+
+    cleaned = [clean_text(t) for t in texts]
+
+    def chunk_all():
+        for t in cleaned:
+            for _ in chunk_text(t):
+                pass
+
+    res = {}
+    t = timed(clean_all, args.repeat)
+    res["clean_and_tag"] = {**t, "docs_per_s": len(texts) / t["best_s"], "mb_per_s": mb / t["best_s"]}
+    t = timed(chunk_all, args.repeat)
+    res["chunk"] = {**t, "docs_per_s": len(texts) / t["best_s"], "words_per_s": words / t["best_s"]}
+    return res
+
+def bench_image(args) -> Dict[str, dict]:
+    import leaf_transforms as lt
+    from lesion_heatmap import lesion_heatmap_batch
+
+    S = 256
+    raw = synth_leaves(args.images, args.image_size, args.seed)
+    sized = [lt.resize_square(a, S) for a in raw]
+    masks = [lt.leaf_box(a)[1] for a in sized]
+    masks = [m if m is not None else np.zeros((S, S), np.uint8) for m in masks]
+
+    def per_image(fn, items):
+        def run():
+            for it in items:
+                fn(it)
+        t = timed(run, args.repeat)
+        return {"ms_per_image": 1000 * t["best_s"] / len(items), "median_ms_per_image":
+                1000 * t["median_s"] / len(items)}
+
+    res = {
+        "resize_square": per_image(lambda a: lt.resize_square(a, S), raw),
+        "gray_world_wb": per_image(lt.gray_world_wb, sized),
+        "leaf_mask_refine": per_image(lt.leaf_mask_refine, sized),
+        "suppress_skin_bg": per_image(lambda am: lt.suppress_skin_bg(*am), list(zip(sized, masks))),
+        "smart_lesion_crop": per_image(lambda am: lt.smart_lesion_crop(*am), list(zip(sized, masks))),
+        "clahe_contrast": per_image(lt.clahe_contrast, sized),
+        "deterministic_stages": per_image(lambda a: lt.deterministic_stages(a, S), raw),
+        "fused_preprocess": per_image(lambda a: lt.fused_preprocess(a, S), raw),
+    }
+    batch, batch_masks = np.stack(sized), np.stack(masks)
+    t = timed(lambda: lesion_heatmap_batch(batch, batch_masks), args.repeat)
+    res["lesion_heatmap_batch"] = {"ms_per_image": 1000 * t["best_s"] / len(batch),
+                                   "median_ms_per_image": 1000 * t["median_s"] / len(batch)}
+    return res
+
+BENCHES = {"risk": bench_risk, "api": bench_api, "ingest": bench_ingest, "image": bench_image}
+
+# ---------------------------
+# Compare
+# ---------------------------
+
+_LOWER_IS_BETTER = ("_s", "_ms", "ms_per_image", "seconds")
+
+def compare(new: dict, old: dict, tolerance: float = 0.10) -> List[str]:
+    """Print new/old ratios for shared timing metrics; return regressed metric names."""
+    regressions = []
+    for suite, cases in new["results"].items():
+        for case, metrics in cases.items():
+            base = old.get("results", {}).get(suite, {}).get(case, {})
+            for key, value in metrics.items():
+                timing = key.endswith(_LOWER_IS_BETTER) and not key.endswith("_per_s")
+                if key not in base or not timing or not base[key]:
+                    continue
+                ratio = value / base[key]
+                flag = ""
+                if ratio > 1 + tolerance:
+                    flag = "  ⚠️ slower"
+                    regressions.append(f"{suite}.{case}.{key}")
+                elif ratio < 1 - tolerance:
+                    flag = "  faster"
+                name = f"{suite}.{case}.{key}"
+                print(f"{name:48s} {base[key]:10.4g} → {value:10.4g}  ×{ratio:.2f}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark risk, API, ingestion and image hot paths")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--buckets", type=int, default=40)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--doc-words", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--sources", type=int, default=50)
+    parser.add_argument("--source-words", type=int, default=5000)
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--image-size", type=int, default=512)
+    args = parser.parse_args()
+
+    results = {}
+    for suite in args.suite:
+        print(f"▶ {suite}")
+        results[suite] = BENCHES[suite](args)
+        for case, metrics in results[suite].items():
+            print(f"  {case:28s} " + "  ".join(f"{k}={v:.4g}" for k, v in metrics.items()))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved to {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressed = compare(report, baseline, args.tolerance)
+        if regressed:
+            print(f"❌ {len(regressed)} regression(s): {', '.join(regressed)}")
+            sys.exit(1)
@@ -0,0 +1,205 @@
+# dataset_pack.py
+"""
+Packed, pre-decoded copy of the class-folder dataset (Data/<label>/*.jpg) for
+training. Every image is decoded once, resized like the notebook's
+Resize(256) (center crop + bilinear) and stored as uint8 in a few shards:
+
+  <out_dir>/index.json              {"size", "version", "vocab", "files", "stats",
+                                     "shards": [[name, count], ...]}
+  <out_dir>/labels.npy              N int16 class ids (index into vocab)
+  <out_dir>/shard_00000.images.npy  n×S×S×3 uint8
+
+Shards are opened with mmap_mode="r", so DataLoader workers read from the page
+cache instead of decoding JPEGs every epoch, and class counts come straight
+from labels.npy.
+
+    python dataset_pack.py Data .data_pack --workers 8
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+
+import numpy as np
+
+from leaf_transforms import load_rgb, resize_square
+from leaf_cache import list_images
+
+PACK_VERSION = 1
+
+def labelled_files(data_dir: str) -> List[str]:
+    """Images in the notebook's item order (fastai get_image_files when available)."""
+    try:
+        from fastai.data.transforms import get_image_files
+        return [str(p) for p in get_image_files(data_dir)]
+    except ImportError:
+        return list_images(data_dir)
+
+def _file_stats(paths: Sequence[str]) -> List[List[float]]:
+    return [[st.st_mtime, st.st_size] for st in map(os.stat, paths)]
+
+def packed_image(a: np.ndarray, size: int = 256) -> np.ndarray:
+    """
+    An RGB array exactly as it is packed for training (Resize(size): center
+    crop + bilinear). Serving, export checks and the cascade use this too, so
+    the model never sees pixels prepared differently from its training data.
+    """
+    return resize_square(a, size)
+
+def load_packed(path: str, size: int = 256) -> np.ndarray:
+    return packed_image(load_rgb(path, size), size)
+
+def _decode(args):
+    return load_packed(*args)
+
+def pack_dataset(data_dir: str, out_dir: str, size: int = 256, shard_size: int = 4096,
+                 workers: Optional[int] = None, force: bool = False) -> int:
+    """Decode + resize every image into shards. Returns #images packed (0 if up to date)."""
+    files = labelled_files(data_dir)
+    stats = _file_stats(files)
+    index_path = os.path.join(out_dir, "index.json")
+    if not force and os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            idx = json.load(f)
+        if (idx.get("version") == PACK_VERSION and idx.get("size") == size
+                and idx.get("files") == files and idx.get("stats") == stats):
+            return 0
+
+    os.makedirs(out_dir, exist_ok=True)
+    names = [os.path.basename(os.path.dirname(p)) for p in files]
+    vocab = sorted(set(names))  # CategoryBlock's sorted vocab
+    lookup = {c: i for i, c in enumerate(vocab)}
+    labels = np.array([lookup[c] for c in names], np.int16)
+
+    shards = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(files), shard_size):
+            part = files[start:start + shard_size]
+            name = f"shard_{len(shards):05d}.images.npy"
+            out = np.lib.format.open_memmap(os.path.join(out_dir, name), mode="w+",
+                                            dtype=np.uint8, shape=(len(part), size, size, 3))
+            for row, a in enumerate(pool.map(_decode, [(p, size) for p in part], chunksize=16)):
+                out[row] = a
+            out.flush()
+            del out
+            shards.append([name, len(part)])
+
+    np.save(os.path.join(out_dir, "labels.npy"), labels)
+    index = {"size": size, "version": PACK_VERSION, "vocab": vocab,
+             "files": files, "stats": stats, "shards": shards}
+    tmp = index_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path)  # written last: an interrupted pack is never "up to date"
+    keep = {name for name, _ in shards}
+    for fname in os.listdir(out_dir):
+        if fname.startswith("shard_") and fname.endswith(".images.npy") and fname not in keep:
+            os.remove(os.path.join(out_dir, fname))
+    return len(files)
+
+class PackedImages:
+    """Read side: idx → uint8 S×S×3 view (memmapped) and label, no image decoding."""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        with open(os.path.join(out_dir, "index.json"), "r", encoding="utf-8") as f:
+            idx = json.load(f)
+        self.size, self.vocab, self.files = idx["size"], idx["vocab"], idx["files"]
+        self.shard_names = [name for name, _ in idx["shards"]]
+        self.offsets = np.cumsum([0] + [n for _, n in idx["shards"]])
+        self.labels = np.load(os.path.join(out_dir, "labels.npy"))
+        self._shards: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _shard(self, shard: int) -> np.ndarray:
+        arr = self._shards.get(shard)
+        if arr is None:
+            arr = np.load(os.path.join(self.out_dir, self.shard_names[shard]), mmap_mode="r")
+            self._shards[shard] = arr
+        return arr
+
+    def image(self, i: int) -> np.ndarray:
+        shard = int(np.searchsorted(self.offsets, i, side="right")) - 1
+        return self._shard(shard)[i - self.offsets[shard]]
+
+    def label(self, i: int) -> str:
+        return self.vocab[self.labels[i]]
+
+    def class_counts(self, idxs: Optional[Sequence[int]] = None) -> Dict[str, int]:
+        """{class: count} over `idxs` (default: all) from the label index only."""
+        labels = self.labels if idxs is None else self.labels[np.asarray(idxs, dtype=np.int64)]
+        counts = np.bincount(labels, minlength=len(self.vocab))
+        return {c: int(n) for c, n in zip(self.vocab, counts)}
+
+    def __getstate__(self):
+        # memmaps are reopened lazily in each DataLoader worker
+        state = dict(self.__dict__)
+        state["_shards"] = {}
+        return state
+
+# ---------------------------
+# fastai integration
+# ---------------------------
+
+class _PackedX:
+    """get_x: index → PILImage from the memmapped shard."""
+
+    def __init__(self, packed: PackedImages):
+        self.packed = packed
+
+    def __call__(self, i):
+        from fastai.vision.all import PILImage
+        return PILImage.create(np.ascontiguousarray(self.packed.image(int(i))))
+
+class _PackedY:
+    def __init__(self, packed: PackedImages):
+        self.packed = packed
+
+    def __call__(self, i):
+        return self.packed.label(int(i))
+
+def packed_dataloaders(packed: PackedImages, valid_pct: float = 0.2, seed: int = 42, bs: int = 32,
+                       num_workers: Optional[int] = None, item_tfms=None, batch_tfms=None,
+                       files: Optional[Sequence[str]] = None, **kwargs):
+    """
+    Drop-in for ImageDataLoaders.from_folder(path, valid_pct, seed, item_tfms=Resize(S), ...).
+    `files` restricts the items to a subset, e.g. image_hash.dedup_files(packed.files, ...).
+    """
+    from fastai.vision.all import CategoryBlock, DataBlock, ImageBlock, RandomSplitter
+
+    if files is None:
+        idxs = list(range(len(packed)))
+    else:
+        row = {p: i for i, p in enumerate(packed.files)}
+        idxs = [row[str(p)] for p in files]
+    block = DataBlock(
+        blocks=(ImageBlock, CategoryBlock(vocab=packed.vocab)),
+        get_items=lambda _: idxs,
+        get_x=_PackedX(packed),
+        get_y=_PackedY(packed),
+        splitter=RandomSplitter(valid_pct=valid_pct, seed=seed),
+        item_tfms=item_tfms,
+        batch_tfms=batch_tfms,
+    )
+    if num_workers is None:
+        num_workers = os.cpu_count() or 0
+    return block.dataloaders(packed.out_dir, bs=bs, num_workers=num_workers, **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a class-folder dataset into memmapped shards")
+    parser.add_argument("data_dir", help="class-folder dataset root (e.g. Data)")
+    parser.add_argument("out_dir")
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--shard-size", type=int, default=4096)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    n = pack_dataset(args.data_dir, args.out_dir, args.size, args.shard_size, args.workers, args.force)
+    packed = PackedImages(args.out_dir)
+    print(f"✅ Packed {n} images ({len(packed)} total, {len(packed.shard_names)} shards) in {args.out_dir}")
+    print("Class counts:", packed.class_counts())
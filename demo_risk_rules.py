@@ -1,29 +1,6 @@
 # demo_risk_rules.py
-from risk_rules import compute_daily_risks_from_owm
-from datetime import datetime, timedelta
-import requests
-
-# ----------------------------
-# Interactive city input
-# ----------------------------
-cities_input = input("Enter city or cities (comma-separated, e.g., Lucknow,Delhi,Mumbai): ")
-cities = [c.strip() for c in cities_input.split(",") if c.strip()]
-
-if not cities:
-    print("No valid city entered. Exiting.")
-    exit(1)
-
-# ----------------------------
-# Interactive number of forecast days
-# ----------------------------
-days_input = input("Enter number of forecast days (e.g., 2): ")
-try:
-    forecast_days = int(days_input)
-    if forecast_days < 1:
-        raise ValueError
-except ValueError:
-    print("Invalid number of days. Using default of 2 days.")
-    forecast_days = 2
+from risk_rules import compute_daily_risks_batch
+from owm_client import fetch_forecasts
 
 # ----------------------------
 # OpenWeatherMap API key (optional)
@@ -42,35 +19,67 @@ sample_forecast = [
 ]
 
 # ----------------------------
-# Main loop per city
+# Fetch forecasts per city
 # ----------------------------
-today = datetime.today().date()
+def forecasts_with_fallback(cities, api_key=OWM_KEY, **client_kwargs):
+    """{city: OWM list}, using sample_forecast for cities whose fetch failed or came back empty."""
+    if not api_key:
+        print("No API key provided. Using sample forecast data.")
+        return {city: sample_forecast for city in cities}
+    # Fetch real forecasts concurrently (pooled session, retries, 3 h cache)
+    try:
+        fetched = fetch_forecasts(cities, api_key, **client_kwargs)
+    except Exception as e:
+        print(f"Error fetching forecasts: {e}")
+        fetched = {}
+    forecasts = {}
+    for city in cities:
+        forecast_data = fetched.get(city)
+        if forecast_data is None:
+            print(f"Error fetching forecast for {city}, using sample forecast.")
+            forecast_data = sample_forecast
+        elif not forecast_data:
+            print(f"No forecast data found for {city}, using sample forecast.")
+            forecast_data = sample_forecast
+        forecasts[city] = forecast_data
+    return forecasts
 
-for city in cities:
-    print(f"\n=== City: {city} ===")
 
-    if OWM_KEY:
-        # Fetch real forecast
-        try:
-            url = f"http://api.openweathermap.org/data/2.5/forecast?q={city}&appid={OWM_KEY}&units=metric"
-            resp = requests.get(url)
-            resp.raise_for_status()
-            forecast_data = resp.json().get("list", [])
-            if not forecast_data:
-                print("No forecast data found, using sample forecast.")
-                forecast_data = sample_forecast
-        except Exception as e:
-            print(f"Error fetching forecast for {city}: {e}")
-            forecast_data = sample_forecast
-    else:
-        forecast_data = sample_forecast
-        print("No API key provided. Using sample forecast data.")
+if __name__ == "__main__":
+    # ----------------------------
+    # Interactive city input
+    # ----------------------------
+    cities_input = input("Enter city or cities (comma-separated, e.g., Lucknow,Delhi,Mumbai): ")
+    cities = [c.strip() for c in cities_input.split(",") if c.strip()]
+
+    if not cities:
+        print("No valid city entered. Exiting.")
+        exit(1)
+
+    # ----------------------------
+    # Interactive number of forecast days
+    # ----------------------------
+    days_input = input("Enter number of forecast days (e.g., 2): ")
+    try:
+        forecast_days = int(days_input)
+        if forecast_days < 1:
+            raise ValueError
+    except ValueError:
+        print("Invalid number of days. Using default of 2 days.")
+        forecast_days = 2
+
+    forecasts = forecasts_with_fallback(cities, OWM_KEY, cache_dir=".owm_cache")
 
-    daily_risk = compute_daily_risks_from_owm(forecast_data)
+    # ----------------------------
+    # Score all cities in one batch
+    # ----------------------------
+    per_city = compute_daily_risks_batch(forecasts)
 
-    for day_info in daily_risk["per_day"][:forecast_days]:
-        date = day_info["date"]
-        risks = day_info["risks"]
-        print(f"\nDate: {date}")
-        for disease, v in risks.items():
-            print(f"  {disease}: risk_score={v['risk_score']:.1f} | band={v['risk_band']} | daily_index={v['daily_index']:.1f} | cum_index={v['cumulative_index']:.1f}")
+    for city, per_day in per_city.items():
+        print(f"\n=== City: {city} ===")
+        for day_info in per_day[:forecast_days]:
+            date = day_info["date"]
+            risks = day_info["risks"]
+            print(f"\nDate: {date}")
+            for disease, v in risks.items():
+                print(f"  {disease}: risk_score={v['risk_score']:.1f} | band={v['risk_band']} | daily_index={v['daily_index']:.1f} | cum_index={v['cumulative_index']:.1f}")
@@ -0,0 +1,345 @@
+# image_hash.py
+"""
+Perceptual hashes (64-bit pHash / dHash) and a multi-index hash table for
+Hamming-radius lookups, used two ways:
+
+  offline  dedup report + filter for the class-folder dataset. Near-duplicate
+           photos (recompressed, resized, re-shot frames) are grouped. Groups
+           whose copies carry different labels are flagged, as are groups that
+           straddle the notebook's train/valid split (validation leakage).
+           `dedup_files` keeps one image per group for the dataloaders:
+
+               files = dedup_files(labelled_files("Data"), index.hashes(...))
+               dls = ImageDataLoaders.from_path_func("Data", files, parent_label, ...)
+               dls = packed_dataloaders(packed, files=files, ...)
+
+  online   PredictionCache: recent /predict results keyed by the upload's
+           hash; an upload within `max_distance` bits of a stored one reuses
+           its prediction (label, probabilities) instead of running
+           inference again.
+
+Hashes of dataset files are kept in a JSON index keyed by (mtime, size), so
+re-runs only hash new or changed images.
+
+    python image_hash.py Data --radius 4 --report dedup_report.json
+"""
+
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from leaf_transforms import load_rgb
+
+HASH_VERSION = 1
+HASH_KINDS = ("phash", "dhash")
+
+# ---------------------------
+# Hashes
+# ---------------------------
+
+def _gray(a: np.ndarray) -> np.ndarray:
+    return a if a.ndim == 2 else cv2.cvtColor(np.ascontiguousarray(a), cv2.COLOR_RGB2GRAY)
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def dhash(a: np.ndarray) -> int:
+    """Difference hash: signs of horizontal gradients on a 9×8 thumbnail."""
+    small = cv2.resize(_gray(a), (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+def phash(a: np.ndarray) -> int:
+    """DCT hash: low 8×8 frequencies of a 32×32 thumbnail vs. their median (DC excluded)."""
+    small = cv2.resize(_gray(a), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    return _pack_bits(low > np.median(low[1:]))
+
+def image_hash(a: np.ndarray, kind: str = "phash") -> int:
+    if kind == "phash":
+        return phash(a)
+    if kind == "dhash":
+        return dhash(a)
+    raise ValueError(f"unknown hash kind {kind!r} (expected one of {HASH_KINDS})")
+
+if hasattr(int, "bit_count"):
+    def hamming(a: int, b: int) -> int:
+        return (a ^ b).bit_count()
+else:  # Python < 3.10
+    def hamming(a: int, b: int) -> int:
+        return bin(a ^ b).count("1")
+
+# ---------------------------
+# Multi-index hashing
+# ---------------------------
+
+class HammingIndex:
+    """
+    Multi-index hashing for radius <= `radius` lookups. The 64 bits are cut
+    into radius + 1 disjoint chunks, each with its own {chunk value: hashes}
+    table. Two hashes within `radius` bits differ in at most `radius` chunks,
+    so they agree exactly on at least one (pigeonhole). A query reads
+    radius + 1 buckets and checks only those candidates.
+    """
+
+    def __init__(self, radius: int = 4, bits: int = 64):
+        self.radius = radius
+        n = radius + 1
+        edges = [bits * k // n for k in range(n + 1)]
+        self._chunks = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self._tables: List[Dict[int, set]] = [{} for _ in self._chunks]
+        self._items: Dict[int, list] = {}   # hash -> items (equal hashes share an entry)
+
+    def add(self, h: int, item) -> None:
+        items = self._items.get(h)
+        if items is None:
+            items = self._items[h] = []
+            for (shift, mask), table in zip(self._chunks, self._tables):
+                table.setdefault((h >> shift) & mask, set()).add(h)
+        items.append(item)
+
+    def remove(self, h: int, item) -> bool:
+        items = self._items.get(h)
+        if not items or item not in items:
+            return False
+        items.remove(item)
+        if not items:
+            del self._items[h]
+            for (shift, mask), table in zip(self._chunks, self._tables):
+                key = (h >> shift) & mask
+                bucket = table[key]
+                bucket.discard(h)
+                if not bucket:
+                    del table[key]
+        return True
+
+    def search(self, h: int, radius: Optional[int] = None) -> List[Tuple[int, object]]:
+        """(distance, item) pairs within `radius` (<= the index radius), nearest first."""
+        radius = self.radius if radius is None else radius
+        if radius > self.radius:
+            raise ValueError(f"radius {radius} > index radius {self.radius}")
+        seen, out = set(), []
+        for (shift, mask), table in zip(self._chunks, self._tables):
+            for cand in table.get((h >> shift) & mask, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                d = hamming(h, cand)
+                if d <= radius:
+                    out.extend((d, item) for item in self._items[cand])
+        out.sort(key=lambda x: x[0])
+        return out
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._items.values())
+
+# ---------------------------
+# Dataset hash index
+# ---------------------------
+
+def _hash_one(args) -> int:
+    path, kind = args
+    return image_hash(load_rgb(path, 64), kind)  # JPEG draft decode: a 32×32 thumbnail is all we need
+
+class HashIndex:
+    """{path: hash} for dataset files, persisted with (mtime, size) so re-runs only hash changes."""
+
+    def __init__(self, path: Optional[str] = None, kind: str = "phash"):
+        if kind not in HASH_KINDS:
+            raise ValueError(f"unknown hash kind {kind!r} (expected one of {HASH_KINDS})")
+        self.path, self.kind = path, kind
+        self.files: Dict[str, list] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                idx = json.load(f)
+            if idx.get("version") == HASH_VERSION and idx.get("kind") == kind:
+                self.files = idx["files"]
+
+    def hashes(self, files: Sequence[str], workers: Optional[int] = None) -> List[int]:
+        """Hashes of `files` in order, computing only new/changed ones (process pool)."""
+        stats = {p: os.stat(p) for p in files}
+        todo = [p for p in files if self.files.get(p, [None, None])[:2]
+                != [stats[p].st_mtime, stats[p].st_size]]
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for p, h in zip(todo, pool.map(_hash_one, [(p, self.kind) for p in todo], chunksize=32)):
+                    self.files[p] = [stats[p].st_mtime, stats[p].st_size, f"{h:016x}"]
+            self.save()
+        return [int(self.files[p][2], 16) for p in files]
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": HASH_VERSION, "kind": self.kind, "files": self.files}, f)
+        os.replace(tmp, self.path)
+
+# ---------------------------
+# Dedup report + filter
+# ---------------------------
+
+def _label(path: str) -> str:
+    return os.path.basename(os.path.dirname(path))
+
+def duplicate_groups(hashes: Sequence[int], radius: int = 4) -> List[List[int]]:
+    """Connected components of "within `radius` bits" (index lists, size >= 2, item order)."""
+    index = HammingIndex(radius)
+    for i, h in enumerate(hashes):
+        index.add(h, i)
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, h in enumerate(hashes):
+        for _, j in index.search(h):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+def dedup_files(files: Sequence[str], hashes: Sequence[int], radius: int = 4,
+                drop_conflicts: bool = True) -> List[str]:
+    """
+    `files` minus near-duplicates: the first image of each group is kept.
+    Groups whose copies carry different labels are dropped entirely when
+    `drop_conflicts` is set, because the same leaf cannot be two diseases.
+    """
+    drop = set()
+    for g in duplicate_groups(hashes, radius):
+        if drop_conflicts and len({_label(files[i]) for i in g}) > 1:
+            drop.update(g)
+        else:
+            drop.update(g[1:])
+    return [p for i, p in enumerate(files) if i not in drop]
+
+def dedup_report(files: Sequence[str], hashes: Sequence[int], radius: int = 4,
+                 valid: Optional[Iterable[str]] = None) -> dict:
+    """Duplicate groups, label conflicts and (given the valid split) train/valid leakage."""
+    groups = duplicate_groups(hashes, radius)
+    valid = set(valid) if valid is not None else None
+    conflicts, leaks, per_class = [], [], {}
+    for g in groups:
+        paths = [files[i] for i in g]
+        if len({_label(p) for p in paths}) > 1:
+            conflicts.append(paths)
+        if valid is not None and 0 < sum(p in valid for p in paths) < len(paths):
+            leaks.append(paths)
+        for p in paths[1:]:
+            per_class[_label(p)] = per_class.get(_label(p), 0) + 1
+    report = {
+        "images": len(files),
+        "radius": radius,
+        "duplicate_groups": len(groups),
+        "redundant_images": sum(len(g) - 1 for g in groups),
+        "redundant_by_class": per_class,
+        "label_conflicts": conflicts,
+        "groups": [[files[i] for i in g] for g in groups],
+    }
+    if valid is not None:
+        report["leaky_groups"] = leaks
+        report["leaked_valid_images"] = sum(sum(p in valid for p in g) for g in leaks)
+    return report
+
+def deduped_dataloaders(path, radius: int = 4, index_path: Optional[str] = None,
+                        workers: Optional[int] = None, **kwargs):
+    """ImageDataLoaders over the deduplicated class folders (kwargs as for from_path_func)."""
+    from fastai.vision.all import ImageDataLoaders, parent_label
+    from dataset_pack import labelled_files
+
+    files = labelled_files(str(path))
+    files = dedup_files(files, HashIndex(index_path).hashes(files, workers), radius)
+    return ImageDataLoaders.from_path_func(path, files, parent_label, **kwargs)
+
+# ---------------------------
+# Online prediction cache
+# ---------------------------
+
+class PredictionCache:
+    """
+    Bounded LRU of results keyed by perceptual hash. `get` returns the result
+    stored for the nearest hash within `max_distance` bits, or None. A hit may
+    come from another user's upload, so store only small values that do not
+    depend on the exact pixels (never anything rendered from the image).
+    """
+
+    def __init__(self, capacity: int = 2048, max_distance: int = 4):
+        self.capacity, self.max_distance = capacity, max_distance
+        self._entries: "OrderedDict[int, object]" = OrderedDict()   # hash -> result, LRU first
+        self._index = HammingIndex(max_distance)
+        self._lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def get(self, h: int):
+        """Nearest stored result within max_distance, or None."""
+        with self._lock:
+            for _, key in self._index.search(h):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, h: int, result) -> None:
+        with self._lock:
+            if h in self._entries:
+                self._entries[h] = result
+                self._entries.move_to_end(h)
+                return
+            self._entries[h] = result
+            self._index.add(h, h)
+            while len(self._entries) > self.capacity:
+                old, _ = self._entries.popitem(last=False)
+                self._index.remove(old, old)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate report for a class-folder dataset")
+    parser.add_argument("data_dir", help="class-folder dataset root (e.g. Data)")
+    parser.add_argument("--radius", type=int, default=4, help="max Hamming distance (of 64 bits)")
+    parser.add_argument("--kind", choices=HASH_KINDS, default="phash")
+    parser.add_argument("--index", default=".image_hashes.json", help="hash cache file")
+    parser.add_argument("--report", default=None, help="write the full report (groups) as JSON")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    from dataset_pack import labelled_files
+    files = labelled_files(args.data_dir)
+    hashes = HashIndex(args.index, args.kind).hashes(files, args.workers)
+    try:
+        from model_export import split_files
+        valid = split_files(args.data_dir)[1]
+    except ImportError:  # fastai missing: no split, no leakage numbers
+        valid = None
+    report = dedup_report(files, hashes, args.radius, valid)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    print(f"✅ {report['images']} images, {report['duplicate_groups']} near-duplicate groups, "
+          f"{report['redundant_images']} redundant, {len(report['label_conflicts'])} label conflicts")
+    print("Redundant by class:", report["redundant_by_class"])
+    if valid is not None:
+        print(f"Train/valid leakage: {len(report['leaky_groups'])} groups, "
+              f"{report['leaked_valid_images']} validation images")
+    print(f"Kept after dedup_files: {len(dedup_files(files, hashes, args.radius))}")
@@ -0,0 +1,314 @@
+# instrumentation.py
+"""
+Lightweight in-process metrics: counters, histograms and timing spans.
+
+    from instrumentation import counter, span, timed, observe
+
+    with span("pdf_extract"):               # → pdf_extract_seconds histogram
+        ...
+    @timed("chunk_document")
+    def chunk(...): ...
+    for chunk in timed_iter("chunk_document", chunk_text(doc)):   # lazy generators
+        ...
+    counter("leaf_transform", stage="CLAHEContrast", outcome="high std")
+
+Exposed as Prometheus text (prometheus_text(); install_fastapi(app) adds a
+/metrics route plus per-request timing) or as a JSON summary (summary() /
+print_summary(), printed at the end of the batch scripts).
+
+Set INSTRUMENTATION=0 to disable: span() then returns a shared no-op context
+manager and counter()/observe() return after a single flag check.
+Metrics are per process; pool workers report back through their results.
+"""
+
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Tuple
+import bisect
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# seconds; roughly 0.5 ms … 60 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = os.environ.get("INSTRUMENTATION", "1").lower() not in ("0", "false", "off", "no")
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = {}
+_histograms: Dict[Tuple[str, tuple], "Histogram"] = {}
+
+def enabled() -> bool:
+    return _enabled
+
+def set_enabled(on: bool) -> None:
+    global _enabled
+    _enabled = bool(on)
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: +Inf
+        self.count, self.sum = 0, 0.0
+        self.min, self.max = float("inf"), float("-inf")
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (clamped to max)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+# ---------------------------
+# Recording
+# ---------------------------
+
+def counter(name: str, value: float = 1, **labels) -> None:
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, buckets: Optional[Iterable[float]] = None, **labels) -> None:
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = Histogram(buckets or DEFAULT_BUCKETS)
+        h.add(value)
+
+class _Span:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name + "_seconds", time.perf_counter() - self.t0, **self.labels)
+        if exc_type is not None:
+            counter(self.name + "_errors", **self.labels)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name: str, **labels):
+    """Context manager timing its block into the `<name>_seconds` histogram."""
+    return _Span(name, labels) if _enabled else _NULL_SPAN
+
+def timed(name: Optional[str] = None, **labels):
+    """Decorator form of span(); defaults to the function's qualified name."""
+    def wrap(fn):
+        metric = name or f"{fn.__module__}.{fn.__qualname__}".replace(".", "_")
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(metric, labels):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def timed_iter(name: str, iterable: Iterable, **labels):
+    """
+    Yield from `iterable`, timing only the production of its items into
+    `<name>_seconds` (one observation when it ends). For generators that a
+    span() could only time by materializing them.
+    """
+    if not _enabled:
+        yield from iterable
+        return
+    it, elapsed = iter(iterable), 0.0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                elapsed += time.perf_counter() - t0
+                return
+            except Exception:
+                elapsed += time.perf_counter() - t0
+                counter(name + "_errors", **labels)
+                raise
+            elapsed += time.perf_counter() - t0
+            yield item
+    finally:
+        observe(name + "_seconds", elapsed, **labels)
+
+def merge(snapshot: dict) -> None:
+    """Fold a worker's snapshot() into this process's metrics."""
+    if not _enabled or not snapshot:
+        return
+    with _lock:
+        for name, labels, value in snapshot.get("counters", ()):
+            key = (name, tuple(map(tuple, labels)))
+            _counters[key] = _counters.get(key, 0) + value
+        for name, labels, buckets, counts, total, lo, hi in snapshot.get("histograms", ()):
+            key = (name, tuple(map(tuple, labels)))
+            h = _histograms.get(key)
+            if h is None:
+                h = _histograms[key] = Histogram(buckets)
+            h.counts = [a + b for a, b in zip(h.counts, counts)]
+            h.count += sum(counts)
+            h.sum += total
+            h.min, h.max = min(h.min, lo), max(h.max, hi)
+
+def snapshot(clear: bool = True) -> dict:
+    """Picklable copy of this process's metrics (for pool workers → merge())."""
+    with _lock:
+        out = {
+            "counters": [(n, list(l), v) for (n, l), v in _counters.items()],
+            "histograms": [(n, list(l), h.buckets, h.counts, h.sum, h.min, h.max)
+                           for (n, l), h in _histograms.items()],
+        }
+        if clear:
+            _counters.clear()
+            _histograms.clear()
+    return out
+
+# ---------------------------
+# Export
+# ---------------------------
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_:]")
+
+def _prom_name(name: str) -> str:
+    return _NAME_RE.sub("_", name)
+
+def _prom_escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _prom_labels(labels: tuple, le: Optional[str] = None) -> str:
+    parts = [f'{_prom_name(k)}="{_prom_escape(v)}"' for k, v in labels]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def prometheus_text() -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda kv: kv[0])
+    typed = set()
+    for (name, labels), value in counters:
+        n = _prom_name(name) + "_total"
+        if n not in typed:
+            lines.append(f"# TYPE {n} counter")
+            typed.add(n)
+        lines.append(f"{n}{_prom_labels(labels)} {value:g}")
+    for (name, labels), h in histograms:
+        n = _prom_name(name)
+        if n not in typed:
+            lines.append(f"# TYPE {n} histogram")
+            typed.add(n)
+        cumulative = 0
+        for le, c in zip(h.buckets, h.counts):
+            cumulative += c
+            lines.append(f"{n}_bucket{_prom_labels(labels, f'{le:g}')} {cumulative}")
+        lines.append(f"{n}_bucket{_prom_labels(labels, '+Inf')} {h.count}")
+        lines.append(f"{n}_sum{_prom_labels(labels)} {h.sum:.6g}")
+        lines.append(f"{n}_count{_prom_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+def _label_str(name: str, labels: tuple) -> str:
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+def summary() -> dict:
+    """{"counters": {name{labels}: value}, "timings": {name{labels}: stats}}."""
+    with _lock:
+        counters = {_label_str(n, l): v for (n, l), v in sorted(_counters.items())}
+        timings = {
+            _label_str(n, l): {
+                "count": h.count, "total": round(h.sum, 6),
+                "mean": round(h.sum / h.count, 6) if h.count else 0.0,
+                "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+                "min": h.min if h.count else 0.0, "max": h.max if h.count else 0.0,
+            }
+            for (n, l), h in sorted(_histograms.items(), key=lambda kv: kv[0])
+        }
+    return {"counters": counters, "timings": timings}
+
+def print_summary(path: Optional[str] = None, file=None) -> None:
+    """JSON summary to stdout, or to `path` (also via INSTRUMENTATION_SUMMARY)."""
+    if not _enabled:
+        return
+    path = path or os.environ.get("INSTRUMENTATION_SUMMARY")
+    text = json.dumps(summary(), indent=2, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print("📊 Metrics summary:\n" + text, file=file or sys.stdout)
+
+# ---------------------------
+# FastAPI
+# ---------------------------
+
+def install_fastapi(app) -> None:
+    """Time every request (http_request_seconds{method,path}), count statuses, serve /metrics."""
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    @app.middleware("http")
+    async def _instrument(request: Request, call_next):
+        if not _enabled:
+            return await call_next(request)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            observe("http_request_seconds", time.perf_counter() - t0, method=request.method, path=path)
+            counter("http_requests", method=request.method, path=path, status=status)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
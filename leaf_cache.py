@@ -0,0 +1,218 @@
+# leaf_cache.py
+"""
+Offline cache for the deterministic part of the leaf transform pipeline.
+
+GrayWorldWB → LeafMaskRefine (GrabCut) → SuppressSkinAndBG run once per image
+on a process pool; the results are stored in packed shards keyed by the image
+file's content hash:
+
+  <cache_dir>/index.json             {"final_size", "version", "entries": {sha1: [shard, row]},
+                                      "files": {path: [mtime, size, sha1]}}
+  <cache_dir>/shard_00000.base.npy   N×S×S×3 uint8  (after SuppressSkinAndBG)
+  <cache_dir>/shard_00000.lesion.npy N×S×S×3 uint8  (SmartLesionCrop branch)
+  <cache_dir>/shard_00000.mask.npy   N×S×S   uint8  (leaf_mask of `base`)
+  <cache_dir>/shard_00000.lesion_mask.npy     N×S×S   uint8  (leaf_mask of `lesion`)
+
+Shards are opened with mmap_mode="r", so DataLoader workers share the page
+cache. During training only the random parts run per item: SmartLesionCrop's
+p-gate picks the cached `lesion` or `base` variant, then CLAHE and the batch
+augmentations follow as before.
+
+    python leaf_cache.py Data .leaf_cache --workers 8
+"""
+
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import random
+
+import numpy as np
+from PIL import Image
+
+from leaf_transforms import deterministic_stages
+
+CACHE_VERSION = 1
+ARRAYS = ("base", "lesion", "leaf_mask", "lesion_mask")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+def file_sha1(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def list_images(root: str) -> List[str]:
+    out = []
+    for dirpath, _, files in os.walk(root):
+        for fname in files:
+            if fname.lower().endswith(IMAGE_EXTS):
+                out.append(os.path.join(dirpath, fname))
+    return sorted(out)
+
+def _process_one(args):
+    path, final_size = args
+    a = np.asarray(Image.open(path).convert("RGB"))
+    return deterministic_stages(a, final_size)
+
+class LeafCache:
+    def __init__(self, cache_dir: str, final_size: int = 256):
+        self.cache_dir, self.final_size = cache_dir, final_size
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = {"final_size": final_size, "version": CACHE_VERSION, "entries": {}, "files": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                idx = json.load(f)
+            if idx.get("final_size") == final_size and idx.get("version") == CACHE_VERSION:
+                self.index = idx
+        self._shards: Dict[int, Dict[str, np.ndarray]] = {}
+
+    # --- keys ---
+
+    def key_for(self, path: str) -> str:
+        """Content hash, reusing the stored one while mtime/size are unchanged."""
+        st = os.stat(path)
+        known = self.index["files"].get(path)
+        if known and known[0] == st.st_mtime and known[1] == st.st_size:
+            return known[2]
+        digest = file_sha1(path)
+        self.index["files"][path] = [st.st_mtime, st.st_size, digest]
+        return digest
+
+    def __contains__(self, path: str) -> bool:
+        return self.key_for(path) in self.index["entries"]
+
+    def __len__(self) -> int:
+        return len(self.index["entries"])
+
+    # --- build ---
+
+    def precompute(self, paths: Iterable[str], workers: int = None, shard_size: int = 2048) -> int:
+        """Run the deterministic stages for uncached images. Returns #new images."""
+        todo, seen = [], set()
+        for p in paths:
+            k = self.key_for(p)
+            if k not in self.index["entries"] and k not in seen:
+                todo.append((p, k))
+                seen.add(k)
+        if not todo:
+            self._save_index()
+            return 0
+
+        next_shard = 1 + max((s for s, _ in self.index["entries"].values()), default=-1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(todo), shard_size):
+                part = todo[start:start + shard_size]
+                results = list(pool.map(_process_one, [(p, self.final_size) for p, _ in part], chunksize=8))
+                self._write_shard(next_shard, results)
+                for row, (_, k) in enumerate(part):
+                    self.index["entries"][k] = [next_shard, row]
+                next_shard += 1
+                self._save_index()  # resumable: finished shards stay valid
+        return len(todo)
+
+    def _write_shard(self, shard: int, results: List[Dict[str, np.ndarray]]) -> None:
+        for name in ARRAYS:
+            arr = np.stack([r[name] for r in results])
+            np.save(self._shard_path(shard, name), arr)
+
+    def _shard_path(self, shard: int, name: str) -> str:
+        suffix = "mask" if name == "leaf_mask" else name
+        return os.path.join(self.cache_dir, f"shard_{shard:05d}.{suffix}.npy")
+
+    def _save_index(self) -> None:
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    # --- read ---
+
+    def _shard(self, shard: int) -> Dict[str, np.ndarray]:
+        arrs = self._shards.get(shard)
+        if arrs is None:
+            arrs = {name: np.load(self._shard_path(shard, name), mmap_mode="r")
+                    for name in ARRAYS}
+            self._shards[shard] = arrs
+        return arrs
+
+    def get(self, path: str) -> Optional[Dict[str, np.ndarray]]:
+        entry = self.index["entries"].get(self.key_for(path))
+        if entry is None:
+            return None
+        shard, row = entry
+        arrs = self._shard(shard)
+        return {name: arrs[name][row] for name in arrs}
+
+    def __getstate__(self):
+        # memmaps are reopened lazily in each DataLoader worker
+        state = dict(self.__dict__)
+        state["_shards"] = {}
+        return state
+
+# ---------------------------
+# fastai integration
+# ---------------------------
+
+class CachedLeafImage:
+    """
+    `type_tfms` callable: path → PILImage from the cache, with the per-epoch
+    SmartLesionCrop gate (`lesion_p`) applied and `leaf_mask` attached.
+    Uncached paths fall back to running the deterministic stages inline.
+    """
+
+    def __init__(self, cache: LeafCache, lesion_p: float = 0.8):
+        self.cache, self.lesion_p = cache, lesion_p
+
+    def __call__(self, path):
+        from fastai.vision.all import PILImage
+        path = str(path)
+        item = self.cache.get(path)
+        if item is None:
+            item = _process_one((path, self.cache.final_size))
+        if random.random() <= self.lesion_p:
+            a, mask = item["lesion"], item["lesion_mask"]
+        else:
+            a, mask = item["base"], item["leaf_mask"]
+        pil = PILImage.create(np.ascontiguousarray(a))
+        pil.leaf_mask = np.asarray(mask)
+        return pil
+
+def cached_dataloaders(path, cache: LeafCache, lesion_p: float = 0.8, clahe_p: float = 1.0,
+                       valid_pct: float = 0.2, seed: int = 42, bs: int = 32,
+                       num_workers: int = None, batch_tfms=None, files=None, **kwargs):
+    """
+    Drop-in for the notebook's ImageDataLoaders.from_folder(..., item_tfms=[...]).
+    `files` replaces get_image_files, e.g. with image_hash.dedup_files(...).
+    """
+    from fastai.vision.all import (DataBlock, TransformBlock, CategoryBlock, get_image_files,
+                                   parent_label, RandomSplitter, IntToFloatTensor)
+    from leaf_transforms import CLAHEContrast
+
+    block = DataBlock(
+        blocks=(TransformBlock(type_tfms=CachedLeafImage(cache, lesion_p), batch_tfms=IntToFloatTensor), CategoryBlock),
+        get_items=get_image_files if files is None else (lambda _: list(files)),
+        get_y=parent_label,
+        splitter=RandomSplitter(valid_pct=valid_pct, seed=seed),
+        item_tfms=[CLAHEContrast(p=clahe_p, final_size=cache.final_size)],
+        batch_tfms=batch_tfms,
+    )
+    if num_workers is None:
+        num_workers = os.cpu_count() or 0
+    return block.dataloaders(path, bs=bs, num_workers=num_workers, **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute deterministic leaf transforms")
+    parser.add_argument("data_dir", help="class-folder dataset root (e.g. Data)")
+    parser.add_argument("cache_dir")
+    parser.add_argument("--final-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    cache = LeafCache(args.cache_dir, args.final_size)
+    n = cache.precompute(list_images(args.data_dir), workers=args.workers)
+    print(f"✅ Cached {n} new images ({len(cache)} total) in {args.cache_dir}")
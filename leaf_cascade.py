@@ -0,0 +1,347 @@
+# leaf_cascade.py
+"""
+Cheap-first cascade for leaf disease inference. A softmax regression on
+handcrafted features of the packed training image (dataset_pack.packed_image)
+answers the confident cases. The features are leaf-mask coverage, the notebook's brown/dark/yellow lesion
+score and HSV/LAB statistics. Only uncertain images go on to the CNN.
+
+Each class c has its own exit threshold t_c. The cheap stage answers when
+it predicts c with probability >= t_c. Thresholds are calibrated on one half
+of the validation split (RandomSplitter(0.2, seed=42), as in the notebook).
+A threshold is the lowest cut at which the cheap answers for c are still at
+least `target` precise. A class that never gets there always escalates. The
+escalation rate, exit precision and (with --model) the cascade-vs-CNN
+accuracy are reported on the other half.
+
+An optional --non-leaf folder adds a "Not_a_leaf" class for images without a
+leaf (soil, hands, screenshots…). That class can only be answered by the
+cascade, since the CNN has no such output.
+
+    python leaf_cascade.py --data Data --out Data/leaf_cascade.json \
+        --model Data/leaf_model.onnx --non-leaf Data_extra/not_leaf
+
+The artifact is plain JSON (standardization, weights, thresholds) and
+inference is numpy only; nlp_layer/api/vision_api.py loads it via CASCADE_PATH.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from dataset_pack import load_packed
+from leaf_transforms import green_mask, lesion_score
+from lesion_heatmap import leaf_region_mask
+from instrumentation import counter
+
+NON_LEAF = "Not_a_leaf"
+PREPROCESS_SIZE = 256
+FEATURE_SIZE = 128   # statistics only: a quarter of the pixels is plenty
+CASCADE_VERSION = 2   # 2: features of the packed training image, not fused_preprocess
+
+# ---------------------------
+# Handcrafted features
+# ---------------------------
+
+_HUE_BINS = 8
+FEATURE_NAMES = (
+    "leaf_coverage", "leaf_found",
+    "h_mean", "h_std", "s_mean", "s_std", "v_mean", "v_std",
+    *(f"hue_bin{i}" for i in range(_HUE_BINS)),
+    "a_mean", "a_std", "b_mean", "b_std",
+    "green_frac", "brown_mean", "brown_p90", "brown_frac",
+    "dark_mean", "dark_p90", "yellow_frac",
+    "lesion_mean", "lesion_p95", "edge_mean",
+)
+
+def leaf_features(image: np.ndarray, leaf_mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Feature vector (float32, FEATURE_NAMES order) of a packed image and its
+    lesion_heatmap.leaf_region_mask. Statistics are taken inside the leaf mask
+    at FEATURE_SIZE. They fall back to the whole image when the mask is empty
+    or under 1% of it.
+    """
+    scale = FEATURE_SIZE / image.shape[0]
+    if scale < 1:
+        image = cv2.resize(image, (FEATURE_SIZE, FEATURE_SIZE), interpolation=cv2.INTER_AREA)
+        if leaf_mask is not None:
+            leaf_mask = cv2.resize(leaf_mask, (FEATURE_SIZE, FEATURE_SIZE), interpolation=cv2.INTER_NEAREST)
+    hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+    lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
+    leaf = np.ones(image.shape[:2], bool) if leaf_mask is None else leaf_mask > 0
+    coverage = float(leaf.mean())
+    found = coverage >= 0.01
+    if not found:
+        leaf = np.ones_like(leaf)
+
+    H, S, V = (c[leaf].astype(np.float32) for c in cv2.split(hsv))
+    A, B = (lab[:, :, k][leaf].astype(np.float32) for k in (1, 2))
+    a16 = image[leaf].astype(np.int16)
+    brown = np.clip((a16[:, 0] - a16[:, 1]) + 0.5 * (a16[:, 0] - a16[:, 2]), 0, None) / 255.0
+    dark = (255.0 - lab[:, :, 0][leaf]) / 255.0
+    yellow = (H >= 20) & (H <= 40) & (S > 40) & (V > 80)
+    lesion = lesion_score(image, hsv, lab, sigma=5 * min(scale, 1.0))[leaf] / 255.0
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    edges = np.abs(cv2.Laplacian(gray, cv2.CV_16S))[leaf]
+    hue_hist = np.bincount(np.minimum(H.astype(np.int32) * _HUE_BINS // 180, _HUE_BINS - 1),
+                           minlength=_HUE_BINS) / H.size
+
+    f = [coverage,
+         float(found),
+         H.mean() / 180, H.std() / 180, S.mean() / 255, S.std() / 255, V.mean() / 255, V.std() / 255,
+         *hue_hist,
+         A.mean() / 255, A.std() / 255, B.mean() / 255, B.std() / 255,
+         green_mask(hsv)[leaf].mean(),
+         brown.mean(), np.percentile(brown, 90), (brown > 0.15).mean(),
+         dark.mean(), np.percentile(dark, 90), yellow.mean(),
+         lesion.mean(), np.percentile(lesion, 95), edges.mean() / 255]
+    return np.asarray(f, np.float32)
+
+def _file_features(path: str) -> Tuple[np.ndarray, float]:
+    image = load_packed(path, PREPROCESS_SIZE)
+    t0 = time.perf_counter()
+    x = leaf_features(image, leaf_region_mask(image))
+    return x, time.perf_counter() - t0
+
+def features_for_files(files: Sequence[str], workers: Optional[int] = None
+                       ) -> Tuple[np.ndarray, float]:
+    """N×F features for image files and mean feature time per image (ms, excl. preprocessing)."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        out = list(pool.map(_file_features, files, chunksize=16))
+    X = np.stack([x for x, _ in out]) if out else np.zeros((0, len(FEATURE_NAMES)), np.float32)
+    return X, 1000.0 * sum(t for _, t in out) / max(len(out), 1)
+
+# ---------------------------
+# Cheap model: softmax regression (numpy)
+# ---------------------------
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    return z / z.sum(axis=1, keepdims=True)
+
+def fit_softmax(X: np.ndarray, y: np.ndarray, n_classes: int, l2: float = 1e-3,
+                lr: float = 0.5, iters: int = 3000) -> Dict[str, np.ndarray]:
+    """L2-regularized multinomial logistic regression by full-batch gradient descent."""
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale < 1e-8] = 1.0
+    Z = (X - mean) / scale
+    onehot = np.eye(n_classes)[y]
+    W = np.zeros((X.shape[1], n_classes))
+    b = np.zeros(n_classes)
+    for _ in range(iters):  # convex and only ~30 inputs: plain GD converges fine
+        err = (_softmax(Z @ W + b) - onehot) / len(Z)
+        W -= lr * (Z.T @ err + l2 * W)
+        b -= lr * err.sum(axis=0)
+    return {"mean": mean, "scale": scale, "coef": W, "intercept": b}
+
+# ---------------------------
+# Calibration
+# ---------------------------
+
+def calibrate_thresholds(probs: np.ndarray, y: np.ndarray, target: float = 0.98,
+                         min_support: int = 20) -> List[float]:
+    """
+    Per class: the lowest confidence cut at which cheap predictions of that
+    class are >= `target` precise over >= `min_support` images (inf if none).
+    """
+    pred, conf = probs.argmax(axis=1), probs.max(axis=1)
+    thresholds = []
+    for c in range(probs.shape[1]):
+        sel = np.flatnonzero(pred == c)
+        order = sel[np.argsort(-conf[sel], kind="stable")]
+        c_conf = conf[order]
+        precision = np.cumsum(y[order] == c) / np.arange(1, len(order) + 1)
+        # a cut admits every tied confidence, so only the last of a tie run counts
+        last = np.r_[c_conf[1:] != c_conf[:-1], True] if len(order) else np.zeros(0, bool)
+        ok = np.flatnonzero(last & (precision >= target) & (np.arange(1, len(order) + 1) >= min_support))
+        thresholds.append(float(c_conf[ok[-1]]) if len(ok) else float("inf"))
+    return thresholds
+
+class CascadeDecision:
+    __slots__ = ("probs", "label", "confident")
+
+    def __init__(self, probs: np.ndarray, label: str, confident: bool):
+        self.probs, self.label, self.confident = probs, label, confident
+
+class LeafCascade:
+    """
+    The cheap stage: features → probabilities over `vocab` → exit or escalate.
+    Counts its own exits/escalations for the API's /health.
+    """
+
+    def __init__(self, vocab: List[str], mean, scale, coef, intercept,
+                 thresholds: Sequence[float], meta: Optional[dict] = None):
+        self.vocab = list(vocab)
+        self.mean, self.scale = np.asarray(mean, np.float64), np.asarray(scale, np.float64)
+        self.coef, self.intercept = np.asarray(coef, np.float64), np.asarray(intercept, np.float64)
+        self.thresholds = np.asarray(thresholds, np.float64)
+        self.meta = meta or {}
+        self.exits, self.escalations = 0, 0
+        self._lock = threading.Lock()
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.atleast_2d(np.asarray(X, np.float64))
+        return _softmax((X - self.mean) / self.scale @ self.coef + self.intercept)
+
+    def confident(self, probs: np.ndarray) -> np.ndarray:
+        """Boolean mask of rows the cheap stage may answer."""
+        pred = probs.argmax(axis=1)
+        return probs[np.arange(len(probs)), pred] >= self.thresholds[pred]
+
+    def decide(self, pre: dict) -> CascadeDecision:
+        """Decision for one packed image + leaf mask (counted in exits/escalations)."""
+        probs = self.predict_proba(leaf_features(pre["image"], pre["leaf_mask"]))
+        ok = bool(self.confident(probs)[0])
+        label = self.vocab[int(probs[0].argmax())]
+        with self._lock:
+            if ok:
+                self.exits += 1
+            else:
+                self.escalations += 1
+        counter("leaf_cascade", outcome="exit" if ok else "escalate", label=label if ok else "")
+        return CascadeDecision(probs[0], label, ok)
+
+    @property
+    def escalation_rate(self) -> float:
+        total = self.exits + self.escalations
+        return self.escalations / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "version": CASCADE_VERSION,
+            "features": list(FEATURE_NAMES),
+            "vocab": self.vocab,
+            "mean": self.mean.tolist(), "scale": self.scale.tolist(),
+            "coef": self.coef.tolist(), "intercept": self.intercept.tolist(),
+            # JSON has no inf: never-exit classes are stored as null
+            "thresholds": [None if not np.isfinite(t) else float(t) for t in self.thresholds],
+            "meta": self.meta,
+        }
+
+    def save(self, path: str) -> str:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "LeafCascade":
+        with open(path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        if d.get("version") != CASCADE_VERSION or d.get("features") != list(FEATURE_NAMES):
+            raise ValueError(f"{path}: cascade built for different features; re-run leaf_cascade.py")
+        thresholds = [float("inf") if t is None else t for t in d["thresholds"]]
+        return cls(d["vocab"], d["mean"], d["scale"], d["coef"], d["intercept"], thresholds, d.get("meta"))
+
+# ---------------------------
+# Fit + report
+# ---------------------------
+
+def _labels(files: Sequence[str], vocab: List[str], label: Optional[str] = None) -> np.ndarray:
+    return np.array([vocab.index(label or os.path.basename(os.path.dirname(p))) for p in files])
+
+def evaluate(cascade: LeafCascade, X: np.ndarray, y: np.ndarray,
+             cnn_pred: Optional[np.ndarray] = None) -> dict:
+    """Escalation rate and exit precision on (X, y); cascade accuracy when CNN predictions are given."""
+    probs = cascade.predict_proba(X)
+    pred, ok = probs.argmax(axis=1), cascade.confident(probs)
+    report = {
+        "images": int(len(y)),
+        "escalation_rate": float(1.0 - ok.mean()) if len(y) else 0.0,
+        "exit_precision": float((pred[ok] == y[ok]).mean()) if ok.any() else None,
+        "cheap_accuracy": float((pred == y).mean()) if len(y) else None,
+        "exits_by_class": {c: int((ok & (pred == i)).sum()) for i, c in enumerate(cascade.vocab)},
+    }
+    if cnn_pred is not None:
+        final = np.where(ok, pred, cnn_pred)
+        report["cnn_accuracy"] = float((cnn_pred == y).mean())
+        report["cascade_accuracy"] = float((final == y).mean())
+    return report
+
+def fit_cascade(data_dir: str, non_leaf_dir: Optional[str] = None, model: Optional[str] = None,
+                target: float = 0.98, min_support: int = 20, workers: Optional[int] = None,
+                threads: Optional[int] = None, seed: int = 0) -> Tuple[LeafCascade, dict]:
+    """Train on the training split, calibrate/report on halves of the validation split."""
+    from model_export import split_files
+    from dataset_pack import labelled_files
+
+    train, valid = split_files(data_dir)
+    vocab = sorted({os.path.basename(os.path.dirname(p)) for p in train + valid})
+    X_tr, ms = features_for_files(train, workers)
+    X_va, _ = features_for_files(valid, workers)
+    y_tr, y_va = _labels(train, vocab), _labels(valid, vocab)
+    cnn_vocab = list(vocab)
+
+    if non_leaf_dir:  # same 80/20 split of the extra folder
+        vocab.append(NON_LEAF)
+        extra = labelled_files(non_leaf_dir)
+        perm = np.random.RandomState(42).permutation(len(extra))
+        cut = int(round(0.2 * len(extra)))
+        nl_va, nl_tr = [extra[i] for i in perm[:cut]], [extra[i] for i in perm[cut:]]
+        X_tr = np.concatenate([X_tr, features_for_files(nl_tr, workers)[0]])
+        X_va = np.concatenate([X_va, features_for_files(nl_va, workers)[0]])
+        y_tr = np.concatenate([y_tr, _labels(nl_tr, vocab, NON_LEAF)])
+        y_va = np.concatenate([y_va, _labels(nl_va, vocab, NON_LEAF)])
+        valid = valid + nl_va
+
+    params = fit_softmax(X_tr, y_tr, len(vocab))
+    cascade = LeafCascade(vocab, thresholds=[float("inf")] * len(vocab), **params)
+
+    # calibrate on one half of the validation split, report on the other
+    perm = np.random.RandomState(seed).permutation(len(y_va))
+    calib, hold = perm[: len(perm) // 2], perm[len(perm) // 2:]
+    cascade.thresholds = np.asarray(calibrate_thresholds(
+        cascade.predict_proba(X_va[calib]), y_va[calib], target, min_support))
+
+    cnn_pred, cnn_ms = None, None
+    if model:
+        from model_export import load_classifier, predict_files
+        clf = load_classifier(model, threads)
+        if list(clf.vocab) != cnn_vocab:
+            raise ValueError(f"{model} classes {clf.vocab} != dataset classes {cnn_vocab}")
+        hold_files = [valid[i] for i in hold]
+        leafy = [i for i in range(len(hold)) if y_va[hold[i]] < len(cnn_vocab)]
+        cnn_pred = np.full(len(hold), -1)  # the CNN is wrong on every non-leaf image
+        pred, cnn_ms = predict_files(clf, [hold_files[i] for i in leafy])
+        cnn_pred[leafy] = pred
+
+    report = evaluate(cascade, X_va[hold], y_va[hold], cnn_pred)
+    report.update(feature_ms=ms, cnn_ms=cnn_ms, target=target, min_support=min_support,
+                  calibration_images=int(len(calib)))
+    if cnn_ms:
+        # preprocessing is shared by both paths; compare the per-image model cost
+        report["relative_cost"] = (ms + report["escalation_rate"] * cnn_ms) / cnn_ms
+    cascade.meta = {"data": data_dir, "non_leaf": non_leaf_dir, "target": target,
+                    "min_support": min_support, "train_images": int(len(y_tr)),
+                    "calibration_images": int(len(calib)), "holdout": report}
+    return cascade, report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit + calibrate the cheap-first leaf cascade")
+    parser.add_argument("--data", default="Data", help="class-folder dataset root")
+    parser.add_argument("--out", default=os.path.join("Data", "leaf_cascade.json"))
+    parser.add_argument("--non-leaf", default=None, help="folder of images without a leaf")
+    parser.add_argument("--model", default=None, help="CNN (.pkl/.pt/.onnx) for the cascade-vs-CNN report")
+    parser.add_argument("--target", type=float, default=0.98, help="required precision of cheap exits")
+    parser.add_argument("--min-support", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    cascade, report = fit_cascade(args.data, args.non_leaf, args.model, args.target,
+                                  args.min_support, args.workers, args.threads)
+    cascade.save(args.out)
+    print(f"✅ Wrote {args.out}")
+    for c, t in zip(cascade.vocab, cascade.thresholds):
+        print(f"  {c:<14} exit at p >= {t:.3f}" if np.isfinite(t) else f"  {c:<14} always escalates")
+    print(json.dumps(report, indent=1))
@@ -0,0 +1,474 @@
+# leaf_transforms.py
+"""
+Leaf preprocessing transforms from main.ipynb's item pipeline, importable outside the notebook.
+
+Each stage is a plain NumPy/OpenCV function on an RGB uint8 array that returns
+its output plus a `reason` string (None when the stage was applied, otherwise
+why it was skipped/fell back — the notebook's `debug` messages). The fastai
+`Transform` classes below wrap these functions with the notebook's parameters
+and random `p` gating, so notebooks keep using the same names. Every branch
+decision is also counted as leaf_transform{stage, outcome} (instrumentation.py):
+
+    from leaf_transforms import GrayWorldWB, LeafMaskRefine, SuppressSkinAndBG, \
+        SmartLesionCrop, CLAHEContrast
+
+Note: fastai's Resize returns a new image, so the `leaf_mask` attribute set by
+LeafMaskRefine used to be dropped before SuppressSkinAndBG could read it. The
+wrappers here resize the mask with the image and re-attach it.
+"""
+
+from __future__ import annotations
+from typing import Optional, Tuple
+import random
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from instrumentation import counter, span
+
+try:
+    from fastai.vision.all import Transform, PILImage
+except ImportError:  # stage functions and the precompute cache work without fastai
+    Transform, PILImage = object, None
+
+def _record(stage: str, reason: Optional[str]) -> None:
+    """Branch decision → leaf_transform{stage, outcome} counter (outcome "applied" or the reason)."""
+    counter("leaf_transform", stage=stage, outcome=reason or "applied")
+
+# ---------------------------
+# Geometry helpers
+# ---------------------------
+
+def resize_square(a: np.ndarray, size: int, mask: bool = False) -> np.ndarray:
+    """Center crop to square, then resize (fastai Resize(size) in validation mode)."""
+    h, w = a.shape[:2]
+    if (h, w) == (size, size):
+        return a
+    s = min(h, w)
+    y0, x0 = (h - s) // 2, (w - s) // 2
+    img = Image.fromarray(np.ascontiguousarray(a[y0:y0 + s, x0:x0 + s]))
+    img = img.resize((size, size), Image.NEAREST if mask else Image.BILINEAR)
+    return np.asarray(img)
+
+def _pad_box(x, y, w, h, pad, shape):
+    px, py = int(pad * w), int(pad * h)
+    x0, y0 = max(0, x - px), max(0, y - py)
+    x1, y1 = min(shape[1], x + w + px), min(shape[0], y + h + py)
+    return x0, y0, x1, y1
+
+# ---------------------------
+# A) Gray World White Balance
+# ---------------------------
+
+def channel_means(a: np.ndarray) -> np.ndarray:
+    return a.reshape(-1, 3).mean(0, dtype=np.float64).astype(np.float32)
+
+def gray_world_wb(a: np.ndarray, means: np.ndarray = None) -> Tuple[np.ndarray, Optional[str]]:
+    """`means` lets callers pass channel means of the uncropped frame."""
+    f = a.astype(np.float32)
+    means = f.reshape(-1, 3).mean(0) if means is None else means
+    imbalance = (abs(means[0] - means[1]) + abs(means[1] - means[2])) / means.mean()
+    if imbalance < 0.2:
+        return a, "low imbalance"
+    scale = means.mean() / (means + 1e-6)
+    return np.clip(f * scale, 0, 255).astype(np.uint8), None
+
+# ---------------------------
+# B) Leaf Mask + Crop (GrabCut)
+# ---------------------------
+
+def green_mask(hsv: np.ndarray) -> np.ndarray:
+    H, S, V = cv2.split(hsv)
+    return ((H >= 30) & (H <= 95) & (S > 40) & (V > 40)).astype(np.uint8)
+
+def leaf_box(a: np.ndarray, pad: float = 0.10, hsv: np.ndarray = None
+             ) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[np.ndarray], Optional[str]]:
+    """GrabCut leaf segmentation → (padded box (x0, y0, x1, y1), full-size mask, reason)."""
+    try:
+        hsv = cv2.cvtColor(a, cv2.COLOR_RGB2HSV) if hsv is None else hsv
+        green = green_mask(hsv)
+        if green.sum() == 0:
+            return None, None, "no green mask"
+
+        exg = (2 * a[:, :, 1] - a[:, :, 0] - a[:, :, 2]).astype(np.float32)
+        m0 = (exg > np.quantile(exg[green > 0], 0.30)).astype(np.uint8) * 255
+        m0 = cv2.morphologyEx(m0, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+        m0 = cv2.morphologyEx(m0, cv2.MORPH_CLOSE, np.ones((7, 7), np.uint8))
+
+        mask = np.where(m0 > 0, cv2.GC_PR_FGD, cv2.GC_BGD).astype('uint8')
+        bgd, fgd = np.zeros((1, 65), np.float64), np.zeros((1, 65), np.float64)
+        rect = (1, 1, a.shape[1] - 2, a.shape[0] - 2)
+        try: cv2.grabCut(a, mask, rect, bgd, fgd, 3, cv2.GC_INIT_WITH_MASK)
+        except Exception: pass
+
+        leaf = np.where((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD), 255, 0).astype('uint8')
+        cnts, _ = cv2.findContours(leaf, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not cnts:
+            return None, None, "no contours"
+
+        x, y, w, h = cv2.boundingRect(max(cnts, key=cv2.contourArea))
+        if w * h < 0.3 * a.shape[0] * a.shape[1]:  # require ≥30% coverage
+            return None, None, "too small"
+
+        return _pad_box(x, y, w, h, pad, a.shape), leaf, None
+    except Exception:
+        return None, None, "exception"
+
+def leaf_mask_refine(a: np.ndarray, pad: float = 0.10, hsv: np.ndarray = None
+                     ) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[str]]:
+    """Returns (leaf crop, leaf mask for the crop, reason); mask is None on fallback."""
+    box, leaf, reason = leaf_box(a, pad, hsv)
+    if box is None:
+        return a, None, reason
+    x0, y0, x1, y1 = box
+    return a[y0:y1, x0:x1].copy(), leaf[y0:y1, x0:x1], None
+
+# ---------------------------
+# C) Suppress Skin / Background
+# ---------------------------
+
+def suppress_skin_bg(a: np.ndarray, mask: Optional[np.ndarray], blur_bg: bool = True,
+                     blur_ks: int = 7, hsv: np.ndarray = None
+                     ) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[str]]:
+    """Returns (image, refined leaf mask, reason)."""
+    if mask is None:
+        return a, None, "no mask"
+    hsv = cv2.cvtColor(a, cv2.COLOR_RGB2HSV) if hsv is None else hsv
+    H, S, V = cv2.split(hsv)
+    skin = (((H < 25) | (H > 165)) & (S > 20) & (V > 60)).astype(np.uint8) * 255
+    leaf = cv2.bitwise_and(mask, cv2.bitwise_not(skin))
+    leaf = cv2.morphologyEx(leaf, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+
+    if blur_bg and leaf.sum() > 0.5 * mask.size:
+        bg = cv2.GaussianBlur(a, (blur_ks, blur_ks), 0)
+        leaf3 = cv2.merge([leaf, leaf, leaf])
+        a = np.where(leaf3 > 0, a, bg)
+    return a, leaf, None
+
+# ---------------------------
+# D) Smart Lesion Crop
+# ---------------------------
+
+def lesion_score(a: np.ndarray, hsv: np.ndarray = None, lab: np.ndarray = None,
+                 weights=(0.9, 0.7, 0.4), sigma: float = 5) -> np.ndarray:
+    """Blurred brown/dark/yellow lesion score (float32, H×W)."""
+    a16 = a.astype(np.int16)
+    R, G, B = a16[:, :, 0], a16[:, :, 1], a16[:, :, 2]
+    lab = cv2.cvtColor(a, cv2.COLOR_RGB2LAB) if lab is None else lab
+    hsv = cv2.cvtColor(a, cv2.COLOR_RGB2HSV) if hsv is None else hsv
+    H, S, V = cv2.split(hsv)
+    brown = np.clip((R - G) + 0.5 * (R - B), 0, None).astype(np.float32)
+    dark = (255 - lab[:, :, 0]).astype(np.float32)
+    yellow = ((H >= 20) & (H <= 40) & (S > 40) & (V > 80)).astype(np.float32)
+    wb, wd, wy = weights
+    score = (wb * brown + wd * dark + wy * yellow)
+    return cv2.GaussianBlur(score, (0, 0), sigma)
+
+def smart_lesion_crop(a: np.ndarray, mask: Optional[np.ndarray] = None, min_area: int = 1200,
+                      pad: float = 0.08, hsv: np.ndarray = None, lab: np.ndarray = None,
+                      sigma: float = 5
+                      ) -> Tuple[np.ndarray, Optional[Tuple[int, int, int, int]], Optional[str]]:
+    """Returns (crop or original, crop box (x0, y0, x1, y1) or None, reason)."""
+    if mask is None:
+        mask = np.ones(a.shape[:2], np.uint8) * 255
+    score = lesion_score(a, hsv, lab, sigma=sigma)
+    score *= (mask > 0).astype(np.float32)
+
+    for q in (0.997, 0.994, 0.990, 0.985):
+        if not np.any(score > 0): break
+        thr = np.quantile(score[mask > 0], q)
+        m = (score >= thr).astype(np.uint8) * 255
+        m = cv2.morphologyEx(m, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+        m = cv2.dilate(m, np.ones((9, 9), np.uint8), 2)
+        cnts, _ = cv2.findContours(m, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not cnts: continue
+        x, y, w, h = cv2.boundingRect(max(cnts, key=cv2.contourArea))
+        if w * h < min_area: continue
+
+        if w < 0.4 * a.shape[1] or h < 0.4 * a.shape[0]:
+            return a, None, "too zoomed"
+        if x == 0 or y == 0 or (x + w) == a.shape[1] or (y + h) == a.shape[0]:
+            return a, None, "touching border"
+
+        x0, y0, x1, y1 = _pad_box(x, y, w, h, pad, a.shape)
+        crop = a[y0:y1, x0:x1]
+        if crop.std() < 10:
+            return a, None, "flat crop"
+        return crop.copy(), (x0, y0, x1, y1), None
+
+    return a, None, "no lesion found"
+
+# ---------------------------
+# E) CLAHE Contrast
+# ---------------------------
+
+_CLAHE = cv2.createCLAHE(clipLimit=1.5, tileGridSize=(8, 8))  # softer
+
+def clahe_contrast(a: np.ndarray, hsv: np.ndarray = None, lab: np.ndarray = None
+                   ) -> Tuple[np.ndarray, Optional[str]]:
+    hsv = cv2.cvtColor(a, cv2.COLOR_RGB2HSV) if hsv is None else hsv
+    S, V = hsv[:, :, 1], hsv[:, :, 2]
+    if S.mean() > 180:
+        return a, "high saturation"
+    if V.std() > 40:  # already enough contrast
+        return a, "high std"
+    lab = cv2.cvtColor(a, cv2.COLOR_RGB2LAB) if lab is None else lab
+    L, A, B = cv2.split(lab)
+    L2 = _CLAHE.apply(L)
+    return cv2.cvtColor(cv2.merge((L2, A, B)), cv2.COLOR_LAB2RGB), None
+
+# ---------------------------
+# Fused pipeline (single buffer, shared color spaces)
+# ---------------------------
+
+class LeafFrame:
+    """
+    RGB buffer plus lazily derived HSV/LAB and leaf mask. Crops slice all of
+    them together (views, no copies); pixel edits drop the derived spaces.
+    """
+
+    def __init__(self, rgb: np.ndarray, hsv: np.ndarray = None, lab: np.ndarray = None,
+                 mask: np.ndarray = None):
+        self.rgb, self._hsv, self._lab, self.mask = rgb, hsv, lab, mask
+
+    @property
+    def hsv(self) -> np.ndarray:
+        if self._hsv is None:
+            self._hsv = cv2.cvtColor(np.ascontiguousarray(self.rgb), cv2.COLOR_RGB2HSV)
+        return self._hsv
+
+    @property
+    def lab(self) -> np.ndarray:
+        if self._lab is None:
+            self._lab = cv2.cvtColor(np.ascontiguousarray(self.rgb), cv2.COLOR_RGB2LAB)
+        return self._lab
+
+    def crop(self, box: Tuple[int, int, int, int]) -> "LeafFrame":
+        x0, y0, x1, y1 = box
+        sl = (slice(y0, y1), slice(x0, x1))
+        return LeafFrame(
+            self.rgb[sl],
+            None if self._hsv is None else self._hsv[sl],
+            None if self._lab is None else self._lab[sl],
+            None if self.mask is None else self.mask[sl],
+        )
+
+    def with_pixels(self, rgb: np.ndarray, mask: np.ndarray = None) -> "LeafFrame":
+        return LeafFrame(rgb, mask=self.mask if mask is None else mask)
+
+def _square(frame: "LeafFrame") -> "LeafFrame":
+    """Center square of a frame (the crop part of Resize, without resampling)."""
+    h, w = frame.rgb.shape[:2]
+    side = min(h, w)
+    y0, x0 = (h - side) // 2, (w - side) // 2
+    return frame.crop((x0, y0, x0 + side, y0 + side))
+
+def load_rgb(path: str, min_size: int = 256) -> np.ndarray:
+    """Decode as RGB; JPEGs are DCT-downscaled while staying ≥ min_size."""
+    img = Image.open(path)
+    img.draft("RGB", (min_size, min_size))
+    return np.asarray(img.convert("RGB"))
+
+def fused_preprocess(a: np.ndarray, final_size: int = 256, wb: bool = True, leaf: bool = True,
+                     suppress: bool = True, lesion_crop: bool = True, clahe: bool = True,
+                     pad: float = 0.10, blur_bg: bool = True, blur_ks: int = 7,
+                     min_area: int = 1200, lesion_pad: float = 0.08) -> dict:
+    """
+    The five stages on one buffer. The image is brought to the working size the
+    stage parameters were tuned for (final_size, as after the notebook's first
+    Resize), cropped by slicing, and resized once more only at the end. HSV/LAB
+    are computed once and shared between stages until pixels change.
+    Returns dict(image, leaf_mask, reasons) with reasons[stage] = skip/fallback
+    reason or None.
+    """
+    reasons = {}
+    means = channel_means(a) if wb else None   # WB statistics come from the full frame
+    a = resize_square(a, final_size)
+    if wb:
+        with span("leaf_stage", stage="GrayWorldWB"):
+            a, reasons["GrayWorldWB"] = gray_world_wb(a, means)
+    frame = LeafFrame(a)
+
+    if leaf:
+        with span("leaf_stage", stage="LeafMaskRefine"):
+            box, mask, reasons["LeafMaskRefine"] = leaf_box(frame.rgb, pad, frame.hsv)
+        if box is not None:
+            frame.mask = mask
+            frame = _square(frame.crop(box))
+
+    if suppress:
+        with span("leaf_stage", stage="SuppressSkinAndBG"):
+            out, mask, reasons["SuppressSkinAndBG"] = suppress_skin_bg(
+                frame.rgb, frame.mask, blur_bg, blur_ks, frame.hsv)
+        if mask is not None:
+            frame = frame.with_pixels(out, mask) if out is not frame.rgb else \
+                LeafFrame(frame.rgb, frame._hsv, frame._lab, mask)
+
+    if lesion_crop:
+        # the chained version upsampled the leaf crop to final_size first;
+        # keep pixel-area thresholds equivalent at the crop's own scale
+        scale = frame.rgb.shape[0] / final_size
+        with span("leaf_stage", stage="SmartLesionCrop"):
+            _, box, reasons["SmartLesionCrop"] = smart_lesion_crop(
+                frame.rgb, frame.mask, min_area * scale * scale, lesion_pad, frame.hsv, frame.lab,
+                sigma=5 * scale)
+        if box is not None:
+            frame = _square(frame.crop(box))
+
+    if clahe:
+        with span("leaf_stage", stage="CLAHEContrast"):
+            out, reasons["CLAHEContrast"] = clahe_contrast(frame.rgb, frame.hsv, frame.lab)
+        if out is not frame.rgb:
+            frame = frame.with_pixels(out)
+
+    for stage, reason in reasons.items():
+        _record(stage, reason)
+    mask = frame.mask if frame.mask is not None else np.zeros(frame.rgb.shape[:2], np.uint8)
+    return {
+        "image": resize_square(np.ascontiguousarray(frame.rgb), final_size),
+        "leaf_mask": resize_square(np.ascontiguousarray(mask), final_size, mask=True),
+        "reasons": reasons,
+    }
+
+# ---------------------------
+# Deterministic prefix (used by the precompute cache)
+# ---------------------------
+
+def deterministic_stages(a: np.ndarray, final_size: int = 256, pad: float = 0.10,
+                         blur_bg: bool = True, blur_ks: int = 7, min_area: int = 1200,
+                         lesion_pad: float = 0.08):
+    """
+    GrayWorldWB → LeafMaskRefine → SuppressSkinAndBG at p=1, each followed by
+    the notebook's Resize, plus the SmartLesionCrop branch computed up front.
+    Returns dict(base, lesion, leaf_mask, lesion_mask) at final_size
+    (masks are zeros when no leaf was found).
+    """
+    a = resize_square(gray_world_wb(a)[0], final_size)
+    crop, mask, _ = leaf_mask_refine(a, pad)
+    a = resize_square(crop, final_size)
+    mask = resize_square(mask, final_size, mask=True) if mask is not None else None
+    a, mask, _ = suppress_skin_bg(a, mask, blur_bg, blur_ks)
+    lesion, box, _ = smart_lesion_crop(a, mask, min_area, lesion_pad)
+    if mask is None:
+        mask = np.zeros(a.shape[:2], np.uint8)
+    lesion_mask = mask
+    if box is not None:
+        x0, y0, x1, y1 = box
+        lesion_mask = resize_square(mask[y0:y1, x0:x1], final_size, mask=True)
+    return {
+        "base": a,
+        "lesion": resize_square(lesion, final_size),
+        "leaf_mask": mask,
+        "lesion_mask": lesion_mask,
+    }
+
+# ---------------------------
+# fastai Transforms (same names/params as the notebook)
+# ---------------------------
+
+def _to_pil(a: np.ndarray, final_size: int, mask: Optional[np.ndarray] = None):
+    pil = PILImage.create(resize_square(a, final_size))
+    if mask is not None:
+        pil.leaf_mask = resize_square(mask, final_size, mask=True)
+    return pil
+
+def _passthrough(img, final_size: int):
+    return _to_pil(np.array(img.convert('RGB')), final_size, getattr(img, 'leaf_mask', None))
+
+class GrayWorldWB(Transform):
+    order = 3
+    def __init__(self, p=0.5, final_size=256, debug=False):
+        self.p, self.final_size, self.debug = p, final_size, debug
+    def encodes(self, img: PILImage):
+        if random.random() > self.p:
+            _record("GrayWorldWB", "random p")
+            if self.debug: print("[GrayWorldWB] skipped (random p)")
+            return _passthrough(img, self.final_size)
+        out, reason = gray_world_wb(np.array(img.convert('RGB')))
+        _record("GrayWorldWB", reason)
+        if reason and self.debug: print(f"[GrayWorldWB] skipped ({reason})")
+        return _to_pil(out, self.final_size, getattr(img, 'leaf_mask', None))
+
+class LeafMaskRefine(Transform):
+    order = 4
+    def __init__(self, pad=0.10, p=1.0, final_size=256, debug=False):
+        self.pad, self.p, self.final_size, self.debug = pad, p, final_size, debug
+    def encodes(self, img: PILImage):
+        if random.random() > self.p:
+            _record("LeafMaskRefine", "random p")
+            if self.debug: print("[LeafMaskRefine] skipped (random p)")
+            return _passthrough(img, self.final_size)
+        out, mask, reason = leaf_mask_refine(np.array(img.convert('RGB')), self.pad)
+        _record("LeafMaskRefine", reason)
+        if reason and self.debug: print(f"[LeafMaskRefine] fallback ({reason})")
+        return _to_pil(out, self.final_size, mask)
+
+class SuppressSkinAndBG(Transform):
+    order = 5
+    def __init__(self, blur_bg=True, blur_ks=7, p=0.6, final_size=256, debug=False):
+        self.blur_bg, self.blur_ks, self.p, self.final_size, self.debug = blur_bg, blur_ks, p, final_size, debug
+    def encodes(self, img: PILImage):
+        if random.random() > self.p:
+            _record("SuppressSkinAndBG", "random p")
+            if self.debug: print("[SuppressSkinAndBG] skipped (random p)")
+            return _passthrough(img, self.final_size)
+        out, mask, reason = suppress_skin_bg(np.array(img.convert('RGB')), getattr(img, 'leaf_mask', None),
+                                             self.blur_bg, self.blur_ks)
+        _record("SuppressSkinAndBG", reason)
+        if reason and self.debug: print(f"[SuppressSkinAndBG] fallback ({reason})")
+        return _to_pil(out, self.final_size, mask)
+
+class SmartLesionCrop(Transform):
+    order = 6
+    def __init__(self, p=0.7, min_area=1200, pad=0.08, final_size=256, debug=False):
+        self.p, self.min_area, self.pad, self.final_size, self.debug = p, min_area, pad, final_size, debug
+    def encodes(self, img: PILImage):
+        if random.random() > self.p:
+            _record("SmartLesionCrop", "random p")
+            if self.debug: print("[SmartLesionCrop] skipped (random p)")
+            return _passthrough(img, self.final_size)
+        mask = getattr(img, 'leaf_mask', None)
+        out, box, reason = smart_lesion_crop(np.array(img.convert('RGB')), mask, self.min_area, self.pad)
+        _record("SmartLesionCrop", reason)
+        if reason and self.debug: print(f"[SmartLesionCrop] fallback ({reason})")
+        if box is not None and mask is not None:
+            x0, y0, x1, y1 = box
+            mask = mask[y0:y1, x0:x1]
+        return _to_pil(out, self.final_size, mask)
+
+class CLAHEContrast(Transform):
+    order = 7
+    def __init__(self, p=0.5, final_size=256, debug=False):
+        self.p, self.final_size, self.debug = p, final_size, debug
+    def encodes(self, img: PILImage):
+        if random.random() > self.p:
+            _record("CLAHEContrast", "random p")
+            if self.debug: print("[CLAHEContrast] skipped (random p)")
+            return _passthrough(img, self.final_size)
+        out, reason = clahe_contrast(np.array(img.convert('RGB')))
+        _record("CLAHEContrast", reason)
+        if reason and self.debug: print(f"[CLAHEContrast] skipped ({reason})")
+        return _to_pil(out, self.final_size, getattr(img, 'leaf_mask', None))
+
+_STAGE_NAMES = dict(wb="GrayWorldWB", leaf="LeafMaskRefine", suppress="SuppressSkinAndBG",
+                    lesion_crop="SmartLesionCrop", clahe="CLAHEContrast")
+
+class FusedLeafPreprocess(Transform):
+    """All five stages in one item transform (fused_preprocess); p_* gate each stage."""
+    order = 3
+    def __init__(self, p_wb=1.0, p_leaf=1.0, p_suppress=1.0, p_lesion=0.8, p_clahe=1.0,
+                 final_size=256, debug=False):
+        self.ps = dict(wb=p_wb, leaf=p_leaf, suppress=p_suppress, lesion_crop=p_lesion, clahe=p_clahe)
+        self.final_size, self.debug = final_size, debug
+    def encodes(self, img: PILImage):
+        gates = {k: random.random() <= p for k, p in self.ps.items()}
+        for k, on in gates.items():
+            if not on: _record(_STAGE_NAMES[k], "random p")
+        out = fused_preprocess(np.array(img.convert('RGB')), self.final_size, **gates)
+        if self.debug:
+            for stage, reason in out["reasons"].items():
+                if reason: print(f"[{stage}] skipped/fallback ({reason})")
+        pil = PILImage.create(out["image"])
+        pil.leaf_mask = out["leaf_mask"]
+        return pil
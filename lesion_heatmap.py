@@ -0,0 +1,134 @@
+# lesion_heatmap.py
+"""
+Lesion heatmap overlays (brown/dark/yellow score inside the leaf), from main.ipynb.
+
+`lesion_heatmap_batch` works on a stacked N×H×W×3 uint8 batch: colour
+conversions and the colormap run once on the whole batch (viewed as one tall
+image), and the box threshold is an order statistic from np.partition instead
+of a full np.quantile sort. Only the blur/normalization and the contour search
+remain per image.
+
+The notebook's two variants are presets:
+
+    lesion_heatmap(a, leaf_mask=...)                  # weighted score, top 2% box
+    lesion_heatmap_batch(x, masks, **BROWNNESS)       # show_lesion_heatmap
+"""
+
+from __future__ import annotations
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from leaf_transforms import green_mask
+
+# show_lesion_heatmap: brownness only, gamma 0.5, top 5% box, stronger overlay
+BROWNNESS = dict(weights=(1.0, 0.0, 0.0), gamma=0.5, top_frac=0.05, alpha=0.65)
+
+def leaf_region_mask(a: np.ndarray) -> np.ndarray:
+    """HSV green mask, closed, largest contour filled (show_lesion_heatmap's leaf mask)."""
+    mask = green_mask(cv2.cvtColor(a, cv2.COLOR_RGB2HSV)) * 255
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((7, 7), np.uint8))
+    cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if cnts:
+        mask = np.zeros_like(mask)
+        cv2.drawContours(mask, [max(cnts, key=cv2.contourArea)], -1, 255, -1)
+    return mask
+
+# JET in RGB order, for cv2.applyColorMap's user-colormap form (no BGR→RGB pass)
+_JET_RGB = np.ascontiguousarray(
+    cv2.applyColorMap(np.arange(256, dtype=np.uint8)[:, None], cv2.COLORMAP_JET)[:, :, ::-1])
+
+def _tall(x: np.ndarray) -> np.ndarray:
+    """N×H×W[×C] → (N·H)×W[×C] view, so per-pixel cv2 ops cover the batch in one call."""
+    return x.reshape((-1,) + x.shape[2:])
+
+def lesion_scores(images: np.ndarray, leaf_masks: Optional[np.ndarray] = None,
+                  weights: Sequence[float] = (0.7, 0.6, 0.5), sigma: float = 5,
+                  gamma: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (scores N×H×W float32 in 0..1, normalized within each leaf and 0
+    outside it; leaf N×H×W bool). Empty or missing masks mean "whole image".
+    """
+    n, h, w, _ = images.shape
+    w_brown, w_dark, w_yellow = weights
+    tall = _tall(images)
+    # w·max(0, (R-G) + 0.5(R-B)) as one 1×3 colour transform
+    score = cv2.transform(tall.astype(np.float32), np.float32([[1.5, -1.0, -0.5]]) * w_brown)
+    np.maximum(score, 0, out=score)
+    if w_dark:  # + w·(255 - L)
+        L = cv2.extractChannel(cv2.cvtColor(tall, cv2.COLOR_RGB2LAB), 0)
+        score = cv2.scaleAdd(L.astype(np.float32), -w_dark, score)
+        score += np.float32(255 * w_dark)
+    if w_yellow:  # + w where H∈[20,40], S>40, V>80
+        yellow = cv2.inRange(cv2.cvtColor(tall, cv2.COLOR_RGB2HSV), (20, 41, 81), (40, 255, 255))
+        cv2.add(score, w_yellow, dst=score, mask=yellow)
+    score = score.reshape(n, h, w)
+
+    if leaf_masks is None:
+        leaf = np.ones((n, h, w), bool)
+    else:
+        leaf = np.asarray(leaf_masks).reshape(n, h, w) > 0
+        leaf[~leaf.any(axis=(1, 2))] = True
+
+    full = leaf.all(axis=(1, 2))
+    for i in range(n):
+        s = cv2.GaussianBlur(score[i], (0, 0), sigma)
+        m = None if full[i] else leaf[i].view(np.uint8)
+        lo, hi, _, _ = cv2.minMaxLoc(s, m)
+        s -= lo
+        s *= 1.0 / (hi - lo + 1e-6)
+        score[i] = s if m is None else cv2.copyTo(s, m)  # zeros outside the leaf
+    np.clip(score, 0.0, 1.0, out=score)
+    if gamma != 1.0:
+        np.power(score, gamma, out=score)
+    return score, leaf
+
+def top_fraction_threshold(values: np.ndarray, top_frac: float) -> float:
+    """np.quantile(values, 1 - top_frac) via np.partition (linear interpolation)."""
+    q = (1.0 - top_frac) * (values.size - 1)
+    k0 = int(q)
+    k1 = min(k0 + 1, values.size - 1)
+    part = np.partition(values, (k0, k1))
+    return float(part[k0] + (q - k0) * (part[k1] - part[k0]))
+
+def lesion_boxes(scores: np.ndarray, leaf: np.ndarray, top_frac: float = 0.02) -> np.ndarray:
+    """Bounding box (x, y, w, h) of the largest hot region per image; -1s if none."""
+    boxes = np.full((len(scores), 4), -1, np.int32)
+    for i, (s, m) in enumerate(zip(scores, leaf)):
+        thr = top_fraction_threshold(s[m], top_frac)
+        hot = ((s >= thr) & m).astype(np.uint8)
+        cnts, _ = cv2.findContours(hot, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if cnts:
+            boxes[i] = cv2.boundingRect(max(cnts, key=cv2.contourArea))
+    return boxes
+
+def lesion_heatmap_batch(images: np.ndarray, leaf_masks: Optional[np.ndarray] = None,
+                         alpha: float = 0.45, box: bool = True, top_frac: float = 0.02,
+                         weights: Sequence[float] = (0.7, 0.6, 0.5), sigma: float = 5,
+                         gamma: float = 1.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    images: N×H×W×3 uint8 RGB; leaf_masks: N×H×W (e.g. leaf_region_mask's
+    output) or None. Returns (overlays N×H×W×3 uint8, scores N×H×W float32,
+    boxes N×4 int32 as x, y, w, h with -1 where no box). Boxes are drawn on the
+    overlays when `box` is set.
+    """
+    images = np.ascontiguousarray(images, dtype=np.uint8)
+    scores, leaf = lesion_scores(images, leaf_masks, weights, sigma, gamma)
+
+    heat = cv2.applyColorMap(cv2.convertScaleAbs(_tall(scores), alpha=255), _JET_RGB)
+    overlays = cv2.addWeighted(_tall(images), 1 - alpha, heat, alpha, 0).reshape(images.shape)
+
+    boxes = lesion_boxes(scores, leaf, top_frac) if box else np.full((len(images), 4), -1, np.int32)
+    if box:
+        for ov, (x, y, w, h) in zip(overlays, boxes):
+            if w >= 0:
+                cv2.rectangle(ov, (int(x), int(y)), (int(x + w), int(y + h)), (255, 255, 255), 2)
+    return overlays, scores, boxes
+
+def lesion_heatmap(a: np.ndarray, alpha: float = 0.45, box: bool = True,
+                   leaf_mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Single image: (overlay uint8, score 0..1) — the notebook's signature."""
+    masks = None if leaf_mask is None else leaf_mask[None]
+    overlays, scores, _ = lesion_heatmap_batch(a[None], masks, alpha=alpha, box=box)
+    return overlays[0], scores[0]
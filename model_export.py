@@ -0,0 +1,276 @@
+# model_export.py
+"""
+Export the fastai leaf classifier (Data/final_model.pkl) to fastai-free graphs
+for CPU inference:
+
+  <out>.pt    TorchScript, fp32
+  <out>.onnx  ONNX, fp32
+  <out>.int8.onnx  ONNX, int8 (onnxruntime dynamic or static quantization;
+                   static is calibrated on images from the training split)
+
+Every graph takes uint8 N×H×W×3 RGB images (dataset_pack.packed_image, the
+Resize(256) view the model was trained on, resized to INPUT_SIZE) and returns
+class probabilities; the /255 + imagenet normalization and the softmax are
+baked in. Class names etc. go to a "<graph>.json" sidecar.
+
+    python model_export.py Data/final_model.pkl --out Data/leaf_model \
+        --format onnx torchscript --quantize static --calib 256 --check
+
+`--check` re-scores the validation split (RandomSplitter(0.2, seed=42), as in
+the notebook) with the fp32 learner and each exported graph and prints the
+notebook's classification_report for each, plus prediction agreement.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+from PIL import Image
+
+from dataset_pack import load_packed
+
+INPUT_SIZE = 224        # aug_transforms(size=224)
+PREPROCESS_SIZE = 256   # pack_dataset size / Resize(256)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+ONNX_OPSET = 17
+
+# ---------------------------
+# Inputs
+# ---------------------------
+
+def resize_input(a: np.ndarray, size: int = INPUT_SIZE) -> np.ndarray:
+    if a.shape[:2] != (size, size):
+        a = np.asarray(Image.fromarray(a).resize((size, size), Image.BILINEAR))
+    return a
+
+def stack_inputs(images: Sequence[np.ndarray], size: int = INPUT_SIZE) -> np.ndarray:
+    """uint8 H×W×3 images → contiguous uint8 N×size×size×3 batch."""
+    return np.ascontiguousarray(np.stack([resize_input(a, size) for a in images]))
+
+def preprocess_file(path: str, size: int = INPUT_SIZE) -> np.ndarray:
+    """Training-time preprocessing (same as pack_dataset and nlp_layer/api/vision_api.py)."""
+    return resize_input(load_packed(path, PREPROCESS_SIZE), size)
+
+# ---------------------------
+# Models
+# ---------------------------
+
+def wrap_model(model):
+    """fastai body+head → module taking uint8 NHWC, returning probabilities."""
+    import torch
+    from torch import nn
+
+    class NormalizedModel(nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+            self.register_buffer("mean", torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1) * 255.0)
+            self.register_buffer("inv_std", 1.0 / (torch.tensor(IMAGENET_STD).view(1, 3, 1, 1) * 255.0))
+
+        def forward(self, x):
+            x = x.permute(0, 3, 1, 2).float()
+            x = (x - self.mean) * self.inv_std
+            return torch.softmax(self.model(x), dim=1)
+
+    return NormalizedModel(model).eval()
+
+def load_learner_model(path: str):
+    """(wrapped fp32 torch module, vocab) from a fastai export."""
+    from fastai.learner import load_learner
+    learn = load_learner(path, cpu=True)
+    return wrap_model(learn.model.eval()), list(learn.dls.vocab)
+
+def export_torchscript(model, out_path: str, size: int = INPUT_SIZE) -> str:
+    import torch
+    example = torch.zeros(1, size, size, 3, dtype=torch.uint8)
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+    traced.save(out_path)
+    return out_path
+
+def export_onnx(model, out_path: str, size: int = INPUT_SIZE) -> str:
+    import torch
+    example = torch.zeros(1, size, size, 3, dtype=torch.uint8)
+    with torch.no_grad():
+        torch.onnx.export(model, example, out_path, input_names=["image"], output_names=["probs"],
+                          dynamic_axes={"image": {0: "batch"}, "probs": {0: "batch"}},
+                          opset_version=ONNX_OPSET, do_constant_folding=True)
+    return out_path
+
+class _CalibrationReader:
+    """onnxruntime CalibrationDataReader over preprocessed image files."""
+
+    def __init__(self, files: Sequence[str], size: int, batch_size: int = 16):
+        self.files, self.size, self.batch_size = list(files), size, batch_size
+        self.pos = 0
+
+    def get_next(self):
+        if self.pos >= len(self.files):
+            return None
+        part = self.files[self.pos:self.pos + self.batch_size]
+        self.pos += len(part)
+        return {"image": stack_inputs([preprocess_file(p, self.size) for p in part], self.size)}
+
+    def rewind(self):
+        self.pos = 0
+
+def quantize_onnx(src: str, dst: str, mode: str = "dynamic", calib_files: Sequence[str] = (),
+                  size: int = INPUT_SIZE) -> str:
+    """int8 weights (dynamic) or int8 weights + activations (static, calibrated)."""
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    if mode == "dynamic":
+        quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+    elif mode == "static":
+        if not calib_files:
+            raise ValueError("static quantization needs calibration images")
+        quantize_static(src, dst, _CalibrationReader(calib_files, size),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        raise ValueError(f"unknown quantization mode: {mode}")
+    return dst
+
+def write_meta(graph_path: str, vocab: List[str], size: int, **extra) -> str:
+    meta = {"vocab": vocab, "input_size": size, "input": "uint8 NHWC RGB", "output": "probs", **extra}
+    path = graph_path + ".json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return path
+
+def read_meta(graph_path: str) -> dict:
+    with open(graph_path + ".json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# ---------------------------
+# Runtime classifiers (same interface)
+# ---------------------------
+
+class TorchClassifier:
+    def __init__(self, model, vocab: List[str], size: int = INPUT_SIZE, threads: int = None):
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        self.torch, self.model, self.vocab, self.size = torch, model, vocab, size
+
+    def predict_batch(self, images: Sequence[np.ndarray]) -> np.ndarray:
+        batch = self.torch.from_numpy(stack_inputs(images, self.size))
+        with self.torch.inference_mode():
+            return self.model(batch).numpy()
+
+class OnnxClassifier:
+    def __init__(self, path: str, threads: int = None):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        meta = read_meta(path)
+        self.vocab, self.size = meta["vocab"], meta["input_size"]
+
+    def predict_batch(self, images: Sequence[np.ndarray]) -> np.ndarray:
+        return self.session.run(None, {"image": stack_inputs(images, self.size)})[0]
+
+def load_classifier(path: str, threads: int = None):
+    """.pkl → fastai learner, .pt → TorchScript, .onnx → onnxruntime."""
+    if path.endswith(".onnx"):
+        return OnnxClassifier(path, threads)
+    if path.endswith(".pt"):
+        import torch
+        meta = read_meta(path)
+        return TorchClassifier(torch.jit.load(path).eval(), meta["vocab"], meta["input_size"], threads)
+    model, vocab = load_learner_model(path)
+    return TorchClassifier(model, vocab, threads=threads)
+
+# ---------------------------
+# Data split + parity check
+# ---------------------------
+
+def split_files(data_dir: str, valid_pct: float = 0.2, seed: int = 42):
+    """(train, valid) file lists, split exactly like the notebook's dataloaders."""
+    from fastai.data.transforms import RandomSplitter, get_image_files
+    files = get_image_files(data_dir)
+    train_idx, valid_idx = RandomSplitter(valid_pct=valid_pct, seed=seed)(files)
+    return [str(files[i]) for i in train_idx], [str(files[i]) for i in valid_idx]
+
+def predict_files(clf, files: Sequence[str], batch_size: int = 32) -> Tuple[np.ndarray, float]:
+    """Predicted class indices and mean model time per image (ms)."""
+    preds, elapsed = [], 0.0
+    for i in range(0, len(files), batch_size):
+        images = [preprocess_file(p, clf.size) for p in files[i:i + batch_size]]
+        t0 = time.perf_counter()
+        probs = clf.predict_batch(images)
+        elapsed += time.perf_counter() - t0
+        preds.append(probs.argmax(axis=1))
+    return np.concatenate(preds), 1000.0 * elapsed / max(len(files), 1)
+
+def parity_check(reference: str, candidates: Sequence[str], data_dir: str,
+                 limit: Optional[int] = None, threads: int = None) -> Dict[str, dict]:
+    from sklearn.metrics import accuracy_score, classification_report
+
+    _, valid = split_files(data_dir)
+    if limit:
+        valid = valid[:limit]
+    ref = load_classifier(reference, threads)
+    y_true = np.array([ref.vocab.index(os.path.basename(os.path.dirname(p))) for p in valid])
+    ref_pred, ref_ms = predict_files(ref, valid)
+
+    summary = {}
+    for path in [reference, *candidates]:
+        if path == reference:
+            y_pred, ms = ref_pred, ref_ms
+        else:
+            clf = load_classifier(path, threads)
+            y_pred, ms = predict_files(clf, valid)
+        acc = accuracy_score(y_true, y_pred)
+        agree = float((y_pred == ref_pred).mean())
+        print(f"\n=== {path} ({os.path.getsize(path) / 1e6:.1f} MB, {ms:.1f} ms/img) ===")
+        print("Accuracy:", acc, "| agreement with fp32:", agree)
+        print(classification_report(y_true, y_pred, labels=range(len(ref.vocab)),
+                                    target_names=ref.vocab, zero_division=0))
+        summary[path] = {"accuracy": acc, "agreement": agree, "ms_per_image": ms}
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the leaf classifier for CPU inference")
+    parser.add_argument("model", help="fastai export, e.g. Data/final_model.pkl")
+    parser.add_argument("--out", default=os.path.join("Data", "leaf_model"), help="output path prefix")
+    parser.add_argument("--format", nargs="+", choices=["onnx", "torchscript"], default=["onnx"])
+    parser.add_argument("--quantize", choices=["none", "dynamic", "static"], default="none",
+                        help="int8 ONNX variant (needs --format onnx)")
+    parser.add_argument("--calib", type=int, default=256, help="training images for static calibration")
+    parser.add_argument("--data", default="Data", help="class-folder dataset root")
+    parser.add_argument("--check", action="store_true", help="classification_report parity on the valid split")
+    parser.add_argument("--check-limit", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    model, vocab = load_learner_model(args.model)
+    written = []
+    if "torchscript" in args.format:
+        written.append(export_torchscript(model, args.out + ".pt"))
+        write_meta(written[-1], vocab, INPUT_SIZE, format="torchscript", precision="fp32")
+    if "onnx" in args.format:
+        onnx_path = export_onnx(model, args.out + ".onnx")
+        written.append(onnx_path)
+        write_meta(onnx_path, vocab, INPUT_SIZE, format="onnx", precision="fp32")
+        if args.quantize != "none":
+            calib = []
+            if args.quantize == "static":
+                train, _ = split_files(args.data)
+                calib = random.Random(0).sample(train, min(args.calib, len(train)))
+            q_path = quantize_onnx(onnx_path, args.out + ".int8.onnx", args.quantize, calib)
+            written.append(q_path)
+            write_meta(q_path, vocab, INPUT_SIZE, format="onnx", precision="int8",
+                       quantization=args.quantize, calibration_images=len(calib))
+    for p in written:
+        print(f"✅ Wrote {p} ({os.path.getsize(p) / 1e6:.1f} MB)")
+
+    if args.check:
+        parity_check(args.model, written, args.data, args.check_limit, args.threads)
@@ -1,50 +1,326 @@
 from fastapi import FastAPI, Query
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
 import json
+import math
 import os
+import sys
+import threading
+
+import numpy as np
 
 app = FastAPI()
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__)) 
-DATA_FILE = os.path.join(BASE_DIR, "data", "processed.jsonl")
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+# Served data: processed corpus and advice artifact (benchmarks/tests point this elsewhere)
+DATA_DIR = os.environ.get("NLP_DATA_DIR", os.path.join(BASE_DIR, "data"))
+DATA_FILE = os.path.join(DATA_DIR, "processed.jsonl")
+CORPUS_FILE = os.path.join(DATA_DIR, "processed.corpus")  # scripts/corpus_store.py
+ADVICE_FILE = os.path.join(DATA_DIR, "advice.json")
+# Bound on advice generated on demand (LRU; each miss costs a model call)
+ADVICE_CACHE_SIZE = int(os.environ.get("ADVICE_CACHE_SIZE", 1024))
+# Languages served besides the artifact's (comma-separated translate codes)
+ADVICE_LANGUAGES = [l.strip() for l in os.environ.get("ADVICE_LANGUAGES", "").split(",") if l.strip()]
+
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+sys.path.append(os.path.dirname(BASE_DIR))  # repo root: shared instrumentation
+
+from instrumentation import counter, install_fastapi, span
+from corpus_store import is_stale, compile_jsonl, read_jsonl, CorpusStore, MemoryPostings, text_prefix, tokenize
+from model_registry import get_registry
+from precompute_advice import LANGUAGES, generate_advice
+
+install_fastapi(app)  # per-request timing + Prometheus /metrics
+
+
+def load_corpus():
+    """
+    Memory-mapped compiled corpus (recompiled when processed.jsonl changed);
+    records are decoded lazily, so workers share one page cache.
+    """
+    if not os.path.exists(DATA_FILE):
+        return CorpusStore(CORPUS_FILE) if os.path.exists(CORPUS_FILE) else []
+    if is_stale(DATA_FILE, CORPUS_FILE):
+        try:
+            compile_jsonl(DATA_FILE, CORPUS_FILE)
+        except OSError as e:  # read-only deploy: fall back to parsing the JSONL
+            print(f"Could not compile {CORPUS_FILE}: {e}")
+            return read_jsonl(DATA_FILE)
+    return CorpusStore(CORPUS_FILE)
+
 
 # Load data once at startup
-data = []
-if os.path.exists(DATA_FILE):
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                data.append(json.loads(line))
-            except:
+with span("corpus_load"):
+    data = load_corpus()
+
+
+# ----------------------------
+# Search index (postings are compiled into the corpus file)
+# ----------------------------
+BM25_K1, BM25_B = 1.5, 0.75
+
+
+class SearchIndex:
+    """
+    Disease postings + BM25 term index over `text`/`summary_en`. A CorpusStore
+    carries the term postings on disk (scripts/corpus_store.py) and the
+    disease postings come from its interned codes, so no record is decoded.
+    A plain list of records (read-only fallback) is indexed on first use.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self._lock = threading.Lock()
+        self._terms = records if isinstance(records, CorpusStore) else None
+        self._diseases = None  # (normalized disease -> record id array, disease_list)
+
+    def _disease_index(self):
+        if self._diseases is None:
+            with self._lock:
+                if self._diseases is None:
+                    self._diseases = self._build_diseases()
+        return self._diseases
+
+    def _build_diseases(self):
+        groups = defaultdict(list)  # normalized disease -> [record id arrays]
+        names = set()
+        if isinstance(self.records, CorpusStore):
+            if "diseases" in self.records.interned:
+                codes = self.records.codes("diseases")
+                order = np.argsort(codes, kind="stable")
+                uniq, starts = np.unique(codes[order], return_index=True)
+                for code, ids in zip(uniq.tolist(), np.split(order, starts[1:])):
+                    if code:  # 0 = no diseases field
+                        value = self.records.value(code)
+                        self._add_disease(groups, names, value, ids)
+        else:
+            for i, rec in enumerate(self.records):
+                self._add_disease(groups, names, rec.get("diseases", ""), [i])
+        postings = {d: np.sort(np.concatenate(parts)) for d, parts in groups.items()}
+        return postings, sorted(names)
+
+    @staticmethod
+    def _add_disease(groups, names, value, ids):
+        d = str(value).lower()
+        if d:
+            groups[d].append(np.asarray(ids, np.int64))
+        if value:
+            names.add(d)
+
+    def _term_index(self):
+        if self._terms is None:
+            with self._lock:
+                if self._terms is None:
+                    self._terms = MemoryPostings(self.records)
+        return self._terms
+
+    @property
+    def disease_list(self):
+        return self._disease_index()[1]
+
+    def match_disease(self, disease):
+        """Record ids whose disease field contains `disease` (substring, like before)."""
+        disease = disease.lower()
+        parts = [ids for key, ids in self._disease_index()[0].items() if disease in key]
+        return np.sort(np.concatenate(parts)).tolist() if parts else []
+
+    def search(self, query, allowed=None, limit=10):
+        """BM25-ranked (record id, score) pairs for a free-text query."""
+        terms = self._term_index()
+        n_docs = len(self.records)
+        if allowed is not None:
+            allowed = np.fromiter(allowed, np.int64, len(allowed))
+        hit_ids, hit_scores = [], []
+        for term in set(tokenize(query)):
+            posting = terms.postings(term)
+            if posting is None:
                 continue
+            ids, tf = posting
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            if allowed is not None:
+                keep = np.isin(ids, allowed)
+                ids, tf = ids[keep], tf[keep]
+            tf = tf.astype(np.float64)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * terms.doc_len[ids] / (terms.avg_len or 1.0))
+            hit_ids.append(ids)
+            hit_scores.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not hit_ids:
+            return []
+        ids, inverse = np.unique(np.concatenate(hit_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(hit_scores))
+        order = np.lexsort((ids, -scores))[:limit]
+        return [(int(ids[j]), float(scores[j])) for j in order]
+
+
+with span("search_index_build"):
+    index = SearchIndex(data)
+
+
+def _result(rec):
+    return {
+        "id": rec.get("id"),
+        "title": rec.get("title"),
+        "text": text_prefix(rec, "text", 300) + "...",  # first 300 chars
+        "language": rec.get("language", "en"),
+        "action_type": rec.get("action_type", "other")
+    }
 
 
 @app.get("/recommend")
-def recommend(disease: str = Query(..., description="Disease name"),
-              lang: str = Query("en", description="Language code")):
-    disease = disease.lower()
-    results = []
+def recommend(disease: str = Query(None, description="Disease name"),
+              lang: str = Query("en", description="Language code"),
+              q: str = Query(None, description="Free-text query (BM25 ranked)"),
+              limit: int = Query(10, ge=1, le=100, description="Max ranked results for q")):
+    if not disease and not q:
+        return {"error": "Provide 'disease' and/or 'q'"}
 
-    for rec in data:
-        diseases_field = str(rec.get("diseases", "")).lower()
-        if diseases_field and disease in diseases_field:
-            results.append({
-                "id": rec.get("id"),
-                "title": rec.get("title"),
-                "text": rec.get("text", "")[:300] + "...",  # first 300 chars
-                "language": rec.get("language", "en"),
-                "action_type": rec.get("action_type", "other")
-            })
+    allowed = None
+    if disease:
+        disease = disease.lower()
+        ids = index.match_disease(disease)
+        if not q:
+            results = [_result(data[i]) for i in ids]
+            if not results:
+                return {"error": f"No recommendations found for '{disease}'"}
+            return {"recommendations": results}
+        allowed = set(ids)
+
+    results = []
+    for i, score in index.search(q, allowed=allowed, limit=limit):
+        res = _result(data[i])
+        res["score"] = round(score, 4)
+        results.append(res)
 
     if not results:
-        return {"error": f"No recommendations found for '{disease}'"}
+        return {"error": f"No recommendations found for '{q}'"}
 
     return {"recommendations": results}
 
 
 @app.get("/list_diseases")
 def list_diseases():
-    diseases = []
-    for rec in data:
-        if rec.get("diseases"):
-            diseases.append(str(rec["diseases"]).lower())
-    return {"available_diseases": list(set(diseases))}
+    return {"available_diseases": index.disease_list}
+
+
+# ----------------------------
+# Precomputed advice (scripts/precompute_advice.py)
+# ----------------------------
+class AdviceStore:
+    """
+    Serves the advice artifact from memory; reloads when the file is replaced.
+    Unseen (disease, lang) pairs with matching chunks are generated on demand
+    (once, however many requests miss at the same time) and kept in a
+    bounded LRU.
+    """
+
+    def __init__(self, path, max_entries=ADVICE_CACHE_SIZE):
+        self.path = path
+        self.mtime = None
+        self.artifact = {"version": None, "languages": [], "advice": {}}
+        self.max_entries = max_entries
+        self.on_demand = OrderedDict()   # (disease, lang) -> advice, least recently used first
+        self._inflight = {}              # (disease, lang) -> Future of a running generation
+        self._lock = threading.Lock()
+        self.maybe_reload()
+
+    def maybe_reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+        with self._lock:
+            if mtime == self.mtime:
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.artifact = json.load(f)
+            self.mtime = mtime
+            self.on_demand = OrderedDict()
+
+    @property
+    def version(self):
+        return self.artifact.get("version")
+
+    @property
+    def languages(self):
+        return sorted(set(LANGUAGES) | set(ADVICE_LANGUAGES) | set(self.artifact.get("languages", [])))
+
+    def lookup(self, disease, lang):
+        """(advice, source) with source 'precomputed' or 'on_demand'; None if no chunks."""
+        self.maybe_reload()
+        advice = self.artifact["advice"]
+        entry = advice.get(disease)
+        if entry is None:
+            # same containment rule as /recommend
+            entry = next((v for k, v in advice.items() if disease in k), None)
+        if entry is not None and lang in entry:
+            return entry[lang], "precomputed"
+
+        if not index.match_disease(disease):  # nothing to generate from: not cached
+            return None, None
+        text = self._generate(disease, lang)
+        return (None, None) if text is None else (text, "on_demand")
+
+    def _generate(self, disease, lang):
+        key = (disease, lang)
+        with self._lock:
+            if key in self.on_demand:
+                self.on_demand.move_to_end(key)
+                return self.on_demand[key]
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return pending.result()
+        try:
+            text = generate_advice(data, disease, lang)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set_exception(e)
+            raise
+        with self._lock:  # cached and no longer in flight in one step
+            self.on_demand[key] = text
+            while len(self.on_demand) > self.max_entries:
+                self.on_demand.popitem(last=False)
+            self._inflight.pop(key, None)
+        pending.set_result(text)
+        return text
+
+
+advice_store = AdviceStore(ADVICE_FILE)
+
+# On-demand advice loads models lazily; WARM_MODELS=all (or comma-separated
+# registry names) preloads them in the background so startup stays fast.
+WARM_MODELS = os.environ.get("WARM_MODELS", "").strip()
+
+
+@app.on_event("startup")
+def _warm_models():
+    if WARM_MODELS:
+        names = None if WARM_MODELS == "all" else [n.strip() for n in WARM_MODELS.split(",") if n.strip()]
+        get_registry().warm(names, background=True)
+
+
+@app.get("/advice")
+def advice(disease: str = Query(..., description="Disease name"),
+           lang: str = Query("en", description="Language code")):
+    disease = disease.lower().strip()
+    if lang not in advice_store.languages:
+        counter("advice_lookups", source="bad_language")
+        return {"error": f"Unsupported language '{lang}' (supported: {', '.join(advice_store.languages)})"}
+    text, source = advice_store.lookup(disease, lang)
+    counter("advice_lookups", source=source or "not_found")
+    if text is None:
+        return {"error": f"No advice found for '{disease}'"}
+    return {
+        "disease": disease,
+        "language": lang,
+        "advice": text,
+        "source": source,
+        "version": advice_store.version,
+    }
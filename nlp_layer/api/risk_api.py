@@ -0,0 +1,73 @@
+from fastapi import FastAPI, HTTPException, Query
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+REPO_DIR = os.path.dirname(BASE_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from risk_grid import RESOLUTION, TILE_DEG, RiskTileCache, owm_fetcher, tile_of
+from owm_client import OWM_REFRESH_SECONDS
+from instrumentation import counter, install_fastapi, span
+
+OWM_API_KEY = os.environ.get("OWM_API_KEY", "")
+RISK_TILE_DIR = os.environ.get("RISK_TILE_DIR", os.path.join(REPO_DIR, ".risk_tiles"))  # shared by workers
+OWM_CACHE_DIR = os.environ.get("OWM_CACHE_DIR", os.path.join(REPO_DIR, ".owm_cache"))
+RISK_TILE_DEG = float(os.environ.get("RISK_TILE_DEG", TILE_DEG))
+RISK_RESOLUTION = float(os.environ.get("RISK_RESOLUTION", RESOLUTION))
+
+app = FastAPI()
+install_fastapi(app)  # per-request timing + Prometheus /metrics
+
+tiles = RiskTileCache(owm_fetcher(OWM_API_KEY, cache_dir=OWM_CACHE_DIR),
+                      tile_deg=RISK_TILE_DEG, resolution=RISK_RESOLUTION,
+                      directory=RISK_TILE_DIR)
+
+
+# ----------------------------
+# Tile lookup
+# ----------------------------
+def _tile(tile):
+    """Cached tile, computing it (one forecast fetch per cell) on a miss."""
+    cached = tiles.cached(tile)
+    counter("risk_tile_lookups", result="hit" if cached else "miss")
+    try:
+        with span("risk_tile", cached=cached):
+            return tiles.tile(tile)
+    except Exception as e:  # OWM outage / missing key: nothing to serve
+        raise HTTPException(status_code=502, detail=f"Could not compute risk tile {tile}: {e}")
+
+
+def _meta(tile, grid):
+    return {
+        "tile": list(tile),
+        "computed_at": grid.computed_at,
+        "expires_at": grid.computed_at + OWM_REFRESH_SECONDS,
+    }
+
+
+@app.get("/risk/cell")
+def risk_cell(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    """Per-day risk for the farm's grid cell (an array read once its tile is warm)."""
+    tile = tile_of(lat, lon, tiles.tile_deg)
+    grid = _tile(tile)
+    return {**_meta(tile, grid), "lat": lat, "lon": lon,
+            "resolution": grid.spec.resolution, **grid.cell(lat, lon)}
+
+
+@app.get("/risk/tile")
+def risk_tile(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    """Whole tile holding (lat, lon): uint8 score/band grids as nested lists."""
+    tile = tile_of(lat, lon, tiles.tile_deg)
+    grid = _tile(tile)
+    return {**_meta(tile, grid), **grid.to_dict()}
+
+
+@app.get("/health")
+def health():
+    return {
+        "tile_deg": tiles.tile_deg,
+        "resolution": tiles.resolution,
+        "tiles_cached": len(tiles.tiles),
+        "owm_configured": bool(OWM_API_KEY),
+    }
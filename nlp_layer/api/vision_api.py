@@ -0,0 +1,265 @@
+from fastapi import FastAPI, File, UploadFile, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+REPO_DIR = os.path.dirname(BASE_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from dataset_pack import packed_image
+from lesion_heatmap import leaf_region_mask, lesion_heatmap_batch, lesion_scores
+from model_export import load_classifier
+from leaf_cascade import LeafCascade
+from image_hash import PredictionCache, image_hash
+from instrumentation import counter, install_fastapi, observe, span
+
+# .pkl (fastai), .pt (TorchScript) or .onnx / .int8.onnx from model_export.py
+MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(REPO_DIR, "Data", "final_model.pkl"))
+PREPROCESS_SIZE = int(os.environ.get("PREPROCESS_SIZE", 256))
+MAX_BATCH = int(os.environ.get("MAX_BATCH", 16))
+MAX_WAIT_MS = float(os.environ.get("MAX_WAIT_MS", 10))     # how long a request may wait for batch-mates
+INFER_THREADS = int(os.environ.get("INFER_THREADS", os.cpu_count() or 1))
+# cheap-first cascade from leaf_cascade.py; used when the file exists ("" disables)
+CASCADE_PATH = os.environ.get("CASCADE_PATH", os.path.join(REPO_DIR, "Data", "leaf_cascade.json"))
+# re-uploads within PREDICTION_CACHE_DISTANCE bits (pHash, of 64) reuse the stored prediction
+# (CACHED_KEYS, well under 1 KB an entry; lesion score and heatmap always come from the upload); size 0 disables
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 2048))
+PREDICTION_CACHE_DISTANCE = int(os.environ.get("PREDICTION_CACHE_DISTANCE", 4))
+
+app = FastAPI()
+install_fastapi(app)  # per-request timing + Prometheus /metrics
+
+
+# ----------------------------
+# Dynamic micro-batching
+# ----------------------------
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches of up to `max_batch`, waiting at
+    most `max_wait` seconds after the first request, then calls fn(items) once
+    (in a worker thread) and resolves each request's future with its output.
+    """
+
+    def __init__(self, fn, max_batch=MAX_BATCH, max_wait=MAX_WAIT_MS / 1000.0):
+        self.fn, self.max_batch, self.max_wait = fn, max_batch, max_wait
+        self.queue = None
+        self.worker = None
+        self.executor = ThreadPoolExecutor(max_workers=1)  # one model call at a time
+        self.batches, self.items = 0, 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    async def submit(self, item):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, fut))
+        return await fut
+
+    def _call(self, items):
+        with span("vision_inference"):
+            return self.fn(items)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            items = [item for item, _ in pending]
+            observe("vision_batch_size", len(items), buckets=(1, 2, 4, 8, 16, 32, 64))
+            try:
+                outputs = await loop.run_in_executor(self.executor, self._call, items)
+            except Exception as e:
+                for _, fut in pending:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            for (_, fut), out in zip(pending, outputs):
+                if not fut.done():
+                    fut.set_result(out)
+
+
+classifier = None
+batcher = None
+cascade = None
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_DISTANCE) if PREDICTION_CACHE_SIZE else None
+preprocess_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)  # cv2/PIL release the GIL
+
+
+@app.on_event("startup")
+async def _startup():
+    global classifier, batcher, cascade
+    if classifier is None:
+        classifier = load_classifier(MODEL_PATH, INFER_THREADS)
+    if cascade is None and CASCADE_PATH and os.path.exists(CASCADE_PATH):
+        cheap = LeafCascade.load(CASCADE_PATH)
+        if [c for c in cheap.vocab if c in classifier.vocab] != list(classifier.vocab):
+            print(f"Cascade {CASCADE_PATH} was fit for other classes; every image goes to the CNN")
+        else:
+            cascade = cheap
+    batcher = MicroBatcher(classifier.predict_batch)
+    batcher.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    if batcher is not None:
+        await batcher.stop()
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def decode_image(raw):
+    img = Image.open(io.BytesIO(raw))
+    img.draft("RGB", (PREPROCESS_SIZE, PREPROCESS_SIZE))  # cheap JPEG downscale on decode
+    return np.asarray(img.convert("RGB"))
+
+
+def decode_and_hash(raw):
+    """Decoded upload and its perceptual hash (None when the prediction cache is off)."""
+    with span("vision_decode"):
+        a = decode_image(raw)
+        return a, image_hash(a) if prediction_cache is not None else None
+
+
+def prepare(a):
+    """The image as packed for training and its leaf mask."""
+    with span("vision_preprocess"):
+        image = packed_image(a, PREPROCESS_SIZE)
+        return {"image": image, "leaf_mask": leaf_region_mask(image)}
+
+
+def preprocess(a):
+    """prepare(a) plus the cascade's verdict."""
+    pre = prepare(a)
+    if cascade is not None:
+        with span("vision_cascade"):
+            pre["cascade"] = cascade.decide(pre)
+    return pre
+
+
+# the prediction only: lesion fields are always computed from the upload itself
+CACHED_KEYS = ("label", "confidence", "probabilities", "stage")
+
+
+def png_base64(a):
+    buf = io.BytesIO()
+    Image.fromarray(a).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def lesion_fields(pre, heatmap):
+    """Lesion score of the upload (mean over the leaf, 0..1), plus its overlay and box when asked."""
+    with span("vision_lesion"):
+        images, masks = pre["image"][None], pre["leaf_mask"][None]
+        if heatmap:
+            overlays, scores, boxes = lesion_heatmap_batch(images, masks)
+        else:
+            scores, _ = lesion_scores(images, masks)
+        leaf = pre["leaf_mask"] > 0
+        fields = {"lesion_score": round(float(scores[0][leaf].mean() if leaf.any() else scores[0].mean()), 4)}
+        if heatmap:
+            fields["lesion_heatmap_png"] = png_base64(overlays[0])
+            fields["lesion_box"] = boxes[0].tolist() if boxes[0][2] >= 0 else None  # x, y, w, h
+    return fields
+
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+@app.post("/predict")
+async def predict(file: UploadFile = File(...), heatmap: bool = True):
+    t0 = time.perf_counter()
+    raw = await file.read()
+    loop = asyncio.get_running_loop()
+    try:
+        a, h = await loop.run_in_executor(preprocess_pool, decode_and_hash, raw)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read image: {e}")
+
+    cached = prediction_cache.get(h) if h is not None else None
+    if cached is not None:
+        counter("vision_predictions", stage="cache")
+        result = dict(cached, cached=True)
+        # scored (and drawn) on this upload, never on the near-duplicate that filled the cache
+        pre = await loop.run_in_executor(preprocess_pool, prepare, a)
+        result.update(await loop.run_in_executor(preprocess_pool, lesion_fields, pre, heatmap))
+        result["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return result
+
+    try:
+        pre = await loop.run_in_executor(preprocess_pool, preprocess, a)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read image: {e}")
+
+    decision = pre.get("cascade")
+    if decision is not None and decision.confident:  # confident cheap answer: skip the CNN
+        probs, vocab, stage = decision.probs, cascade.vocab, "cascade"
+    else:
+        probs, vocab, stage = await batcher.submit(pre["image"]), classifier.vocab, "cnn"
+    counter("vision_predictions", stage=stage)
+    order = np.argsort(probs)[::-1]
+    result = {
+        "label": vocab[int(order[0])],
+        "confidence": float(probs[order[0]]),
+        "probabilities": {vocab[i]: float(probs[i]) for i in order},
+        "stage": stage,
+        "cached": False,
+    }
+    result.update(await loop.run_in_executor(preprocess_pool, lesion_fields, pre, heatmap))
+    if h is not None:
+        prediction_cache.put(h, {k: result[k] for k in CACHED_KEYS})
+    result["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
+
+
+@app.get("/health")
+def health():
+    return {
+        "model": os.path.basename(MODEL_PATH),
+        "classes": classifier.vocab if classifier else [],
+        "batches": batcher.batches if batcher else 0,
+        "avg_batch_size": round(batcher.items / batcher.batches, 2) if batcher and batcher.batches else 0.0,
+        "cascade": {
+            "exits": cascade.exits,
+            "escalations": cascade.escalations,
+            "escalation_rate": round(cascade.escalation_rate, 4),
+            "thresholds": dict(zip(cascade.vocab, (t if t != float("inf") else None
+                                                   for t in cascade.thresholds.tolist()))),
+        } if cascade else None,
+        "prediction_cache": {
+            "entries": len(prediction_cache),
+            "hits": prediction_cache.hits,
+            "misses": prediction_cache.misses,
+            "hit_rate": round(prediction_cache.hit_rate, 4),
+            "max_distance": prediction_cache.max_distance,
+        } if prediction_cache else None,
+    }
@@ -1,45 +1,159 @@
 import os
-import pandas as pd
+import sys
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # project root
 RAW_DIR = os.path.join(BASE_DIR, "data", "raw")
-OUTPUT_FILE = os.path.join(BASE_DIR, "data", "sources.csv")
+OUTPUT_FILE = os.path.join(BASE_DIR, "data", "sources.jsonl")
+MANIFEST_FILE = os.path.join(BASE_DIR, "data", "manifest.json")
 
+sys.path.append(os.path.dirname(BASE_DIR))  # repo root: shared instrumentation
+from instrumentation import counter, merge, print_summary, snapshot, span
+
+# Worker processes for extraction (None = all cores)
+MAX_WORKERS = None
 
-records = []
 
 def extract_pdf(path):
-    text = ""
+    """The PDF's text, or None if it could not be read (kept out of the manifest, so retried)."""
+    pages = []
     try:
         reader = PdfReader(path)
         for page in reader.pages:
-            text += page.extract_text() + " "
+            pages.append(page.extract_text() or "")
     except Exception as e:
         print(f"Error reading {path}: {e}")
-    return text.strip()
+        counter("pdf_extract_failures")
+        return None
+    counter("pdf_pages", len(pages))
+    return " ".join(pages).strip()
+
+
+def _extract_worker(path):
+    """extract_pdf in a pool worker; its metrics travel back with the text."""
+    with span("pdf_extract"):
+        text = extract_pdf(path)
+    return text, snapshot()
+
+
+def file_sha256(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    tmp = MANIFEST_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_FILE)
+
+
+def plan_changes(manifest):
+    """Split raw PDFs into (to_extract, unchanged) using mtime/size, then content hash."""
+    to_extract, unchanged = [], {}
+    for fname in sorted(os.listdir(RAW_DIR)):
+        if not fname.endswith(".pdf"):
+            continue
+        fpath = os.path.join(RAW_DIR, fname)
+        st = os.stat(fpath)
+        entry = manifest.get(fname)
+        if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+            unchanged[fname] = entry
+            continue
+        digest = file_sha256(fpath)
+        if entry and entry["sha256"] == digest:
+            # touched but identical content: refresh stats, skip extraction
+            unchanged[fname] = dict(entry, mtime=st.st_mtime, size=st.st_size)
+            continue
+        to_extract.append((fname, {"sha256": digest, "mtime": st.st_mtime, "size": st.st_size}))
+    return to_extract, unchanged
+
+
+def make_record(fname, text):
+    return {
+        "id": os.path.splitext(fname)[0],
+        "title": fname,
+        "source_url": "",
+        "language": "en",
+        "text": text,
+        "diseases": "",
+        "region": "",
+        "action_type": "other"
+    }
+
 
 def main():
-    for fname in os.listdir(RAW_DIR):
-        if fname.endswith(".pdf"):
-            fpath = os.path.join(RAW_DIR, fname)
-            text = extract_pdf(fpath)
-
-            rec = {
-                "id": os.path.splitext(fname)[0],
-                "title": fname,
-                "source_url": "",
-                "language": "en",
-                "text": text,
-                "diseases": "",
-                "region": "",
-                "action_type": "other"
-            }
-            records.append(rec)
-
-    df = pd.DataFrame(records)
-    df.to_csv(OUTPUT_FILE, index=False)
-    print(f"✅ Saved {len(df)} sources to {OUTPUT_FILE}")
+    # Without the output file every manifest entry is stale: extract everything again
+    manifest = load_manifest() if os.path.exists(OUTPUT_FILE) else {}
+    to_extract, unchanged = plan_changes(manifest)
+    removed = set(manifest) - set(unchanged) - {fname for fname, _ in to_extract}
+
+    if not to_extract and not removed:
+        print(f"✅ Sources up to date ({len(unchanged)} PDFs) in {OUTPUT_FILE}")
+        return
+
+    paths = [os.path.join(RAW_DIR, fname) for fname, _ in to_extract]
+    if len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            results = list(pool.map(_extract_worker, paths))
+    else:
+        results = [_extract_worker(p) for p in paths]
+    extracted, failed = [], []
+    for (fname, entry), (text, metrics) in zip(to_extract, results):
+        merge(metrics)
+        if text is None:
+            failed.append(fname)
+        else:
+            extracted.append((fname, entry, text))
+    new_records = [make_record(fname, text) for fname, _, text in extracted]
+
+    # Pure additions are appended; changed/removed PDFs require a rewrite, and so
+    # does a missing manifest (the output may already hold any of these ids)
+    replaced = {fname for fname, _ in to_extract if fname in manifest} | removed
+    if replaced or not manifest or not os.path.exists(OUTPUT_FILE):
+        drop_ids = {os.path.splitext(f)[0] for f in replaced | {fname for fname, _ in to_extract}}
+        kept = []
+        if os.path.exists(OUTPUT_FILE):
+            with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip() and json.loads(line)["id"] not in drop_ids:
+                        kept.append(line if line.endswith("\n") else line + "\n")
+        tmp = OUTPUT_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+            for rec in new_records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, OUTPUT_FILE)
+    else:
+        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
+            for rec in new_records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    n_unchanged = len(unchanged)
+    for fname, entry, _ in extracted:
+        unchanged[fname] = entry
+    save_manifest(unchanged)
+    counter("pdfs_extracted", len(new_records))
+    counter("pdfs_failed", len(failed))
+    counter("pdfs_removed", len(removed))
+    counter("pdfs_unchanged", n_unchanged)
+    print(f"✅ Extracted {len(new_records)} PDFs ({len(failed)} failed, {len(removed)} removed, "
+          f"{n_unchanged} unchanged) → {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
+    with span("build_index"):
+        main()
+    print_summary()
@@ -1,27 +1,94 @@
 import os
-import pandas as pd
+import re
+import sys
+import csv
 import json
+import argparse
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))  
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 INPUT_FILE = os.path.join(BASE_DIR, "data", "sources_clean.csv")
 OUTPUT_FILE = os.path.join(BASE_DIR, "data", "chunks.jsonl")
 
+sys.path.append(os.path.dirname(BASE_DIR))  # repo root: shared instrumentation
+from instrumentation import counter, print_summary, span, timed_iter
+
 # Max words per chunk (you can tune this for your model)
 CHUNK_SIZE = 500
+# Words shared between consecutive chunks so advice isn't cut mid-thought
+CHUNK_OVERLAP = 50
+# Summarizer input limit (BART: 1024 tokens incl. <s> and </s>)
+TOKENIZER_MODEL = "facebook/bart-large-cnn"
+MAX_TOKENS = 1024
+
+WORD_RE = re.compile(r"\S+")
+
+csv.field_size_limit(sys.maxsize)  # documents are one (large) text cell each
+
+
+def load_tokenizer(model=TOKENIZER_MODEL):
+    """Summarizer's tokenizer, or None (word-count limit only) if unavailable."""
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(model)
+    except Exception as e:
+        print(f"Tokenizer unavailable ({e}); chunking by word count only")
+        return None
+
+
+def word_token_costs(words, tokenizer):
+    if tokenizer is None:
+        return [1] * len(words)
+    # byte-level BPE pre-splits on spaces, so " word" costs the same alone as in context
+    ids = tokenizer([" " + w for w in words], add_special_tokens=False)["input_ids"]
+    return [len(x) for x in ids]
+
 
-def chunk_text(text, chunk_size=CHUNK_SIZE):
-    words = text.split()
-    for i in range(0, len(words), chunk_size):
-        yield " ".join(words[i:i + chunk_size])
+def check_window(chunk_size, overlap):
+    if chunk_size < 1 or not 0 <= overlap < chunk_size:
+        raise ValueError(f"need chunk_size >= 1 and 0 <= overlap < chunk_size "
+                         f"(got chunk_size={chunk_size}, overlap={overlap})")
 
-def main():
-    df = pd.read_csv(INPUT_FILE)
-    out = []
 
-    for _, row in df.iterrows():
-        chunks = list(chunk_text(str(row["text"])))
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP,
+               tokenizer=None, max_tokens=MAX_TOKENS):
+    """Word windows of ≤ chunk_size words and ≤ max_tokens summarizer tokens (an iterator)."""
+    check_window(chunk_size, overlap)  # here, not on first next()
+    return _windows(text, chunk_size, overlap, tokenizer, max_tokens)
+
+
+def _windows(text, chunk_size, overlap, tokenizer, max_tokens):
+    words = WORD_RE.findall(text)
+    if not words:
+        return
+    costs = word_token_costs(words, tokenizer)
+    budget = max_tokens - (tokenizer.num_special_tokens_to_add() if tokenizer is not None else 0)
+
+    start = 0
+    while start < len(words):
+        end, used = start, 0
+        while end < len(words) and end - start < chunk_size and (used + costs[end] <= budget or end == start):
+            used += costs[end]
+            end += 1
+        yield " ".join(words[start:end])
+        if end >= len(words):
+            break
+        start = max(start + 1, end - overlap)
+
+
+def iter_sources(path):
+    """Yield source rows one at a time."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def iter_chunks(rows, **chunk_kwargs):
+    for row in rows:
+        # chunks stream out as they are cut; only chunk_text's own time is measured
+        chunks = timed_iter("chunk_document", chunk_text(str(row.get("text") or ""), **chunk_kwargs))
         for idx, chunk in enumerate(chunks):
-            rec = {
+            counter("chunks")
+            yield {
                 "id": f"{row['id']}_{idx}",
                 "source_id": row["id"],
                 "title": row["title"],
@@ -30,13 +97,33 @@ def main():
                 "region": row.get("region", ""),
                 "action_type": row.get("action_type", "")
             }
-            out.append(rec)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for rec in out:
+
+def main(chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, max_tokens=MAX_TOKENS, use_tokenizer=True):
+    check_window(chunk_size, overlap)
+    tokenizer = load_tokenizer() if use_tokenizer else None
+    n = 0
+    tmp = OUTPUT_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for rec in iter_chunks(iter_sources(INPUT_FILE), chunk_size=chunk_size, overlap=overlap,
+                               tokenizer=tokenizer, max_tokens=max_tokens):
             f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+    os.replace(tmp, OUTPUT_FILE)
 
-    print(f"✅ Chunked {len(out)} records saved to {OUTPUT_FILE}")
+    print(f"✅ Chunked {n} records saved to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Split cleaned sources into summarizer-sized chunks")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="max words per chunk")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="words shared by neighbours")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS, help="summarizer input limit")
+    parser.add_argument("--no-tokenizer", action="store_true", help="limit by words only")
+    args = parser.parse_args()
+    try:
+        check_window(args.chunk_size, args.overlap)
+    except ValueError as e:
+        parser.error(str(e))
+    with span("chunk"):
+        main(args.chunk_size, args.overlap, args.max_tokens, not args.no_tokenizer)
+    print_summary()
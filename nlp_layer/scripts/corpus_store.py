@@ -0,0 +1,422 @@
+import os
+import re
+import json
+import mmap
+import argparse
+import functools
+from collections import Counter, defaultdict
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+INPUT_FILE = os.path.join(BASE_DIR, "data", "processed.jsonl")
+OUTPUT_FILE = os.path.join(BASE_DIR, "data", "processed.corpus")
+
+# File layout (little-endian, sections 8-byte aligned):
+#   MAGIC | uint64 header length | header JSON | record columns
+#   | value offsets | value bytes | text blob | search index
+# header: fields in first-seen order, which are interned vs. blob, the
+# column list, section sizes and the source stats used for staleness checks.
+# record columns: fixed-width arrays with one slot per record —
+#   interned field → uint32 code into the value table (0 = key absent)
+#   blob field     → uint64 byte offset + uint32 byte length into the blob
+# value table: each distinct metadata value once, JSON-encoded (so NaN/None/
+# numbers survive), located through n_values + 1 uint64 offsets.
+# search index: BM25 postings over INDEX_FIELDS — uint32 token count per
+# record, the terms (UTF-8, byte-sorted, n_terms + 1 uint64 offsets), and per
+# term a run of uint32 record ids and uint32 term frequencies (n_terms + 1
+# uint64 offsets into both), so the API never tokenizes the corpus itself.
+MAGIC = b"AGCORP\x00\x01"
+FORMAT_VERSION = 2
+
+# Long per-chunk strings go to the blob; everything else is interned metadata
+BLOB_FIELDS = ("text", "summary_en", "summary_hi")
+ABSENT = 0xFFFFFFFF  # blob length for "key not present"
+INDEX_FIELDS = ("text", "summary_en")
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _align(n, k=8):
+    return (n + k - 1) // k * k
+
+
+def _sections(head_len, header):
+    """Byte offsets of ({column: offset}, value offsets, text blob, {index section: offset})."""
+    pos = _align(len(MAGIC) + 8 + head_len)
+    columns = {}
+    for name, fmt in header["columns"]:
+        columns[name] = pos
+        pos = _align(pos + np.dtype(fmt).itemsize * header["n"])
+    values_offset = pos
+    blob_offset = _align(values_offset + 8 * (header["n_values"] + 1) + header["value_bytes"])
+    ix = header["index"]
+    index, pos = {}, _align(blob_offset + header["blob_bytes"])
+    for name, size in (("doc_len", 4 * header["n"]),
+                       ("term_offsets", 8 * (ix["n_terms"] + 1)), ("terms", ix["term_bytes"]),
+                       ("posting_offsets", 8 * (ix["n_terms"] + 1)),
+                       ("ids", 4 * ix["n_postings"]), ("tfs", 4 * ix["n_postings"])):
+        index[name] = pos
+        pos = _align(pos + size)
+    return columns, values_offset, blob_offset, index
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text or "").lower())
+
+
+def term_counts(rec):
+    """Term frequencies of a record's INDEX_FIELDS (the BM25 document)."""
+    return Counter(t for f in INDEX_FIELDS for t in tokenize(rec.get(f, "")))
+
+
+def _postings(records):
+    """(doc_len, {term: [(record id, tf)]}) over `records`, ids ascending."""
+    postings = defaultdict(list)
+    doc_len = np.zeros(len(records), "<u4")
+    for i, rec in enumerate(records):
+        tf = term_counts(rec)
+        doc_len[i] = sum(tf.values())
+        for term, n in tf.items():
+            postings[term].append((i, n))
+    return doc_len, postings
+
+
+def _source_stats(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+def read_jsonl(path):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def compile_corpus(records, out_path=OUTPUT_FILE, source=None):
+    """Write `records` (dicts) in the compiled format; returns the record count."""
+    fields = []
+    for rec in records:
+        for key in rec:
+            if key not in fields:
+                fields.append(key)
+    blob = [f for f in fields if f in BLOB_FIELDS
+            and all(isinstance(r[f], str) for r in records if f in r)]
+    interned = [f for f in fields if f not in blob]
+
+    columns = ([(f, "<u4") for f in interned]
+               + [x for f in blob for x in ((f + "@off", "<u8"), (f + "@len", "<u4"))])
+    table = {name: np.zeros(len(records), fmt) for name, fmt in columns}
+    values, codes = ["null"], {}  # code 0 = absent
+    chunks, pos = [], 0
+    for i, rec in enumerate(records):
+        for f in interned:
+            if f not in rec:
+                continue
+            v = json.dumps(rec[f], ensure_ascii=False)
+            code = codes.get(v)
+            if code is None:
+                code = codes[v] = len(values)
+                values.append(v)
+            table[f][i] = code
+        for f in blob:
+            if f not in rec:
+                table[f + "@len"][i] = ABSENT
+                continue
+            b = rec[f].encode("utf-8")
+            table[f + "@off"][i], table[f + "@len"][i] = pos, len(b)
+            chunks.append(b)
+            pos += len(b)
+
+    encoded = [v.encode("utf-8") for v in values]
+    value_offsets = np.cumsum([0] + [len(v) for v in encoded], dtype="<u8")
+
+    doc_len, postings = _postings(records)
+    terms = sorted((t.encode("utf-8"), t) for t in postings)
+    term_offsets = np.cumsum([0] + [len(b) for b, _ in terms], dtype="<u8")
+    posting_offsets = np.cumsum([0] + [len(postings[t]) for _, t in terms], dtype="<u8")
+    pairs = np.array([p for _, t in terms for p in postings[t]], "<u4").reshape(-1, 2)
+    header = {
+        "version": FORMAT_VERSION,
+        "n": len(records),
+        "fields": fields,
+        "interned": interned,
+        "blob": blob,
+        "columns": columns,
+        "n_values": len(values),
+        "value_bytes": int(value_offsets[-1]),
+        "blob_bytes": pos,
+        "index": {
+            "fields": list(INDEX_FIELDS),
+            "n_terms": len(terms),
+            "term_bytes": int(term_offsets[-1]),
+            "n_postings": len(pairs),
+            "avg_len": int(doc_len.sum(dtype=np.int64)) / len(records) if len(records) else 0.0,
+        },
+        "source": source,
+    }
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    column_offsets, values_offset, blob_offset, index_offsets = _sections(len(head), header)
+    index_data = {
+        "doc_len": doc_len.tobytes(),
+        "term_offsets": term_offsets.tobytes(),
+        "terms": b"".join(b for b, _ in terms),
+        "posting_offsets": posting_offsets.tobytes(),
+        "ids": np.ascontiguousarray(pairs[:, 0]).tobytes(),
+        "tfs": np.ascontiguousarray(pairs[:, 1]).tobytes(),
+    }
+
+    tmp = f"{out_path}.{os.getpid()}.tmp"  # API workers may compile concurrently
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(head)).tobytes())
+        f.write(head)
+        for name, _ in columns:
+            f.write(b"\0" * (column_offsets[name] - f.tell()))
+            f.write(table[name].tobytes())
+        f.write(b"\0" * (values_offset - f.tell()))
+        f.write(value_offsets.tobytes())
+        f.write(b"".join(encoded))
+        f.write(b"\0" * (blob_offset - f.tell()))
+        for b in chunks:
+            f.write(b)
+        for name, raw in index_data.items():
+            f.write(b"\0" * (index_offsets[name] - f.tell()))
+            f.write(raw)
+    # readers that already mapped the old file keep their (unlinked) copy
+    os.replace(tmp, out_path)
+    return len(records)
+
+
+def compile_jsonl(src=INPUT_FILE, dst=OUTPUT_FILE):
+    return compile_corpus(read_jsonl(src), dst, source=_source_stats(src))
+
+
+def is_stale(src=INPUT_FILE, dst=OUTPUT_FILE):
+    """True when `dst` is missing, unreadable or compiled from a different `src`."""
+    if not os.path.exists(dst):
+        return True
+    try:
+        with open(dst, "rb") as f:
+            header = _read_header(f.read(len(MAGIC) + 8), f)
+    except (OSError, ValueError):
+        return True
+    return header.get("version") != FORMAT_VERSION or header.get("source") != _source_stats(src)
+
+
+def _read_header(prefix, f):
+    if prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a compiled corpus file")
+    n = int(np.frombuffer(prefix, "<u8", 1, len(MAGIC))[0])
+    return json.loads(f.read(n))
+
+
+class CorpusRecord:
+    """Read-only mapping view of one record; values are decoded on access."""
+
+    __slots__ = ("store", "i")
+
+    def __init__(self, store, i):
+        self.store, self.i = store, i
+
+    def __getitem__(self, key):
+        value = self.store.field(self.i, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self.store.field(self.i, key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        return self.store.field(self.i, key) is not _MISSING
+
+    def keys(self):
+        return [k for k in self.store.fields if k in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def prefix(self, key, n_chars, default=""):
+        """First `n_chars` of a text field, decoding only the bytes needed."""
+        return self.store.prefix(self.i, key, n_chars, default)
+
+    def __repr__(self):
+        return f"CorpusRecord({dict(self.items())!r})"
+
+
+_MISSING = object()
+
+
+class CorpusStore:
+    """
+    Memory-mapped compiled corpus. Opening reads only the header; record
+    columns are zero-copy memoryviews and text is decoded per access, so worker
+    processes share the file's page cache. Behaves like a list of records.
+    """
+
+    def __init__(self, path=OUTPUT_FILE):
+        self.path = path
+        with open(path, "rb") as f:
+            header = _read_header(f.read(len(MAGIC) + 8), f)
+            if header["version"] != FORMAT_VERSION:
+                raise ValueError(f"{path}: format version {header['version']} != {FORMAT_VERSION}")
+            column_offsets, values_offset, blob_offset, index = _sections(f.tell() - len(MAGIC) - 8, header)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fields = header["fields"]
+        self.interned = set(header["interned"])
+        self.blob = set(header["blob"])
+        self.n = header["n"]
+        self._view = memoryview(self._mm)
+        # memoryview.cast → plain Python ints on indexing (numpy scalars are slower)
+        self._cols = {}
+        for name, fmt in header["columns"]:
+            size = np.dtype(fmt).itemsize
+            start = column_offsets[name]
+            self._cols[name] = self._view[start:start + size * self.n].cast("I" if size == 4 else "Q")
+        n_values = header["n_values"]
+        self._value_offsets = self._view[values_offset:values_offset + 8 * (n_values + 1)].cast("Q")
+        self._values_base = values_offset + 8 * (n_values + 1)
+        self._blob_offset = blob_offset
+        # hot metadata (titles, languages, …) is decoded once; ids just cycle through
+        self.value = functools.lru_cache(maxsize=4096)(self._decode_value)
+
+        ix = header["index"]
+        self.n_terms, self.avg_len = ix["n_terms"], ix["avg_len"]
+        self.doc_len = self._array(index["doc_len"], "<u4", self.n)
+        start = index["term_offsets"]
+        self._term_offsets = self._view[start:start + 8 * (self.n_terms + 1)].cast("Q")
+        self._terms_base = index["terms"]
+        start = index["posting_offsets"]
+        self._posting_offsets = self._view[start:start + 8 * (self.n_terms + 1)].cast("Q")
+        self._ids = self._array(index["ids"], "<u4", ix["n_postings"])
+        self._tfs = self._array(index["tfs"], "<u4", ix["n_postings"])
+
+    def _array(self, offset, fmt, count):
+        return np.frombuffer(self._view[offset:offset + np.dtype(fmt).itemsize * count], fmt)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        return CorpusRecord(self, i)
+
+    def __iter__(self):
+        return (CorpusRecord(self, i) for i in range(self.n))
+
+    def codes(self, key):
+        """uint32 codes of an interned field as a numpy view (see `value(code)`; 0 = absent)."""
+        return np.frombuffer(self._cols[key], "<u4")
+
+    def _term(self, k):
+        start = self._terms_base + self._term_offsets[k]
+        return bytes(self._view[start:self._terms_base + self._term_offsets[k + 1]])
+
+    def postings(self, term):
+        """(record ids, term frequencies) of `term` as uint32 views, or None if unseen."""
+        key = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:  # binary search over the byte-sorted terms
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.n_terms or self._term(lo) != key:
+            return None
+        start, end = self._posting_offsets[lo], self._posting_offsets[lo + 1]
+        return self._ids[start:end], self._tfs[start:end]
+
+    def _decode_value(self, code):
+        start = self._values_base + self._value_offsets[code]
+        end = self._values_base + self._value_offsets[code + 1]
+        return json.loads(str(self._view[start:end], "utf-8"))
+
+    def _span(self, i, key):
+        length = self._cols[key + "@len"][i]
+        if length == ABSENT:
+            return None
+        start = self._blob_offset + self._cols[key + "@off"][i]
+        return start, length
+
+    def field(self, i, key):
+        if key in self.interned:
+            code = self._cols[key][i]
+            return _MISSING if code == 0 else self.value(code)
+        if key in self.blob:
+            span = self._span(i, key)
+            if span is None:
+                return _MISSING
+            start, length = span
+            return str(self._view[start:start + length], "utf-8")
+        return _MISSING
+
+    def prefix(self, i, key, n_chars, default=""):
+        if key not in self.blob:
+            value = self.field(i, key)
+            return default if value is _MISSING else value[:n_chars]
+        span = self._span(i, key)
+        if span is None:
+            return default
+        start, length = span
+        # a UTF-8 char is at most 4 bytes; a char cut at the end is dropped
+        raw = self._view[start:start + min(length, 4 * n_chars)]
+        return str(raw, "utf-8", "ignore")[:n_chars]
+
+    def to_dicts(self):
+        return [dict(rec.items()) for rec in self]
+
+
+class MemoryPostings:
+    """CorpusStore's postings interface over a plain list of records."""
+
+    def __init__(self, records):
+        doc_len, postings = _postings(records)
+        self.n = len(records)
+        self.doc_len = doc_len
+        self.avg_len = int(doc_len.sum(dtype=np.int64)) / self.n if self.n else 0.0
+        self._postings = {}
+        for term, pairs in postings.items():
+            pairs = np.array(pairs, "<u4")
+            self._postings[term] = pairs[:, 0], pairs[:, 1]
+
+    def postings(self, term):
+        return self._postings.get(term)
+
+
+def text_prefix(rec, key, n_chars, default=""):
+    """rec.get(key, default)[:n_chars] for dicts and CorpusRecords alike."""
+    if isinstance(rec, CorpusRecord):
+        return rec.prefix(key, n_chars, default)
+    return rec.get(key, default)[:n_chars]
+
+
+def open_corpus(src=INPUT_FILE, dst=OUTPUT_FILE):
+    """CorpusStore for `src`, (re)compiling `dst` first when it is stale."""
+    if is_stale(src, dst):
+        compile_jsonl(src, dst)
+    return CorpusStore(dst)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile processed.jsonl into the memory-mapped corpus format")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    args = parser.parse_args()
+    n = compile_jsonl(args.input, args.output)
+    size = os.path.getsize(args.output)
+    print(f"✅ Compiled {n} records ({size / 1024:.0f} KiB) → {args.output}")
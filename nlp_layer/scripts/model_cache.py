@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+CACHE_FILE = os.path.join(BASE_DIR, "data", "model_cache.sqlite")
+
+sys.path.append(os.path.dirname(BASE_DIR))  # repo root: shared instrumentation
+from instrumentation import counter
+
+# Size bound for cached outputs (bytes of UTF-8 text); oldest-used go first
+MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(model, params, text):
+    """sha256 over (model name, generation params, input text)."""
+    blob = json.dumps([model, params or {}, text], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ModelOutputCache:
+    """
+    Persistent content-addressed cache for summaries/translations (SQLite).
+    Shared by every model: the model name is part of the key.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_bytes=MAX_BYTES):
+        self.path, self.max_bytes = path, max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            " key TEXT PRIMARY KEY, model TEXT, value TEXT, size INTEGER, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS outputs_lru ON outputs(last_used)")
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM outputs").fetchone()[0]
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM outputs").fetchone()[0]
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def get(self, model, params, text):
+        return self.get_many(model, params, [text])[0]
+
+    def put(self, model, params, text, value):
+        self.put_many(model, params, [(text, value)])
+
+    def get_many(self, model, params, texts):
+        keys = [cache_key(model, params, t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                marks = ",".join("?" * len(part))
+                for k, v in self._db.execute(
+                        f"SELECT key, value FROM outputs WHERE key IN ({marks})", part):
+                    found[k] = v
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE outputs SET last_used=? WHERE key=?",
+                                     [(now, k) for k in found])
+        out = [found.get(k) for k in keys]
+        hits = sum(v is not None for v in out)
+        counter("model_cache_hits", hits, model=model)
+        counter("model_cache_misses", len(out) - hits, model=model)
+        return out
+
+    def put_many(self, model, params, pairs):
+        now = time.time()
+        rows = []
+        for text, value in pairs:
+            if value is None:
+                continue
+            rows.append((cache_key(model, params, text), model, value,
+                         len(value.encode("utf-8")), now))
+        if not rows:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            for row in rows:
+                old = self._db.execute("SELECT size FROM outputs WHERE key=?", (row[0],)).fetchone()
+                self._total -= old[0] if old else 0
+                self._db.execute("INSERT OR REPLACE INTO outputs VALUES (?,?,?,?,?)", row)
+                self._total += row[3]
+            self._db.execute("COMMIT")
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least-recently-used rows until 90% of the budget is free."""
+        target = int(self.max_bytes * 0.9)
+        self._db.execute("BEGIN")
+        for key, size in self._db.execute(
+                "SELECT key, size FROM outputs ORDER BY last_used").fetchall():
+            if self._total <= target:
+                break
+            self._db.execute("DELETE FROM outputs WHERE key=?", (key,))
+            self._total -= size
+        self._db.execute("COMMIT")
+
+    def cached_call(self, model, params, texts, fn):
+        """
+        Outputs for `texts`, calling fn(list_of_misses) -> list_of_outputs only
+        for uncached inputs. None outputs (failures) are returned but not stored.
+        """
+        outputs = self.get_many(model, params, texts)
+        miss_idx = [i for i, v in enumerate(outputs) if v is None]
+        if miss_idx:
+            # identical inputs within one call are computed once
+            unique = list(dict.fromkeys(texts[i] for i in miss_idx))
+            fresh = dict(zip(unique, fn(unique)))
+            self.put_many(model, params, fresh.items())
+            for i in miss_idx:
+                outputs[i] = fresh[texts[i]]
+        return outputs
+
+    def close(self):
+        self._db.close()
+
+
+_shared = None
+
+
+def get_cache():
+    """Process-wide cache instance used by the pipeline scripts."""
+    global _shared
+    if _shared is None:
+        _shared = ModelOutputCache()
+    return _shared
@@ -0,0 +1,199 @@
+import os
+import gc
+import sys
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+sys.path.append(os.path.dirname(BASE_DIR))  # repo root: shared instrumentation
+from instrumentation import counter, observe
+
+# RAM budget for loaded models; least-recently-used idle models go first
+MAX_BYTES = int(float(os.environ.get("MODEL_RAM_BUDGET_MB", 3072)) * 1024 * 1024)
+
+SUMMARIZER_MODEL = "facebook/bart-large-cnn"
+TRANSLATOR_HI_MODEL = "Helsinki-NLP/opus-mt-en-hi"
+
+# Registry names of the standard models (see get_registry)
+SUMMARIZER = f"summarization:{SUMMARIZER_MODEL}"
+TRANSLATOR_HI = f"translation:{TRANSLATOR_HI_MODEL}"
+
+
+def model_bytes(model):
+    """Parameter + buffer bytes of a torch model / HF pipeline (0 if unknown)."""
+    module = getattr(model, "model", model)
+    total = 0
+    for attr in ("parameters", "buffers"):
+        tensors = getattr(module, attr, None)
+        if callable(tensors):
+            total += sum(t.numel() * t.element_size() for t in tensors())
+    return total
+
+
+class _Entry:
+    __slots__ = ("loader", "size_hint", "model", "size", "users", "use_lock", "load_lock")
+
+    def __init__(self, loader, size_hint):
+        self.loader, self.size_hint = loader, size_hint
+        self.model, self.size, self.users = None, 0, 0
+        self.use_lock = threading.Lock()    # one call at a time per model
+        self.load_lock = threading.Lock()   # concurrent first uses load once
+
+
+class ModelRegistry:
+    """
+    Named model loaders; each model is loaded on first use, shared by every
+    caller in the process and evicted (LRU, idle models only) when the loaded
+    total exceeds `max_bytes`.
+
+        registry = get_registry()
+        with registry.use(SUMMARIZER) as summarizer:   # loads on first use
+            summarizer(texts)
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = {}
+        self._loaded = OrderedDict()   # name -> None, least recently used first
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, size_hint=0):
+        """loader() -> model; size_hint (bytes) is used when the size can't be measured."""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(loader, size_hint)
+        return name
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    @property
+    def loaded(self):
+        with self._lock:
+            return list(self._loaded)
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(self._entries[n].size for n in self._loaded)
+
+    def get(self, name):
+        """The loaded model (loading it if needed). Prefer use() for calls."""
+        entry = self._entries[name]
+        with self._lock:
+            if entry.model is not None:
+                self._loaded.move_to_end(name)
+                counter("model_registry_hits", model=name)
+                return entry.model
+        with entry.load_lock:
+            model = entry.model
+            if model is None:
+                model = self._load(name, entry)
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+        return model
+
+    def _load(self, name, entry):
+        counter("model_registry_loads", model=name)
+        t0 = time.perf_counter()
+        model = entry.loader()
+        observe("model_load_seconds", time.perf_counter() - t0, model=name)
+        size = model_bytes(model) or entry.size_hint
+        with self._lock:
+            entry.model, entry.size = model, size
+            self._loaded[name] = None
+            self._evict(keep=name)
+        return model
+
+    def _evict(self, keep=None):
+        """Drop idle LRU models until the total fits the budget (caller holds _lock)."""
+        total = sum(self._entries[n].size for n in self._loaded)
+        evicted = False
+        for name in list(self._loaded):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[name]
+            if name == keep or entry.users:
+                continue
+            total -= entry.size
+            entry.model, entry.size = None, 0
+            del self._loaded[name]
+            evicted = True
+            counter("model_registry_evictions", model=name)
+        if evicted:
+            gc.collect()  # free the weights now, not at the next GC cycle
+
+    @contextmanager
+    def use(self, name):
+        """Exclusive, eviction-safe access to a model for the duration of a call."""
+        entry = self._entries[name]
+        with self._lock:
+            entry.users += 1   # pinned: not evicted while in use
+        try:
+            model = self.get(name)
+            with entry.use_lock:
+                yield model
+        finally:
+            with self._lock:
+                entry.users -= 1
+
+    def evict(self, name):
+        with self._lock:
+            entry = self._entries[name]
+            if entry.model is not None and not entry.users:
+                entry.model, entry.size = None, 0
+                self._loaded.pop(name, None)
+                gc.collect()
+
+    def warm(self, names=None, background=False):
+        """Load `names` (default: all registered) now, or in a daemon thread."""
+        names = list(self._entries) if names is None else list(names)
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Warm-up of {name} failed: {e}")
+                    counter("model_registry_warm_failures", model=name)
+
+        if background:
+            t = threading.Thread(target=run, name="model-warmup", daemon=True)
+            t.start()
+            return t
+        run()
+
+
+def hf_pipeline(registry, task, model, **kwargs):
+    """Register a Hugging Face pipeline under "<task>:<model>"; returns the name."""
+    def load():
+        from transformers import pipeline
+        return pipeline(task, model=model, **kwargs)
+    return registry.register(f"{task}:{model}", load)
+
+
+def translate_translator(registry, lang):
+    """Register a `translate.Translator` to `lang` under "translate:<lang>"."""
+    def load():
+        from translate import Translator
+        return Translator(to_lang=lang)
+    return registry.register(f"translate:{lang}", load)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry with the pipeline's standard models registered."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ModelRegistry()
+            hf_pipeline(_shared, "summarization", SUMMARIZER_MODEL)
+            hf_pipeline(_shared, "translation", TRANSLATOR_HI_MODEL)
+    return _shared
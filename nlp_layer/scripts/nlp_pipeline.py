@@ -1,53 +1,169 @@
 import os
+import sys
 import json
-from transformers import pipeline
+import argparse
+import hashlib
+from itertools import islice
+from model_cache import get_cache
+from model_registry import get_registry, SUMMARIZER, SUMMARIZER_MODEL, TRANSLATOR_HI, TRANSLATOR_HI_MODEL
+from corpus_store import compile_jsonl
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))  
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 INPUT_FILE = os.path.join(BASE_DIR, "data", "chunks.jsonl")
 OUTPUT_FILE = os.path.join(BASE_DIR, "data", "processed.jsonl")
+CHECKPOINT_FILE = os.path.join(BASE_DIR, "data", "processed.ckpt")  # completed "<id>\t<text hash>" lines
 
-# Load Hugging Face models
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-translator_hi = pipeline("translation", model="Helsinki-NLP/opus-mt-en-hi")  # Hindi example
+sys.path.append(os.path.dirname(BASE_DIR))  # repo root: shared instrumentation
+from instrumentation import counter, print_summary, span
 
-def main():
-    out = []
+# Chunks per model call (HF pipelines batch internally)
+BATCH_SIZE = 8
 
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+SUMMARY_KWARGS = dict(max_length=100, min_length=25, do_sample=False, truncation=True)
+TRANSLATE_KWARGS = dict(truncation=True)
+
+# Hugging Face models load on first cache miss (shared registry, RAM-bounded)
+models = get_registry()
+
+
+def iter_chunks(path):
+    """Yield chunk records one line at a time."""
+    with open(path, "r", encoding="utf-8") as f:
         for line in f:
-            record = json.loads(line)
-            text = record["text"]
+            if line.strip():
+                yield json.loads(line)
 
-            # Step 1: Summarize
-            try:
-                summary = summarizer(text, max_length=100, min_length=25, do_sample=False)[0]["summary_text"]
-            except Exception as e:
-                print(f"Summarization failed for {record['id']}: {e}")
-                summary = text[:300]  # fallback
 
-            # Step 2: Translate summary → Hindi
-            try:
-                translated = translator_hi(summary)[0]["translation_text"]
-            except Exception as e:
-                print(f"Translation failed for {record['id']}: {e}")
-                translated = summary
+def batched(iterable, n):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
 
-            record["summary_en"] = summary
-            record["summary_hi"] = translated
-            out.append(record)
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
 
-            for line_num, line in enumerate(f):
-                record = json.loads(line)
-                print(f"Processing chunk {line_num} - {record['id']}")
 
-    # Save processed file
+def load_checkpoint(current):
+    """
+    {id: text hash} of chunks still valid to skip. `current` maps each id in
+    chunks.jsonl to its text hash; a checkpointed id whose text changed since
+    (re-chunking keeps ids) is redone. The output is trimmed to the valid ids,
+    so a torn last write is redone too.
+    """
+    if not os.path.exists(CHECKPOINT_FILE):
+        open(OUTPUT_FILE, "w", encoding="utf-8").close()  # fresh run
+        return {}
+    done = {}
+    with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            rid, _, digest = line.rstrip("\n").partition("\t")
+            if rid and digest and current.get(rid) == digest:
+                done[rid] = digest
+    kept = {}
+    if os.path.exists(OUTPUT_FILE):
+        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                rid = rec.get("id")
+                if rid in done and text_hash(rec.get("text", "")) == done[rid]:
+                    kept[rid] = rec
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for rec in out:
+        for rec in kept.values():
             f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return {rid: done[rid] for rid in kept}
+
+
+def _run_batched(model_name, key, texts, batch_size, **kwargs):
+    """Outputs for texts (None where the model failed); one batched call first."""
+    with models.use(model_name) as model_fn:
+        try:
+            return [o[key] for o in model_fn(texts, batch_size=batch_size, **kwargs)]
+        except Exception as e:
+            print(f"Batch call failed ({e}); retrying one by one")
+            counter("model_batch_failures", key=key)
+        outs = []
+        for text in texts:
+            try:
+                outs.append(model_fn(text, **kwargs)[0][key])
+            except Exception as e:
+                print(f"Model call failed for {text[:40]!r}: {e}")
+                counter("model_call_failures", key=key)
+                outs.append(None)
+        return outs
+
+
+def summarize_batch(records, batch_size):
+    texts = [r["text"] for r in records]
+    # persistent output cache (opened on first use): re-runs only pay model cost for new text
+    summaries = get_cache().cached_call(
+        SUMMARIZER_MODEL, SUMMARY_KWARGS, texts,
+        lambda misses: _run_batched(SUMMARIZER, "summary_text", misses, batch_size, **SUMMARY_KWARGS))
+    # fallback for failures (not cached)
+    return [s if s is not None else t[:300] for s, t in zip(summaries, texts)]
+
+
+def translate_batch(records, summaries, batch_size):
+    translated = get_cache().cached_call(
+        TRANSLATOR_HI_MODEL, TRANSLATE_KWARGS, summaries,
+        lambda misses: _run_batched(TRANSLATOR_HI, "translation_text", misses, batch_size, **TRANSLATE_KWARGS))
+    return [t if t is not None else s for t, s in zip(translated, summaries)]
+
+
+def main(batch_size=BATCH_SIZE, restart=False):
+    if restart:
+        for path in (CHECKPOINT_FILE, OUTPUT_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+    current = {r["id"]: text_hash(r["text"]) for r in iter_chunks(INPUT_FILE)}
+    done = load_checkpoint(current)
+    if done:
+        print(f"Resuming: {len(done)} chunks already processed")
+
+    pending = (r for r in iter_chunks(INPUT_FILE) if done.get(r["id"]) != current[r["id"]])
+    n_new = 0
+
+    with open(OUTPUT_FILE, "a", encoding="utf-8") as out, \
+         open(CHECKPOINT_FILE, "a", encoding="utf-8") as ckpt:
+        for batch in batched(pending, batch_size):
+            # Step 1: Summarize, Step 2: Translate summary → Hindi
+            with span("summarize_batch"):
+                summaries = summarize_batch(batch, batch_size)
+            with span("translate_batch", lang="hi"):
+                translated = translate_batch(batch, summaries, batch_size)
+
+            for record, summary, hi in zip(batch, summaries, translated):
+                record["summary_en"] = summary
+                record["summary_hi"] = hi
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            # ids are checkpointed only after their records hit disk
+            ckpt.write("".join(f"{r['id']}\t{current[r['id']]}\n" for r in batch))
+            ckpt.flush()
+
+            n_new += len(batch)
+            counter("chunks_processed", len(batch))
+            print(f"Processed {len(done) + n_new} chunks (last: {batch[-1]['id']})")
 
-    print(f"✅ Processed {len(out)} chunks → {OUTPUT_FILE}")
+    print(f"✅ Processed {n_new} new chunks ({len(done)} resumed) → {OUTPUT_FILE}")
+    # memory-mapped copy served by the API (api/main2.py)
+    with span("corpus_compile"):
+        compile_jsonl(OUTPUT_FILE)
 
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Summarize + translate chunks.jsonl")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoint and start over")
+    args = parser.parse_args()
+    with span("nlp_pipeline"):
+        main(batch_size=args.batch_size, restart=args.restart)
+    print_summary()
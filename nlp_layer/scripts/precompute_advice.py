@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+from model_cache import get_cache
+from model_registry import get_registry, translate_translator, SUMMARIZER, SUMMARIZER_MODEL
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+INPUT_FILE = os.path.join(BASE_DIR, "data", "processed.jsonl")
+OUTPUT_FILE = os.path.join(BASE_DIR, "data", "advice.json")
+
+sys.path.append(os.path.dirname(BASE_DIR))  # repo root: shared instrumentation
+from instrumentation import counter, print_summary, span
+
+LANGUAGES = ["en", "hi"]
+MAX_CHUNKS = 3
+
+ADVICE_KWARGS = dict(max_length=150, min_length=50, do_sample=False)
+
+# Models load on first use (shared registry), so importing this module stays cheap
+models = get_registry()
+
+
+def corpus_version(path=INPUT_FILE):
+    """Content hash of the corpus; the artifact is stale when this changes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def load_records(path=INPUT_FILE):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def disease_keys(records):
+    return sorted({str(r["diseases"]).lower() for r in records if r.get("diseases")})
+
+
+def get_relevant_chunks(records, disease, max_chunks=MAX_CHUNKS):
+    relevant = []
+    disease_lower = disease.lower().strip()
+    for c in records:
+        d = str(c.get("diseases") or "").lower()
+        if disease_lower in d:  # use containment instead of exact match
+            relevant.append(c)
+        if len(relevant) >= max_chunks:
+            break
+    return relevant
+
+
+def summarize_chunks(chunks):
+    """English advice from chunk summaries (cached by content)."""
+    text = " ".join([str(c.get("summary_en") or c.get("text") or "") for c in chunks])
+    if len(text.split()) < 5:  # too short to summarize
+        return text
+    cache = get_cache()
+    summary = cache.get(SUMMARIZER_MODEL, ADVICE_KWARGS, text)
+    if summary is None:
+        try:
+            with span("advice_summarize"), models.use(SUMMARIZER) as summarizer:
+                summary = summarizer(text, **ADVICE_KWARGS)[0]["summary_text"]
+            cache.put(SUMMARIZER_MODEL, ADVICE_KWARGS, text, summary)
+        except Exception:
+            counter("advice_fallbacks", stage="summarize")
+            summary = text[:300]  # fallback
+    return summary
+
+
+def translate_advice(summary, lang):
+    if lang == "en":
+        return summary
+    cache = get_cache()
+    model = f"translate.Translator:{lang}"
+    translated = cache.get(model, {}, summary)
+    if translated is None:
+        try:
+            with span("advice_translate", lang=lang), \
+                    models.use(translate_translator(models, lang)) as translator:
+                translated = translator.translate(summary)
+            cache.put(model, {}, summary, translated)
+        except Exception:
+            counter("advice_fallbacks", stage="translate")
+            translated = summary  # fallback to English if translation fails
+    return translated
+
+
+def generate_advice(records, disease, lang):
+    chunks = get_relevant_chunks(records, disease)
+    if not chunks:
+        return None
+    return translate_advice(summarize_chunks(chunks), lang)
+
+
+def build_artifact(records, version, languages=LANGUAGES):
+    advice = {}
+    for disease in disease_keys(records):
+        summary = summarize_chunks(get_relevant_chunks(records, disease))
+        advice[disease] = {lang: translate_advice(summary, lang) for lang in languages}
+    return {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "languages": list(languages),
+        "advice": advice,
+    }
+
+
+def main(languages=LANGUAGES, force=False):
+    version = corpus_version()
+    if not force and os.path.exists(OUTPUT_FILE):
+        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        if old.get("version") == version and set(languages) <= set(old.get("languages", [])):
+            print(f"✅ Advice already up to date (corpus {version}) in {OUTPUT_FILE}")
+            return
+
+    artifact = build_artifact(load_records(), version, languages)
+    tmp = OUTPUT_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, OUTPUT_FILE)  # atomic swap so the API never reads a partial file
+    print(f"✅ Precomputed advice for {len(artifact['advice'])} diseases × "
+          f"{len(languages)} languages (corpus {version}) → {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute per-(disease, language) advice")
+    parser.add_argument("--languages", default=",".join(LANGUAGES))
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    with span("precompute_advice"):
+        main(languages=[l.strip() for l in args.languages.split(",") if l.strip()], force=args.force)
+    print_summary()
@@ -1,7 +1,9 @@
 import os
+import sys
 import json
-from transformers import pipeline
-from translate import Translator
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")))
+from precompute_advice import get_relevant_chunks, summarize_chunks, translate_advice
 
 # ----------------------------
 # Farmer input (simulate ML output)
@@ -26,54 +28,15 @@ if not os.path.exists(CHUNKS_FILE):
 
 nlp_chunks = [json.loads(line) for line in open(CHUNKS_FILE, "r", encoding="utf-8")]
 
-# ----------------------------
-# Initialize Hugging Face summarizer
-# ----------------------------
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-
-# Initialize translator
-translator = Translator(to_lang=lang)
-
-# ----------------------------
-# Helper functions
-# ----------------------------
-def get_relevant_chunks(disease, max_chunks=3):
-    relevant = []
-    disease_lower = disease.lower().strip()
-    for c in nlp_chunks:
-        d = str(c.get("diseases") or "").lower()
-        if disease_lower in d:  # use containment instead of exact match
-            relevant.append(c)
-        if len(relevant) >= max_chunks:
-            break
-    return relevant
-
-def generate_advice(chunks, target_lang="en"):
-    text = " ".join([str(c.get("summary_en") or c.get("text") or "") for c in chunks])
-    
-    if len(text.split()) < 5:  # too short to summarize
-        summary = text
-    else:
-        try:
-            summary = summarizer(text, max_length=150, min_length=50, do_sample=False)[0]["summary_text"]
-        except Exception:
-            summary = text[:300]  # fallback
-    
-    if target_lang != "en":
-        try:
-            summary = translator.translate(summary)
-        except Exception:
-            pass  # fallback to English if translation fails
-    return summary
-
 # ----------------------------
 # Dry run: generate advice
 # ----------------------------
-chunks = get_relevant_chunks(disease_label)
+# same cached summarize/translate path as scripts/precompute_advice.py
+chunks = get_relevant_chunks(nlp_chunks, disease_label)
 if not chunks:
     advice = "No relevant advice found for this disease."
 else:
-    advice = generate_advice(chunks, target_lang=lang)
+    advice = translate_advice(summarize_chunks(chunks), lang)
 
 response = {
     "farmer": farmer_name,
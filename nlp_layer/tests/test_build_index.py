@@ -0,0 +1,76 @@
+"""build_index incremental runs on a throwaway raw/ folder."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")))
+
+PyPDF2 = pytest.importorskip("PyPDF2")
+
+import build_index
+
+
+@pytest.fixture
+def layout(tmp_path, monkeypatch):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    for name in ("a", "b", "c"):
+        writer = PyPDF2.PdfWriter()
+        writer.add_blank_page(width=72, height=72)
+        with open(raw / f"{name}.pdf", "wb") as f:
+            writer.write(f)
+    monkeypatch.setattr(build_index, "RAW_DIR", str(raw))
+    monkeypatch.setattr(build_index, "OUTPUT_FILE", str(tmp_path / "sources.jsonl"))
+    monkeypatch.setattr(build_index, "MANIFEST_FILE", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(build_index, "MAX_WORKERS", 1)
+    return tmp_path
+
+
+def _ids(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["id"] for line in f if line.strip()]
+
+
+def test_missing_manifest_does_not_duplicate_records(layout):
+    build_index.main()
+    assert sorted(_ids(layout / "sources.jsonl")) == ["a", "b", "c"]
+
+    os.remove(layout / "manifest.json")  # gitignored: fresh clone / cleanup
+    build_index.main()
+    assert sorted(_ids(layout / "sources.jsonl")) == ["a", "b", "c"]
+
+
+def test_new_pdf_is_appended_once(layout):
+    build_index.main()
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    with open(layout / "raw" / "d.pdf", "wb") as f:
+        writer.write(f)
+    build_index.main()
+    build_index.main()
+    assert sorted(_ids(layout / "sources.jsonl")) == ["a", "b", "c", "d"]
+
+
+def test_unreadable_pdf_is_retried(layout):
+    (layout / "raw" / "b.pdf").write_bytes(b"not a pdf")
+    build_index.main()
+    assert sorted(_ids(layout / "sources.jsonl")) == ["a", "c"]
+    with open(layout / "manifest.json", "r", encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["a.pdf", "c.pdf"]
+
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    with open(layout / "raw" / "b.pdf", "wb") as f:
+        writer.write(f)
+    build_index.main()
+    assert sorted(_ids(layout / "sources.jsonl")) == ["a", "b", "c"]
+
+
+def test_deleted_output_is_rebuilt(layout):
+    build_index.main()
+    os.remove(layout / "sources.jsonl")
+    build_index.main()
+    assert sorted(_ids(layout / "sources.jsonl")) == ["a", "b", "c"]
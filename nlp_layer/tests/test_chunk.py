@@ -0,0 +1,53 @@
+"""chunk_text window checks."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")))
+
+from chunk import chunk_text
+
+
+def test_overlap_windows():
+    text = " ".join(f"w{i}" for i in range(10))
+    assert list(chunk_text(text, chunk_size=4, overlap=1)) == [
+        "w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+
+
+@pytest.mark.parametrize("chunk_size, overlap", [(4, 4), (4, 9), (4, -1), (0, 0)])
+def test_bad_window_raises(chunk_size, overlap):
+    with pytest.raises(ValueError):
+        chunk_text("a b c", chunk_size=chunk_size, overlap=overlap)
+
+
+def test_iter_chunks_streams_each_document(monkeypatch):
+    import instrumentation
+    import chunk
+
+    def chunk_text(text, **kwargs):
+        yield text + ":0"
+        raise RuntimeError("cut failed after the first chunk")
+
+    monkeypatch.setattr(chunk, "chunk_text", chunk_text)
+    instrumentation.reset()
+    rows = iter([{"id": "d", "title": "t", "text": "x"}])
+    records = chunk.iter_chunks(rows)
+    assert next(records)["text"] == "x:0"        # yielded before the generator finished
+    with pytest.raises(RuntimeError):
+        next(records)
+    assert instrumentation.summary()["counters"] == {"chunk_document_errors": 1, "chunks": 1}
+
+
+def test_iter_chunks_times_every_document():
+    import instrumentation
+    from chunk import iter_chunks
+
+    instrumentation.reset()
+    rows = [{"id": f"d{i}", "title": "t", "text": " ".join(["w"] * 9)} for i in range(3)]
+    out = list(iter_chunks(rows, chunk_size=4, overlap=1))
+    assert [r["id"] for r in out] == [f"d{i}_{k}" for i in range(3) for k in range(3)]
+    s = instrumentation.summary()
+    assert s["counters"]["chunks"] == 9
+    assert s["timings"]["chunk_document_seconds"]["count"] == 3
@@ -0,0 +1,78 @@
+"""nlp_pipeline --resume and the model output cache, with the model calls stubbed out."""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")))
+
+import model_cache
+import nlp_pipeline
+
+
+def _write(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return {r["id"]: r for r in map(json.loads, f)}
+
+
+def test_import_opens_no_cache():
+    assert model_cache._shared is None
+
+
+def test_batches_are_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_cache, "_shared", model_cache.ModelOutputCache(str(tmp_path / "cache.sqlite")))
+    calls = []
+
+    def run(model_name, key, texts, batch_size, **kwargs):
+        calls.append((key, list(texts)))
+        return [None if t == "fails" else f"{key}:{t}" for t in texts]
+
+    monkeypatch.setattr(nlp_pipeline, "_run_batched", run)
+    records = [{"text": "alpha"}, {"text": "fails"}]
+    summaries = nlp_pipeline.summarize_batch(records, 8)
+    assert summaries == ["summary_text:alpha", "fails"]
+    assert nlp_pipeline.translate_batch(records, summaries, 8) == \
+        ["translation_text:summary_text:alpha", "fails"]
+
+    calls.clear()
+    assert nlp_pipeline.summarize_batch(records + [{"text": "beta"}], 8) == \
+        ["summary_text:alpha", "fails", "summary_text:beta"]
+    assert calls == [("summary_text", ["fails", "beta"])]   # failures are not cached
+    assert os.path.exists(tmp_path / "cache.sqlite")
+
+
+def test_resume_redoes_rechunked_text(tmp_path, monkeypatch):
+    chunks = tmp_path / "chunks.jsonl"
+    monkeypatch.setattr(nlp_pipeline, "INPUT_FILE", str(chunks))
+    monkeypatch.setattr(nlp_pipeline, "OUTPUT_FILE", str(tmp_path / "processed.jsonl"))
+    monkeypatch.setattr(nlp_pipeline, "CHECKPOINT_FILE", str(tmp_path / "processed.ckpt"))
+    monkeypatch.setattr(nlp_pipeline, "compile_jsonl", lambda path: None)
+    calls = []
+
+    def summarize(records, batch_size):
+        calls.extend(r["id"] for r in records)
+        return ["sum:" + r["text"] for r in records]
+
+    monkeypatch.setattr(nlp_pipeline, "summarize_batch", summarize)
+    monkeypatch.setattr(nlp_pipeline, "translate_batch", lambda records, summaries, bs: summaries)
+
+    _write(chunks, [{"id": "d_0", "text": "alpha"}, {"id": "d_1", "text": "beta"}])
+    nlp_pipeline.main()
+    assert calls == ["d_0", "d_1"]
+
+    # re-chunked: same ids, d_1's text moved
+    _write(chunks, [{"id": "d_0", "text": "alpha"}, {"id": "d_1", "text": "beta gamma"}])
+    calls.clear()
+    nlp_pipeline.main()
+    assert calls == ["d_1"]
+    out = _read(tmp_path / "processed.jsonl")
+    assert out["d_0"]["summary_en"] == "sum:alpha"
+    assert out["d_1"]["summary_en"] == "sum:beta gamma"
+    with open(tmp_path / "processed.jsonl", "r", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
@@ -0,0 +1,90 @@
+"""main2.SearchIndex over a compiled corpus vs. the in-memory fallback."""
+
+import math
+import os
+import random
+import sys
+import tempfile
+from collections import Counter, defaultdict
+
+import pytest
+
+API_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+sys.path.insert(0, API_DIR)
+
+pytest.importorskip("fastapi")
+os.environ.setdefault("NLP_DATA_DIR", tempfile.mkdtemp())  # main2 loads its corpus at import
+
+import main2
+from corpus_store import CorpusStore, compile_corpus, tokenize
+
+WORDS = ["leaf", "spot", "blight", "fungicide", "copper", "water", "soil", "मिट्टी", "पत्ती", "rust"]
+DISEASES = ["Late Blight", "late blight", "Early Blight", "Leaf Rust", "", None]
+
+
+def _records(n=200, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        rec = {"id": f"doc_{i}", "title": f"t{i}",
+               "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 30)))}
+        if i % 7:
+            rec["diseases"] = rng.choice(DISEASES)
+        if i % 3:
+            rec["summary_en"] = " ".join(rng.choice(WORDS) for _ in range(5))
+        records.append(rec)
+    return records
+
+
+def _bm25(records, query, allowed=None):
+    """The dict-of-lists BM25 the API used before postings were compiled."""
+    postings, doc_len = defaultdict(list), []
+    for i, rec in enumerate(records):
+        tf = Counter(tokenize(rec.get("text", "")) + tokenize(rec.get("summary_en", "")))
+        doc_len.append(sum(tf.values()))
+        for term, n in tf.items():
+            postings[term].append((i, n))
+    avg_len = sum(doc_len) / len(records)
+    scores = defaultdict(float)
+    for term in set(tokenize(query)):
+        p = postings.get(term, [])
+        idf = math.log(1 + (len(records) - len(p) + 0.5) / (len(p) + 0.5))
+        for i, tf in p:
+            if allowed is None or i in allowed:
+                norm = main2.BM25_K1 * (1 - main2.BM25_B + main2.BM25_B * doc_len[i] / avg_len)
+                scores[i] += idf * tf * (main2.BM25_K1 + 1) / (tf + norm)
+    return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+@pytest.fixture
+def indexes(tmp_path):
+    records = _records()
+    compile_corpus(records, str(tmp_path / "processed.corpus"))
+    store = CorpusStore(str(tmp_path / "processed.corpus"))
+    return records, main2.SearchIndex(store), main2.SearchIndex(records)
+
+
+def test_diseases_match_fallback(indexes):
+    records, stored, memory = indexes
+    assert stored.disease_list == memory.disease_list == ["early blight", "late blight", "leaf rust"]
+    for q in ("blight", "late blight", "rust", "none", "zzz"):
+        expected = [i for i, r in enumerate(records) if q in str(r.get("diseases", "")).lower()]
+        assert stored.match_disease(q) == memory.match_disease(q) == expected
+
+
+@pytest.mark.parametrize("query", ["leaf spot", "copper fungicide water", "मिट्टी पत्ती", "unknown"])
+def test_search_matches_reference_bm25(indexes, query):
+    records, stored, memory = indexes
+    allowed = set(stored.match_disease("blight"))
+    for allow in (None, allowed):
+        expected = [(i, pytest.approx(s)) for i, s in _bm25(records, query, allow)[:10]]
+        assert stored.search(query, allowed=allow) == expected
+        assert memory.search(query, allowed=allow) == expected
+
+
+def test_compiled_index_decodes_no_records(indexes, monkeypatch):
+    store = indexes[1].records
+    monkeypatch.setattr(store, "field", lambda *a: pytest.fail("record decoded"))
+    index = main2.SearchIndex(store)
+    assert index.search("leaf blight")
+    assert index.match_disease("rust")
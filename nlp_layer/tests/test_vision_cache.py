@@ -0,0 +1,128 @@
+"""vision_api's near-duplicate prediction cache and cheap-first cascade, with the model stubbed out."""
+
+import base64
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")))
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import vision_api
+from image_hash import PredictionCache
+from leaf_cascade import FEATURE_NAMES, LeafCascade
+
+
+class _Classifier:
+    vocab = ["Healthy", "Late_Blight"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict_batch(self, images):
+        self.calls += len(images)
+        return np.tile([0.3, 0.7], (len(images), 1))
+
+
+def _leaf(spots):
+    rng = np.random.RandomState(1)
+    a = cv2.GaussianBlur(rng.randint(0, 255, (300, 400, 3)).astype(np.uint8), (0, 0), 5)
+    cv2.ellipse(a, (200, 150), (110, 70), 0, 0, 360, (40, 140, 40), -1)
+    for x, y in spots:
+        cv2.circle(a, (x, y), 6, (120, 70, 30), -1)
+    return a
+
+
+def _jpeg(a):
+    buf = io.BytesIO()
+    Image.fromarray(a).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    clf = _Classifier()
+    monkeypatch.setattr(vision_api, "classifier", clf)
+    monkeypatch.setattr(vision_api, "cascade", None)
+    monkeypatch.setattr(vision_api, "CASCADE_PATH", "")
+    monkeypatch.setattr(vision_api, "prediction_cache", PredictionCache(16, 8))
+    with TestClient(vision_api.app) as c:
+        yield c, clf
+
+
+def _predict(c, raw, heatmap):
+    r = c.post(f"/predict?heatmap={str(heatmap).lower()}", files={"file": ("leaf.jpg", raw)})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_cache_stores_prediction_only(client):
+    c, clf = client
+    first = _predict(c, _jpeg(_leaf([(150, 140)])), heatmap=True)
+    assert not first["cached"] and clf.calls == 1
+    (entry,) = vision_api.prediction_cache._entries.values()
+    assert set(entry) == set(vision_api.CACHED_KEYS)
+
+
+def test_near_duplicate_hit_draws_its_own_heatmap(client):
+    c, clf = client
+    original, near = _leaf([(150, 140)]), _leaf([(150, 140), (250, 160)])
+    first = _predict(c, _jpeg(original), heatmap=True)
+    hit = _predict(c, _jpeg(near), heatmap=True)
+    assert hit["cached"] and clf.calls == 1
+    assert hit["lesion_heatmap_png"] != first["lesion_heatmap_png"]
+    assert hit["label"] == "Late_Blight"
+
+    decoded = vision_api.decode_image(_jpeg(near))
+    expected = vision_api.lesion_fields(vision_api.prepare(decoded), True)
+    assert hit["lesion_heatmap_png"] == expected["lesion_heatmap_png"]
+    assert hit["lesion_box"] == expected["lesion_box"]
+    overlay = np.asarray(Image.open(io.BytesIO(base64.b64decode(hit["lesion_heatmap_png"]))))
+    assert overlay.shape == (vision_api.PREPROCESS_SIZE, vision_api.PREPROCESS_SIZE, 3)
+
+
+def test_hit_scores_lesions_on_the_upload(client):
+    c, clf = client
+    original, near = _leaf([(150, 140)]), _leaf([(150, 140), (250, 160), (120, 180)])
+    miss = _predict(c, _jpeg(original), heatmap=False)
+    hit = _predict(c, _jpeg(near), heatmap=False)
+    assert clf.calls == 1 and hit["cached"]
+    assert "lesion_heatmap_png" not in hit
+
+    expected = vision_api.lesion_fields(vision_api.prepare(vision_api.decode_image(_jpeg(near))), False)
+    assert hit["lesion_score"] == expected["lesion_score"] != miss["lesion_score"]
+
+
+def _cascade(threshold):
+    """A cascade that always predicts Late_Blight with p ~ 0.99."""
+    F = len(FEATURE_NAMES)
+    return LeafCascade(_Classifier.vocab, np.zeros(F), np.ones(F), np.zeros((F, 2)), [0.0, 5.0],
+                       [threshold, threshold])
+
+
+def test_confident_cascade_skips_the_cnn(client, monkeypatch):
+    c, clf = client
+    monkeypatch.setattr(vision_api, "cascade", _cascade(0.9))
+    out = _predict(c, _jpeg(_leaf([(150, 140)])), heatmap=False)
+    assert out["stage"] == "cascade" and out["label"] == "Late_Blight"
+    assert clf.calls == 0                        # predict_batch never ran
+    assert out["confidence"] == pytest.approx(1 / (1 + np.exp(-5)))
+    assert vision_api.cascade.exits == 1 and vision_api.cascade.escalations == 0
+    assert c.get("/health").json()["cascade"]["thresholds"] == {"Healthy": 0.9, "Late_Blight": 0.9}
+
+
+def test_uncertain_cascade_escalates(client, monkeypatch):
+    c, clf = client
+    monkeypatch.setattr(vision_api, "cascade", _cascade(float("inf")))
+    out = _predict(c, _jpeg(_leaf([(150, 140)])), heatmap=False)
+    assert out["stage"] == "cnn" and clf.calls == 1
+    assert vision_api.cascade.escalations == 1
+    assert c.get("/health").json()["cascade"]["thresholds"] == {"Healthy": None, "Late_Blight": None}
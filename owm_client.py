@@ -0,0 +1,222 @@
+# owm_client.py
+"""
+Async OpenWeatherMap 5-day/3-hour forecast client for the risk rules.
+  - one pooled aiohttp session shared by every request
+  - bounded concurrency (semaphore) + retry with exponential backoff
+  - in-process TTL cache keyed by city or rounded lat/lon; the default TTL
+    matches the 3-hour OWM forecast refresh
+  - optional on-disk cache (one JSON file per key) so restarts stay warm
+
+Usage:
+    async with OWMForecastClient(api_key) as client:
+        lists = await client.fetch_many(["Lucknow", (26.85, 80.95)])
+    # lists[key] is the OWM "list" or None if the fetch failed
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+try:
+    import aiohttp
+except ImportError:  # only needed when a client is actually opened
+    aiohttp = None
+
+OWM_FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
+OWM_REFRESH_SECONDS = 3 * 60 * 60   # OWM recomputes the 3-hourly forecast every 3 h
+
+Location = Union[str, Tuple[float, float]]
+
+# ---------------------------
+# Caches
+# ---------------------------
+
+def cache_key(location: Location) -> str:
+    """City names are case-folded; coordinates rounded to ~100 m."""
+    if isinstance(location, str):
+        return "q:" + location.strip().lower()
+    lat, lon = location
+    return f"ll:{float(lat):.3f},{float(lon):.3f}"
+
+class TTLCache:
+    """Small LRU dict whose entries expire `ttl` seconds after being stored."""
+
+    def __init__(self, ttl: float = OWM_REFRESH_SECONDS, max_entries: int = 10_000):
+        self.ttl, self.max_entries = ttl, max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str, now: float = None):
+        hit = self._data.get(key)
+        if hit is None:
+            return None
+        stored_at, value = hit
+        if (now or time.time()) - stored_at >= self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value, stored_at: float = None) -> None:
+        self._data[key] = (stored_at or time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class DiskCache:
+    """One JSON file per key: {"stored_at": epoch, "list": [...]}."""
+
+    def __init__(self, directory: str, ttl: float = OWM_REFRESH_SECONDS):
+        self.directory, self.ttl = directory, ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                blob = json.load(f)
+            stored_at, value = float(blob["stored_at"]), blob["list"]
+        except (OSError, ValueError, KeyError, TypeError):  # unreadable or malformed: a miss
+            return None
+        if time.time() - stored_at >= self.ttl:
+            return None
+        return stored_at, value
+
+    def put(self, key: str, value, stored_at: float) -> None:
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"stored_at": stored_at, "list": value}, f)
+        os.replace(tmp, path)
+
+# ---------------------------
+# Client
+# ---------------------------
+
+class OWMForecastClient:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = OWM_FORECAST_URL,
+        max_concurrency: int = 10,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        ttl: float = OWM_REFRESH_SECONDS,
+        cache_dir: str = None,
+    ):
+        self.api_key, self.base_url = api_key, base_url
+        self.max_concurrency, self.timeout = max_concurrency, timeout
+        self.retries, self.backoff = retries, backoff
+        self.cache = TTLCache(ttl)
+        self.disk = DiskCache(cache_dir, ttl) if cache_dir else None
+        self._session = None
+        self._sem = None
+        self._inflight: Dict[str, "asyncio.Future"] = {}   # concurrent misses share one request
+
+    async def __aenter__(self) -> "OWMForecastClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        if aiohttp is None:
+            raise ImportError("OWMForecastClient requires aiohttp (pip install aiohttp)")
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _params(self, location: Location) -> Dict[str, str]:
+        params = {"appid": self.api_key, "units": "metric"}
+        if isinstance(location, str):
+            params["q"] = location
+        else:
+            params["lat"], params["lon"] = str(location[0]), str(location[1])
+        return params
+
+    async def fetch(self, location: Location) -> List[Dict[str, Any]]:
+        """OWM forecast `list` for one location (cache → disk → network)."""
+        key = cache_key(location)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+        if self.disk is not None:
+            on_disk = self.disk.get(key)
+            if on_disk is not None:
+                stored_at, value = on_disk
+                self.cache.put(key, value, stored_at)
+                return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        task = asyncio.ensure_future(self._get_with_retry(location))
+        self._inflight[key] = task
+        try:
+            value = await task
+        finally:
+            self._inflight.pop(key, None)
+        now = time.time()
+        self.cache.put(key, value, now)
+        if self.disk is not None:
+            self.disk.put(key, value, now)
+        return value
+
+    async def _get_with_retry(self, location: Location) -> List[Dict[str, Any]]:
+        if self._session is None:
+            await self.open()
+        attempt = 0
+        while True:
+            try:
+                async with self._sem:
+                    async with self._session.get(self.base_url, params=self._params(location)) as resp:
+                        if resp.status == 429 or resp.status >= 500:
+                            raise _Retryable(f"HTTP {resp.status}")
+                        resp.raise_for_status()
+                        payload = await resp.json(content_type=None)
+                return payload.get("list", [])
+            except (_Retryable, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * (2 ** attempt) * (1 + random.random() * 0.1))
+                attempt += 1
+
+    async def fetch_many(self, locations: Iterable[Location]) -> Dict[Location, Optional[List[Dict[str, Any]]]]:
+        """Fetch all locations concurrently; failures map to None."""
+        locations = list(locations)
+        results = await asyncio.gather(*(self.fetch(loc) for loc in locations), return_exceptions=True)
+        return {
+            loc: (None if isinstance(res, BaseException) else res)
+            for loc, res in zip(locations, results)
+        }
+
+class _Retryable(Exception):
+    pass
+
+def fetch_forecasts(locations: Iterable[Location], api_key: str, **client_kwargs) -> Dict[Location, Optional[List[Dict[str, Any]]]]:
+    """Blocking wrapper around OWMForecastClient.fetch_many for scripts."""
+    async def _run():
+        async with OWMForecastClient(api_key, **client_kwargs) as client:
+            return await client.fetch_many(locations)
+    return asyncio.run(_run())
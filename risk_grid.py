@@ -0,0 +1,323 @@
+# risk_grid.py
+"""
+Regional risk maps: the risk_rules scores on a lat/lon grid, stored compactly.
+
+A bounding box is split into cells of `resolution` degrees; every cell's OWM
+forecast is scored in one vectorized pass (cells that share a forecast
+timeline are stacked and run through the columnar rules together), and the
+per-day, per-disease results are kept as uint8 arrays:
+
+  scores[day, disease, row, col]   0..100 risk_score (rounded), 255 = no data
+  bands[day, disease, row, col]    0 low / 1 medium / 2 high, 255 = no data
+
+The values match compute_daily_risks_from_owm on each cell's forecast (scores
+rounded to integers). For serving, space is cut into fixed tiles of
+`tile_deg` degrees. RiskTileCache computes a tile on first use and keeps it
+until the next OWM refresh, so a farm lookup is an array read:
+
+    tiles = RiskTileCache(fetch=lambda locs: fetch_forecasts(locs, api_key))
+    tiles.cell(26.85, 80.95)   # {"cell": [r, c], "per_day": [{"date", "risks"}, ...]}
+
+    python risk_grid.py --bbox 26.5 80.5 27.5 81.5 --resolution 0.1 --out .risk_tiles
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from risk_rules import DEFAULT_DISEASES, _COLUMNAR_RULES, _day_layout, _hours_per_bucket, _parse_columns
+from owm_client import OWM_REFRESH_SECONDS, TTLCache
+
+BANDS = ("low", "medium", "high")
+NO_DATA = 255
+
+TILE_DEG = 0.5       # tile edge (degrees)
+RESOLUTION = 0.1     # cell edge (degrees) ≈ 11 km; 25 OWM calls per default tile
+
+BBox = Tuple[float, float, float, float]   # lat_min, lon_min, lat_max, lon_max
+ForecastFetcher = Callable[[List[Tuple[float, float]]], Dict[Tuple[float, float], Optional[list]]]
+
+# ---------------------------
+# Grid geometry
+# ---------------------------
+
+class GridSpec:
+    """Cells of `resolution` degrees covering `bbox`, row 0 at lat_min."""
+
+    def __init__(self, bbox: BBox, resolution: float = RESOLUTION):
+        lat_min, lon_min, lat_max, lon_max = map(float, bbox)
+        if not (lat_min < lat_max and lon_min < lon_max) or resolution <= 0:
+            raise ValueError(f"Invalid grid: bbox={bbox}, resolution={resolution}")
+        self.bbox = (lat_min, lon_min, lat_max, lon_max)
+        self.resolution = float(resolution)
+        # tolerate float noise in (max - min) / resolution
+        self.shape = (max(1, math.ceil((lat_max - lat_min) / resolution - 1e-9)),
+                      max(1, math.ceil((lon_max - lon_min) / resolution - 1e-9)))
+
+    def centers(self) -> List[Tuple[float, float]]:
+        """Cell centres in row-major order (rounded like owm_client.cache_key)."""
+        lat_min, lon_min = self.bbox[:2]
+        ny, nx = self.shape
+        return [(round(lat_min + (r + 0.5) * self.resolution, 3),
+                 round(lon_min + (c + 0.5) * self.resolution, 3))
+                for r in range(ny) for c in range(nx)]
+
+    def cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        lat_min, lon_min, lat_max, lon_max = self.bbox
+        eps = 1e-9  # tile edges come from float multiplication
+        if not (lat_min - eps <= lat <= lat_max + eps and lon_min - eps <= lon <= lon_max + eps):
+            raise ValueError(f"({lat}, {lon}) is outside {self.bbox}")
+        ny, nx = self.shape
+        return (min(max(int((lat - lat_min) / self.resolution), 0), ny - 1),
+                min(max(int((lon - lon_min) / self.resolution), 0), nx - 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"bbox": list(self.bbox), "resolution": self.resolution, "shape": list(self.shape)}
+
+# ---------------------------
+# Vectorized scoring
+# ---------------------------
+
+def _score_group(cols_list: List[Dict[str, Any]], n_days: int, layout, diseases: List[str]) -> np.ndarray:
+    """Stacked cells with one timeline → risk_score float (cells × days × diseases)."""
+    cols = {k: np.stack([c[k] for c in cols_list]) for k in ("temp", "humidity", "rain", "wind")}
+    hrs = _hours_per_bucket({})
+    out = np.zeros((len(cols_list), n_days, len(diseases)))
+    for j, dis in enumerate(diseases):
+        cum = np.cumsum(_COLUMNAR_RULES[dis](cols, layout, hrs), axis=1)
+        # _minmax_scale per cell over the finite values
+        finite = np.isfinite(cum)
+        vmin = np.where(finite, cum, np.inf).min(axis=1, keepdims=True)
+        vmax = np.where(finite, cum, -np.inf).max(axis=1, keepdims=True)
+        flat = ~finite.any(axis=1, keepdims=True) | (np.abs(vmax - vmin) < 1e-9)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            risk = (cum - vmin) / (vmax - vmin) * 100.0
+        out[:, :, j] = np.where(flat, 0.0, risk)
+    return out
+
+def score_forecasts(
+    forecasts: Sequence[Optional[List[Dict[str, Any]]]],
+    diseases: List[str] = None
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    One forecast list per cell (None = fetch failed) → (days, scores, bands),
+    arrays shaped cells × days × diseases as uint8 (NO_DATA where missing).
+    """
+    diseases = diseases or DEFAULT_DISEASES
+    unknown = [d for d in diseases if d not in _COLUMNAR_RULES]
+    if unknown:
+        raise ValueError(f"Unknown diseases: {unknown}")
+
+    groups: Dict[tuple, List[int]] = {}
+    parsed = {}
+    for i, fl in enumerate(forecasts):
+        if not fl:
+            continue
+        days, cols = _parse_columns(fl)
+        parsed[i] = (days, cols)
+        groups.setdefault((tuple(days), cols["day"].tobytes()), []).append(i)
+
+    all_days = sorted({d for days, _ in parsed.values() for d in days})
+    day_pos = {d: k for k, d in enumerate(all_days)}
+    shape = (len(forecasts), len(all_days), len(diseases))
+    scores = np.full(shape, NO_DATA, np.uint8)
+    bands = np.full(shape, NO_DATA, np.uint8)
+    for (days, _), cells in groups.items():
+        cols_list = [parsed[i][1] for i in cells]
+        layout = _day_layout(cols_list[0]["day"], len(days))
+        risk = _score_group(cols_list, len(days), layout, diseases)
+        # same cut-offs as _pack_risks (NaN falls through to "high" there too)
+        band = np.where(risk < 33, 0, np.where(risk < 66, 1, 2)).astype(np.uint8)
+        score = np.where(np.isfinite(risk), np.rint(risk), NO_DATA).astype(np.uint8)
+        cols_idx = [day_pos[d] for d in days]
+        scores[np.ix_(cells, cols_idx)] = score
+        bands[np.ix_(cells, cols_idx)] = band
+    return all_days, scores, bands
+
+class RiskGrid:
+    """uint8 score/band arrays (days × diseases × rows × cols) for one GridSpec."""
+
+    def __init__(self, spec: GridSpec, days: List[str], diseases: List[str],
+                 scores: np.ndarray, bands: np.ndarray, computed_at: float = None):
+        self.spec, self.days, self.diseases = spec, days, diseases
+        self.scores, self.bands = scores, bands
+        self.computed_at = computed_at or time.time()
+
+    @property
+    def nbytes(self) -> int:
+        return self.scores.nbytes + self.bands.nbytes
+
+    def cell(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Per-day {disease: {risk_score, risk_band}} for the cell holding (lat, lon)."""
+        r, c = self.spec.cell_of(lat, lon)
+        s, b = self.scores[:, :, r, c], self.bands[:, :, r, c]
+        per_day = []
+        for k, day in enumerate(self.days):
+            risks = {dis: {"risk_score": int(s[k, j]), "risk_band": BANDS[b[k, j]]}
+                     for j, dis in enumerate(self.diseases) if s[k, j] != NO_DATA}
+            per_day.append({"date": day, "risks": risks})
+        return {"cell": [r, c], "per_day": per_day}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.spec.to_dict(),
+            "days": self.days,
+            "diseases": self.diseases,
+            "bands": list(BANDS),
+            "no_data": NO_DATA,
+            "computed_at": self.computed_at,
+            "scores": self.scores.tolist(),
+            "risk_bands": self.bands.tolist(),
+        }
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, scores=self.scores, bands=self.bands,
+                 meta=np.frombuffer(json.dumps({
+                     **self.spec.to_dict(), "days": self.days, "diseases": self.diseases,
+                     "computed_at": self.computed_at}).encode("utf-8"), np.uint8))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RiskGrid":
+        with np.load(path) as z:
+            meta = json.loads(z["meta"].tobytes())
+            return cls(GridSpec(meta["bbox"], meta["resolution"]), meta["days"], meta["diseases"],
+                       z["scores"], z["bands"], meta["computed_at"])
+
+def compute_risk_grid(
+    bbox: BBox,
+    fetch: ForecastFetcher,
+    resolution: float = RESOLUTION,
+    diseases: List[str] = None
+) -> RiskGrid:
+    """Fetch every cell centre's forecast and score the whole grid at once."""
+    spec = GridSpec(bbox, resolution)
+    centers = spec.centers()
+    forecasts = fetch(centers)
+    if not any(forecasts.get(c) for c in centers):
+        raise RuntimeError(f"No forecasts for any cell of {spec.bbox}")
+    days, scores, bands = score_forecasts([forecasts.get(c) for c in centers], diseases)
+    ny, nx = spec.shape
+    # cells × days × diseases → days × diseases × rows × cols
+    as_map = lambda a: np.ascontiguousarray(a.reshape(ny, nx, len(days), -1).transpose(2, 3, 0, 1))
+    return RiskGrid(spec, days, diseases or DEFAULT_DISEASES, as_map(scores), as_map(bands))
+
+# ---------------------------
+# Tile cache
+# ---------------------------
+
+def tile_of(lat: float, lon: float, tile_deg: float = TILE_DEG) -> Tuple[int, int]:
+    return math.floor(lat / tile_deg), math.floor(lon / tile_deg)
+
+def tile_bbox(tile: Tuple[int, int], tile_deg: float = TILE_DEG) -> BBox:
+    ty, tx = tile
+    return ty * tile_deg, tx * tile_deg, (ty + 1) * tile_deg, (tx + 1) * tile_deg
+
+class RiskTileCache:
+    """
+    Tiles of `tile_deg` degrees computed on demand and kept for `ttl` seconds
+    (the OWM refresh cycle). With `directory`, tiles are also written as .npz
+    so restarts and other workers reuse them until they expire.
+    """
+
+    def __init__(self, fetch: ForecastFetcher, tile_deg: float = TILE_DEG,
+                 resolution: float = RESOLUTION, diseases: List[str] = None,
+                 ttl: float = OWM_REFRESH_SECONDS, directory: str = None,
+                 max_tiles: int = 1024):
+        self.fetch, self.tile_deg, self.resolution = fetch, tile_deg, resolution
+        self.diseases = diseases or DEFAULT_DISEASES
+        self.ttl, self.directory = ttl, directory
+        self.tiles = TTLCache(ttl, max_tiles)
+        self._locks: Dict[Tuple[int, int], threading.Lock] = {}
+        self._guard = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, tile: Tuple[int, int]) -> str:
+        return os.path.join(self.directory, f"tile_{self.tile_deg:g}_{self.resolution:g}_{tile[0]}_{tile[1]}.npz")
+
+    def _key(self, tile: Tuple[int, int]) -> str:
+        return f"{tile[0]},{tile[1]}"
+
+    def cached(self, tile: Tuple[int, int]) -> bool:
+        """True when `tile` is in memory and fresh (a lookup will not fetch)."""
+        return self.tiles.get(self._key(tile)) is not None
+
+    def tile(self, tile: Tuple[int, int]) -> RiskGrid:
+        key = self._key(tile)
+        grid = self.tiles.get(key)
+        if grid is not None:
+            return grid
+        with self._guard:
+            lock = self._locks.setdefault(tile, threading.Lock())
+        with lock:  # concurrent misses for one tile compute it once
+            grid = self.tiles.get(key)
+            if grid is None:
+                grid = self._load_or_compute(tile)
+                self.tiles.put(key, grid, grid.computed_at)
+        return grid
+
+    def _load_or_compute(self, tile: Tuple[int, int]) -> RiskGrid:
+        if self.directory:
+            path = self._path(tile)
+            try:
+                grid = RiskGrid.load(path)
+                if time.time() - grid.computed_at < self.ttl and grid.diseases == self.diseases:
+                    return grid
+            except (OSError, ValueError, KeyError):
+                pass
+        grid = compute_risk_grid(tile_bbox(tile, self.tile_deg), self.fetch, self.resolution, self.diseases)
+        if self.directory:
+            grid.save(self._path(tile))
+        return grid
+
+    def tile_at(self, lat: float, lon: float) -> RiskGrid:
+        return self.tile(tile_of(lat, lon, self.tile_deg))
+
+    def cell(self, lat: float, lon: float) -> Dict[str, Any]:
+        return self.tile_at(lat, lon).cell(lat, lon)
+
+    def warm(self, bbox: BBox) -> List[Tuple[int, int]]:
+        """Compute every tile intersecting `bbox` (e.g. a district, on a schedule)."""
+        lat_min, lon_min, lat_max, lon_max = bbox
+        y0, x0 = tile_of(lat_min, lon_min, self.tile_deg)
+        y1, x1 = tile_of(lat_max, lon_max, self.tile_deg)
+        tiles = [(ty, tx) for ty in range(y0, y1 + 1) for tx in range(x0, x1 + 1)]
+        for t in tiles:
+            self.tile(t)
+        return tiles
+
+def owm_fetcher(api_key: str, **client_kwargs) -> ForecastFetcher:
+    """ForecastFetcher backed by owm_client (pooled, cached, retried)."""
+    from owm_client import fetch_forecasts
+
+    def fetch(locations: List[Tuple[float, float]]):
+        if not api_key:
+            raise RuntimeError("An OpenWeatherMap API key is required to compute risk tiles")
+        return fetch_forecasts(locations, api_key, **client_kwargs)
+    return fetch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute regional risk tiles from OWM forecasts")
+    parser.add_argument("--bbox", type=float, nargs=4, required=True, metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"))
+    parser.add_argument("--resolution", type=float, default=RESOLUTION)
+    parser.add_argument("--tile-deg", type=float, default=TILE_DEG)
+    parser.add_argument("--out", default=".risk_tiles")
+    parser.add_argument("--api-key", default=os.environ.get("OWM_API_KEY"))
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("--api-key or OWM_API_KEY is required")
+    cache = RiskTileCache(owm_fetcher(args.api_key, cache_dir=".owm_cache"), args.tile_deg,
+                          args.resolution, directory=args.out)
+    t0 = time.perf_counter()
+    tiles = cache.warm(tuple(args.bbox))
+    print(f"✅ {len(tiles)} tiles ({args.tile_deg:g}° at {args.resolution:g}°) in "
+          f"{time.perf_counter() - t0:.1f}s → {args.out}")
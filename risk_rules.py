@@ -18,7 +18,16 @@ Returns per-day:
 from __future__ import annotations
 from typing import Dict, List, Any, Tuple
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import bisect
 import math
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python rules still work without NumPy
+    np = None
 
 # ---------------------------
 # Helpers
@@ -166,21 +175,131 @@ def _daily_pest_index(day_rows: List[Dict[str, Any]]) -> float:
     gdd = max(0.0, avg_t - 12.0)  # base 12 °C
     return gdd + (1.0 if rain_sum >= 5.0 else 0.0)
 
+# ---------------------------
+# Columnar engine (NumPy)
+# ---------------------------
+# Same five rules as above, but forecasts are parsed once into flat arrays
+# and every disease is scored with array operations. Per-day sums are taken
+# with a row-ordered cumulative sum over a (days x buckets) grid so the
+# floating-point results are identical to the per-row loops.
+# On one ~40-bucket forecast the array calls cost more than the loops; the
+# engine pays off when many forecasts with the same timeline are stacked
+# (locations × buckets) and scored in one pass, as compute_daily_risks_batch
+# and risk_grid do.
+
+_EMPTY: Dict[str, Any] = {}
+
+def _parse_columns(forecast_list: List[Dict[str, Any]]) -> Tuple[List[str], Dict[str, Any]]:
+    """One pass over the OWM rows → sorted day keys + column arrays."""
+    nan = float("nan")
+    day_keys, temp, rh, rain, wind = [], [], [], [], []
+    for item in forecast_list:
+        # inlined _safe_get: this loop runs once per bucket of every location
+        dt_txt = item.get("dt_txt") or item.get("date")
+        day = dt_txt.split(" ")[0] if dt_txt and " " in dt_txt else dt_txt
+        if not day:
+            continue
+        main = item.get("main")
+        main = main if isinstance(main, dict) else _EMPTY
+        r = item.get("rain")
+        w = item.get("wind")
+        day_keys.append(day)
+        temp.append(float(main.get("temp", nan)))
+        rh.append(float(main.get("humidity", nan)))
+        rain.append(float((r.get("3h", 0.0) if isinstance(r, dict) else 0.0) or 0.0))
+        wind.append(float(w.get("speed", nan) if isinstance(w, dict) else nan))
+
+    days = sorted(set(day_keys))
+    pos = {d: i for i, d in enumerate(days)}
+    cols = {
+        "day": np.fromiter((pos[d] for d in day_keys), dtype=np.intp, count=len(day_keys)),
+        "temp": np.asarray(temp, dtype=np.float64),
+        "humidity": np.asarray(rh, dtype=np.float64),
+        "rain": np.asarray(rain, dtype=np.float64),
+        "wind": np.asarray(wind, dtype=np.float64),
+    }
+    return days, cols
+
+def _day_layout(day_idx, n_days: int):
+    """Scatter coordinates placing each row in its day's slot, in input order."""
+    order = np.argsort(day_idx, kind="stable")
+    d = day_idx[order]
+    counts = np.bincount(d, minlength=n_days)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    # column 0 stays 0.0 so the accumulation starts from zero like the loops
+    slot = np.arange(d.size) - starts[d] + 1
+    width = int(counts.max()) + 1 if d.size else 1
+    return order, d, slot, (n_days, width)
+
+def _day_sums(values, layout):
+    """Per-day sums over the last axis; leading axes (e.g. grid cells) share the layout."""
+    order, d, slot, shape = layout
+    grid = np.zeros(values.shape[:-1] + shape, dtype=np.float64)
+    grid[..., d, slot] = values[..., order]
+    return np.cumsum(grid, axis=-1)[..., -1]
+
+def _late_blight_dsv_np(cols, layout, hrs):
+    t, rh = cols["temp"], cols["humidity"]
+    fav = (t >= 18.0) & (t <= 24.0) & (rh >= 90.0)   # NaN compares False
+    hours = _day_sums(np.where(fav, hrs, 0.0), layout)
+    return np.select([hours >= 16, hours >= 12, hours >= 8, hours >= 4], [4, 3, 2, 1], 0)
+
+def _pday_response_np(t):
+    rising = (t - 10.0) / (27.0 - 10.0)
+    falling = (35.0 - t) / (35.0 - 27.0)
+    resp = np.where(t <= 27.0, rising, falling)
+    return np.where((t < 10.0) | (t > 35.0), 0.0, resp)
+
+def _early_blight_pdays_np(cols, layout, hrs):
+    t = cols["temp"]
+    units = np.where(np.isnan(t), 0.0, _pday_response_np(t) * hrs)
+    return _day_sums(units, layout)
+
+def _bacteria_points_np(cols, layout, hrs):
+    rh, rain = cols["humidity"], cols["rain"]
+    wet_row = (~np.isnan(rh) & (rh >= 90.0)) | (rain > 0.0)
+    wet = _day_sums(np.where(wet_row, hrs, 0.0), layout)
+    return np.select([wet >= 16, wet >= 12, wet >= 8], [3, 2, 1], 0)
+
+def _virus_vector_index_np(cols, layout, hrs):
+    t, w, rain = cols["temp"], cols["wind"], cols["rain"]
+    tf = np.where(t <= 25.0, (t - 15.0) / (25.0 - 15.0), (30.0 - t) / (30.0 - 25.0))
+    tf = np.where((t < 15.0) | (t > 30.0), 0.0, tf)
+    peak = 3.0
+    wf = np.maximum(0.0, 1.0 - np.abs(w - peak) / (peak))
+    wf = np.where((w < 0.5) | (w > 8.0), 0.0, wf)
+    rf = np.where(rain >= 2.0, 0.5, 1.0)
+    s = tf * wf * rf * hrs
+    return _day_sums(np.where(np.isnan(t) | np.isnan(w), 0.0, s), layout)
+
+def _pest_index_np(cols, layout, hrs):
+    t, rain = cols["temp"], cols["rain"]
+    ok = ~np.isnan(t)
+    sum_t = _day_sums(np.where(ok, t * hrs, 0.0), layout)
+    total_h = _day_sums(np.where(ok, hrs, 0.0), layout)
+    rain_sum = _day_sums(np.where(ok, rain, 0.0), layout)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gdd = np.maximum(0.0, sum_t / total_h - 12.0)
+    return np.where(total_h == 0.0, 0.0, gdd + np.where(rain_sum >= 5.0, 1.0, 0.0))
+
+_COLUMNAR_RULES = {
+    "Late blight": _late_blight_dsv_np,
+    "Early blight": _early_blight_pdays_np,
+    "Bacteria": _bacteria_points_np,
+    "Virus": _virus_vector_index_np,
+    "Pests": _pest_index_np,
+}
+
 # ---------------------------
 # Orchestrator over forecast days
 # ---------------------------
 
 DEFAULT_DISEASES = ["Late blight", "Early blight", "Bacteria", "Virus", "Pests"]
 
-def compute_daily_risks_from_owm(
+def _raw_indices_python(
     owm_forecast_list: List[Dict[str, Any]],
-    diseases: List[str] = None
-) -> Dict[str, Any]:
-    """
-    Input: list of 3h OWM forecast items. Output risk per day per disease.
-    - No ML labels required here; you can filter later using your image model result.
-    """
-    diseases = diseases or DEFAULT_DISEASES
+    diseases: List[str]
+) -> Tuple[List[str], Dict[str, list]]:
     by_day = _group_by_day(owm_forecast_list)
 
     days = list(by_day.keys())
@@ -199,16 +318,48 @@ def compute_daily_risks_from_owm(
             raw["Virus"].append(_daily_virus_vector_index(rows))
         if "Pests" in diseases:
             raw["Pests"].append(_daily_pest_index(rows))
+    return days, raw
 
-    # cumulative per disease across forecast window
-    cum = {}
-    for dis in diseases:
-        s = 0.0
-        cum_vals = []
-        for v in raw[dis]:
-            s += float(v)
-            cum_vals.append(s)
-        cum[dis] = cum_vals
+def _raw_indices_columnar(
+    forecast_lists: List[List[Dict[str, Any]]],
+    diseases: List[str]
+) -> List[Tuple[List[str], Dict[str, list]]]:
+    """(days, raw) per forecast; forecasts sharing a timeline are scored stacked."""
+    parsed = [_parse_columns(fl) for fl in forecast_lists]
+    groups: Dict[tuple, List[int]] = {}
+    for i, (days, cols) in enumerate(parsed):
+        groups.setdefault((tuple(days), cols["day"].tobytes()), []).append(i)
+
+    hrs = _hours_per_bucket({})
+    out = [None] * len(parsed)
+    for (days, _), idx in groups.items():
+        cols = {k: np.stack([parsed[i][1][k] for i in idx])
+                for k in ("temp", "humidity", "rain", "wind")}
+        layout = _day_layout(parsed[idx[0]][1]["day"], len(days))
+        scored = {dis: rule(cols, layout, hrs).tolist()
+                  for dis, rule in _COLUMNAR_RULES.items() if dis in diseases}
+        for row, i in enumerate(idx):
+            out[i] = (list(days), {dis: scored[dis][row] if dis in scored else [] for dis in diseases})
+    return out
+
+def _cumulate(vals: list, start: float = 0.0) -> List[float]:
+    s = start
+    cum_vals = []
+    for v in vals:
+        s += float(v)
+        cum_vals.append(s)
+    return cum_vals
+
+def _pack_risks(
+    days: List[str],
+    raw: Dict[str, list],
+    diseases: List[str],
+    cum: Dict[str, List[float]] = None
+) -> Dict[str, Any]:
+    """Raw daily indices → cumulative, 0–100 score, band, day-wise output."""
+    # cumulative per disease across forecast window (unless already kept)
+    if cum is None:
+        cum = {dis: _cumulate(raw[dis]) for dis in diseases}
 
     # normalized 0–100 risk per disease across the window
     risk = {dis: _minmax_scale(cum[dis]) for dis in diseases}
@@ -249,3 +400,243 @@ def compute_daily_risks_from_owm(
             "normalization": "Per-disease cumulative series min-max scaled to 0..100 over the forecast window",
         }
     }
+
+def compute_daily_risks_from_owm(
+    owm_forecast_list: List[Dict[str, Any]],
+    diseases: List[str] = None,
+    engine: str = "auto"
+) -> Dict[str, Any]:
+    """
+    Input: list of 3h OWM forecast items. Output risk per day per disease.
+    - No ML labels required here; you can filter later using your image model result.
+    - engine: "numpy" (columnar), "python" (per-row loops) or "auto"
+      (python: for a single forecast the loops are faster). Both produce
+      identical output (tests/test_risk_rules.py).
+    """
+    diseases = diseases or DEFAULT_DISEASES
+    if _columnar(engine, batch=False):
+        days, raw = _raw_indices_columnar([owm_forecast_list], diseases)[0]
+    else:
+        days, raw = _raw_indices_python(owm_forecast_list, diseases)
+    return _pack_risks(days, raw, diseases)
+
+def _columnar(engine: str, batch: bool) -> bool:
+    """Whether `engine` scores with NumPy; "auto" does so only for batches."""
+    if engine not in ("auto", "numpy", "python"):
+        raise ValueError(f"Unknown engine {engine!r}; use 'auto', 'numpy' or 'python'")
+    if engine == "numpy" and np is None:
+        raise ImportError("engine='numpy' requires NumPy")
+    return engine == "numpy" or (engine == "auto" and batch and np is not None)
+
+# ---------------------------
+# Batch scoring over many locations
+# ---------------------------
+
+BATCH_CHUNK_SIZE = 256       # locations per worker task
+BATCH_MIN_POOL_SIZE = 512    # below this, score in-process (no pool overhead)
+
+def _score_chunk(
+    chunk: List[Tuple[Any, List[Dict[str, Any]]]],
+    diseases: List[str],
+    engine: str
+) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+    if _columnar(engine, batch=True):
+        scored = _raw_indices_columnar([fl for _, fl in chunk], diseases)
+        return [(loc_id, _pack_risks(days, raw, diseases)["per_day"])
+                for (loc_id, _), (days, raw) in zip(chunk, scored)]
+    return [
+        (loc_id, compute_daily_risks_from_owm(fl, diseases, engine="python")["per_day"])
+        for loc_id, fl in chunk
+    ]
+
+def compute_daily_risks_batch(
+    forecasts: Dict[Any, List[Dict[str, Any]]],
+    diseases: List[str] = None,
+    engine: str = "auto",
+    max_workers: int = None,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    min_pool_size: int = BATCH_MIN_POOL_SIZE
+) -> Dict[Any, List[Dict[str, Any]]]:
+    """
+    Input: {location_id: OWM forecast list}. Output {location_id: per_day}.
+    - Batches of at least `min_pool_size` locations are split into chunks of
+      `chunk_size` and scored on a process pool (`max_workers`, default: all
+      cores); smaller batches run in-process.
+    - Results keep the input's location order.
+    - engine "auto" (with NumPy) stacks each chunk's forecasts and scores
+      them in one array pass per disease.
+    """
+    diseases = diseases or DEFAULT_DISEASES
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+    items = list(forecasts.items())
+    workers = max_workers or os.cpu_count() or 1
+
+    if len(items) < min_pool_size or workers == 1:
+        return dict(_score_chunk(items, diseases, engine))
+
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    out = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        futures = [pool.submit(_score_chunk, ch, diseases, engine) for ch in chunks]
+        for fut in futures:
+            out.update(fut.result())
+    return out
+
+# ---------------------------
+# Streaming accumulator for rolling forecast updates
+# ---------------------------
+
+_DAILY_RULES = {
+    "Late blight": _daily_late_blight_dsv,
+    "Early blight": _daily_early_blight_pdays,
+    "Bacteria": _daily_bacteria_points,
+    "Virus": _daily_virus_vector_index,
+    "Pests": _daily_pest_index,
+}
+
+_STATE_MAGIC = b"RRA1"
+_SLOT_FMT = struct.Struct("<4d")   # temp, humidity, rain, wind
+
+def _compact_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the fields the rules read, already converted to float."""
+    return {
+        "main": {
+            "temp": float(_safe_get(item, ["main","temp"], float("nan"))),
+            "humidity": float(_safe_get(item, ["main","humidity"], float("nan"))),
+        },
+        "rain": {"3h": float(_safe_get(item, ["rain","3h"], 0.0) or 0.0)},
+        "wind": {"speed": float(_safe_get(item, ["wind","speed"], float("nan")))},
+    }
+
+class RiskAccumulator:
+    """
+    Stateful risk scoring for one location, fed forecast buckets as they arrive.
+    - Buckets are keyed by their full `dt_txt` ("YYYY-MM-DD HH:MM:SS");
+      re-sending a slot replaces it. Rows with only a day (`date`) have no
+      slot to replace and are appended.
+    - A day's rows are scored in time order (untimed rows after the timed
+      ones, in arrival order), whatever order they were ingested in.
+    - Each ingest re-scores only the days it touched and re-accumulates the
+      cumulative series from the first touched day onward.
+    - result() returns the same dict as compute_daily_risks_from_owm over the
+      current buckets; to_bytes()/from_bytes() persist the state compactly.
+    """
+
+    def __init__(self, diseases: List[str] = None):
+        self.diseases = list(diseases or DEFAULT_DISEASES)
+        self._slots = {}   # day -> {dt_txt or arrival number: compact row}
+        self._seq = 0      # arrival number for rows without a timestamp
+        self._days = []    # sorted day keys
+        self._raw = {dis: [] for dis in self.diseases}
+        self._cum = {dis: [] for dis in self.diseases}
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self._slots.values())
+
+    @property
+    def days(self) -> List[str]:
+        return list(self._days)
+
+    def ingest(self, items) -> List[str]:
+        """Add one OWM item or a list of them. Returns the days that changed."""
+        if isinstance(items, dict):
+            items = [items]
+        changed = set()
+        for item in items:
+            dt_txt = _safe_get(item, ["dt_txt"], None) or _safe_get(item, ["date"], None)
+            timed = bool(dt_txt) and " " in dt_txt
+            day = dt_txt.split(" ")[0] if timed else dt_txt
+            if not day:
+                continue
+            if not timed:
+                self._seq += 1
+            self._put(day, dt_txt if timed else self._seq, _compact_row(item))
+            changed.add(day)
+        self._refresh(changed)
+        return sorted(changed)
+
+    def drop_days_before(self, day: str) -> None:
+        """Forget days older than `day` (rolling window)."""
+        k = bisect.bisect_left(self._days, day)
+        if k == 0:
+            return
+        for old in self._days[:k]:
+            del self._slots[old]
+        del self._days[:k]
+        for dis in self.diseases:
+            del self._raw[dis][:k]
+            self._cum[dis] = _cumulate(self._raw[dis])
+
+    def result(self) -> Dict[str, Any]:
+        return _pack_risks(list(self._days), self._raw, self.diseases, cum=self._cum)
+
+    def _rows(self, day: str) -> List[Tuple[Any, Dict[str, Any]]]:
+        """(key, row) of a day: timed rows by dt_txt, then untimed ones by arrival."""
+        return sorted(self._slots[day].items(), key=lambda kv: (isinstance(kv[0], int), kv[0]))
+
+    def _put(self, day: str, key, row: Dict[str, Any]) -> None:
+        if day not in self._slots:
+            k = bisect.bisect_left(self._days, day)
+            self._days.insert(k, day)
+            self._slots[day] = {}
+            for dis in self.diseases:
+                self._raw[dis].insert(k, 0)
+        self._slots[day][key] = row
+
+    def _refresh(self, changed) -> None:
+        if not changed:
+            return
+        first = None
+        for day in changed:
+            k = bisect.bisect_left(self._days, day)
+            rows = [row for _, row in self._rows(day)]
+            for dis in self.diseases:
+                rule = _DAILY_RULES.get(dis)
+                if rule is not None:
+                    self._raw[dis][k] = rule(rows)
+            first = k if first is None else min(first, k)
+        for dis in self.diseases:
+            cum = self._cum[dis][:first]
+            cum += _cumulate(self._raw[dis][first:], cum[-1] if cum else 0.0)
+            self._cum[dis] = cum
+
+    # --- persistence ---
+
+    def to_bytes(self) -> bytes:
+        parts = [_STATE_MAGIC, _pack_str("\x1f".join(self.diseases))]
+        slots = [(day, key, row) for day in self._days for key, row in self._rows(day)]
+        parts.append(struct.pack("<I", len(slots)))
+        for day, key, row in slots:
+            parts.append(_pack_str(day if isinstance(key, int) else key))  # untimed: the bare day
+            parts.append(_SLOT_FMT.pack(row["main"]["temp"], row["main"]["humidity"],
+                                        row["rain"]["3h"], row["wind"]["speed"]))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "RiskAccumulator":
+        if blob[:4] != _STATE_MAGIC:
+            raise ValueError("Not a RiskAccumulator state blob")
+        pos = 4
+        names, pos = _unpack_str(blob, pos)
+        acc = cls(names.split("\x1f") if names else None)
+        (n,) = struct.unpack_from("<I", blob, pos)
+        pos += 4
+        items = []
+        for _ in range(n):
+            key, pos = _unpack_str(blob, pos)
+            t, rh, rain, w = _SLOT_FMT.unpack_from(blob, pos)
+            pos += _SLOT_FMT.size
+            items.append({"dt_txt" if " " in key else "date": key, "main": {"temp": t, "humidity": rh},
+                          "rain": {"3h": rain}, "wind": {"speed": w}})
+        acc.ingest(items)
+        return acc
+
+def _pack_str(s: str) -> bytes:
+    b = s.encode("utf-8")
+    return struct.pack("<H", len(b)) + b
+
+def _unpack_str(blob: bytes, pos: int) -> Tuple[str, int]:
+    (n,) = struct.unpack_from("<H", blob, pos)
+    pos += 2
+    return blob[pos:pos + n].decode("utf-8"), pos + n
@@ -0,0 +1,91 @@
+"""backtest on a small synthetic archive: rule parity, alert scoring and sweeps."""
+
+import math
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+
+import backtest
+from risk_rules import DEFAULT_DISEASES, compute_daily_risks_from_owm
+
+HIDDEN = {"t_min": 17.0, "t_max": 24.0, "rh_min": 88.0}
+
+
+@pytest.fixture(scope="module")
+def archive(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("archive"))
+    path = backtest.synthetic_archive(directory, n_locations=40, years=2, seed=0)
+    return directory, backtest.load_outbreaks(path, "Late blight")
+
+
+def _owm_rows(weather, s, start):
+    """One season of archive series `s` as OWM forecast rows."""
+    rows = []
+    days, steps = weather["temp"].shape[1:]
+    for d in range(days):
+        for k in range(steps):
+            when = start + timedelta(days=d)
+            rows.append({"dt_txt": f"{when.isoformat()} {3 * k:02d}:00:00",
+                         "main": {"temp": weather["temp"][s, d, k], "humidity": weather["humidity"][s, d, k]},
+                         "rain": {"3h": weather["rain"][s, d, k]},
+                         "wind": {"speed": weather["wind"][s, d, k]}})
+    return rows
+
+
+def test_default_params_match_risk_rules(archive):
+    directory, outbreaks = archive
+    series = [(o["location"], o["season_start"]) for o in outbreaks[:4]]
+    weather = backtest.WeatherArchive(directory).seasons(series, days=30)
+    assert np.isnan(weather["temp"]).any()  # gaps are skipped like the per-row loops
+    for s, (_, start) in enumerate(series):
+        per_day = compute_daily_risks_from_owm(_owm_rows(weather, s, start), engine="python")["per_day"]
+        for dis in DEFAULT_DISEASES:
+            expected = [day["risks"][dis]["daily_index"] for day in per_day]
+            got = backtest.daily_indices(weather, dis, backtest.DEFAULT_PARAMS[dis])[s]
+            assert got.tolist() == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+
+def test_first_crossing():
+    cum = np.array([[0, 2, 5, 9, 9], [1, 1, 1, 1, 1], [7, 8, 9, 10, 11]], dtype=np.float64)
+    assert backtest.first_crossing(cum, [5, 9, 20]).tolist() == [[2, 3, -1], [-1, -1, -1], [0, 2, -1]]
+
+
+def test_score_alerts():
+    alert_day = np.array([[10, 12], [-1, 30], [5, -1], [40, 41]])
+    outbreak_day = np.array([20, 31, -1, 20])
+    stats = backtest.score_alerts(alert_day, outbreak_day, max_lead=9)
+    # thr 0: hit (lead 10 > 9 → miss), -, false alarm, late → miss
+    # thr 1: hit (lead 8), hit (lead 1), -, late → miss
+    assert stats["hits"].tolist() == [0, 2]
+    assert stats["misses"].tolist() == [3, 1]
+    assert stats["false_alarms"].tolist() == [1, 0]
+    assert stats["csi"].tolist() == [0.0, pytest.approx(2 / 3)]
+    assert stats["far"].tolist() == [1.0, 0.0]
+    assert stats["mean_lead_days"].tolist() == [0.0, 4.5]
+
+
+@pytest.mark.parametrize("pool", [False, True])
+def test_sweep_recovers_hidden_rule(archive, pool):
+    directory, outbreaks = archive
+    grid = {"t_min": [16.0, 17.0, 18.0], "t_max": [24.0, 26.0], "rh_min": [85.0, 88.0, 92.0]}
+    kwargs = {"min_pool_size": 1, "max_workers": 2, "chunk_size": 5} if pool else {"min_pool_size": 10 ** 9}
+    rows = backtest.sweep(directory, outbreaks, "Late blight", grid, thresholds=[9, 12, 15], **kwargs)
+    assert len(rows) == 18 * 3
+    best = rows[0]
+    assert best["params"] == HIDDEN and best["alert_threshold"] == 12.0
+    assert best["csi"] > rows[1]["csi"] and not math.isnan(best["mean_lead_days"])
+
+
+def test_sweep_pool_matches_in_process(archive):
+    directory, outbreaks = archive
+    grid = {"rh_min": [86.0, 88.0, 90.0], "t_min": [17.0, 18.0]}
+    one = backtest.sweep(directory, outbreaks, "Late blight", grid, min_pool_size=10 ** 9)
+    many = backtest.sweep(directory, outbreaks, "Late blight", grid, min_pool_size=1,
+                          max_workers=2, chunk_size=2)
+    assert many == one
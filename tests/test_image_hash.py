@@ -0,0 +1,105 @@
+"""image_hash: multi-index Hamming search, duplicate groups and dedup_files against brute force."""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("cv2")
+
+from image_hash import HammingIndex, dedup_files, duplicate_groups, hamming
+
+
+def _hashes(n=400, seed=0):
+    """Random 64-bit hashes, many with near copies (a few bits flipped) and exact repeats."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        if out and rng.random() < 0.5:
+            h = rng.choice(out)
+            for _ in range(rng.randint(0, 7)):
+                h ^= 1 << rng.randrange(64)
+        else:
+            h = rng.getrandbits(64)
+        out.append(h)
+    return out
+
+
+def _components(hashes, radius):
+    """Brute-force connected components of "within radius" (size >= 2)."""
+    seen, groups = set(), []
+    for i in range(len(hashes)):
+        if i in seen:
+            continue
+        comp, stack = {i}, [i]
+        while stack:
+            k = stack.pop()
+            for j, h in enumerate(hashes):
+                if j not in comp and hamming(hashes[k], h) <= radius:
+                    comp.add(j)
+                    stack.append(j)
+        seen |= comp
+        if len(comp) > 1:
+            groups.append(sorted(comp))
+    return groups
+
+
+@pytest.mark.parametrize("radius", [0, 2, 4, 6])
+def test_search_matches_brute_force(radius):
+    hashes = _hashes()
+    index = HammingIndex(radius)
+    for i, h in enumerate(hashes):
+        index.add(h, i)
+    assert len(index) == len(hashes)
+    rng = random.Random(1)
+    queries = hashes[::7] + [h ^ (1 << rng.randrange(64)) for h in hashes[::11]]
+    for q in queries:
+        for r in range(radius + 1):
+            got = index.search(q, r)
+            assert sorted(got) == sorted((hamming(q, h), i) for i, h in enumerate(hashes)
+                                         if hamming(q, h) <= r)
+            assert [d for d, _ in got] == sorted(d for d, _ in got)
+    with pytest.raises(ValueError):
+        index.search(hashes[0], radius + 1)
+
+
+def test_remove_matches_brute_force():
+    hashes = _hashes(200, seed=2)
+    index = HammingIndex(4)
+    for i, h in enumerate(hashes):
+        index.add(h, i)
+    kept = dict(enumerate(hashes))
+    for i in random.Random(3).sample(range(len(hashes)), 120):
+        assert index.remove(hashes[i], i)
+        del kept[i]
+    assert not index.remove(hashes[0], -1)
+    assert len(index) == len(kept)
+    for q in hashes:
+        assert sorted(index.search(q)) == sorted((hamming(q, h), i) for i, h in kept.items()
+                                                 if hamming(q, h) <= 4)
+
+
+@pytest.mark.parametrize("radius", [0, 3, 5])
+def test_duplicate_groups_match_brute_force(radius):
+    hashes = _hashes(300, seed=4)
+    assert sorted(duplicate_groups(hashes, radius)) == _components(hashes, radius)
+
+
+@pytest.mark.parametrize("drop_conflicts", [True, False])
+def test_dedup_files_matches_brute_force(drop_conflicts):
+    hashes = _hashes(300, seed=5)
+    rng = random.Random(6)
+    files = [os.path.join("Data", rng.choice(["Healthy", "Late_Blight", "Early_Blight"]), f"{i}.jpg")
+             for i in range(len(hashes))]
+    drop = set()
+    for g in _components(hashes, 4):
+        if drop_conflicts and len({os.path.basename(os.path.dirname(files[i])) for i in g}) > 1:
+            drop.update(g)
+        else:
+            drop.update(g[1:])
+    expected = [p for i, p in enumerate(files) if i not in drop]
+    assert dedup_files(files, hashes, 4, drop_conflicts) == expected
+    assert len(expected) < len(files)
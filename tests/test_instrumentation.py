@@ -0,0 +1,161 @@
+"""instrumentation: recording, quantiles, worker snapshots, Prometheus export and /metrics."""
+
+import os
+import pickle
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation as metrics
+from instrumentation import Histogram, counter, observe, span, timed, timed_iter
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    was = metrics.enabled()
+    metrics.set_enabled(True)
+    metrics.reset()
+    yield
+    metrics.reset()
+    metrics.set_enabled(was)
+
+
+def test_counters_and_histograms():
+    counter("pdfs")
+    counter("pdfs", 2)
+    counter("leaf_transform", stage="CLAHE", outcome="high std")
+    observe("wait_seconds", 0.2, buckets=(0.1, 1.0))
+    observe("wait_seconds", 3.0, buckets=(0.1, 1.0))
+    with span("work", kind="a"):
+        pass
+    with pytest.raises(KeyError):
+        with span("work", kind="a"):
+            raise KeyError
+
+    @timed("fn")
+    def fn(x):
+        return x * 2
+    assert fn(3) == 6
+
+    s = metrics.summary()
+    assert s["counters"] == {"leaf_transform{outcome=high std,stage=CLAHE}": 1, "pdfs": 3,
+                             "work_errors{kind=a}": 1}
+    assert s["timings"]["wait_seconds"]["count"] == 2
+    assert s["timings"]["wait_seconds"]["total"] == pytest.approx(3.2)
+    assert s["timings"]["work_seconds{kind=a}"]["count"] == 2
+    assert s["timings"]["fn_seconds"]["count"] == 1
+
+
+def test_quantile():
+    h = Histogram((1, 2, 5))
+    assert h.quantile(0.5) == 0.0
+    for v in (0.5, 1.5, 1.5, 4, 10):
+        h.add(v)
+    assert h.counts == [1, 2, 1, 1]
+    assert h.quantile(0.2) == 1
+    assert h.quantile(0.5) == 2
+    assert h.quantile(0.8) == 5
+    assert h.quantile(0.9) == h.quantile(1.0) == 10       # +Inf bucket: the max
+    h = Histogram((1, 2))
+    h.add(0.3)
+    assert h.quantile(0.5) == 0.3                          # clamped to the max seen
+
+
+def test_snapshot_merge_round_trip():
+    counter("pages", 5, worker="1")
+    observe("extract_seconds", 0.02)
+    observe("extract_seconds", 0.3)
+    before = metrics.summary()
+    snap = pickle.loads(pickle.dumps(metrics.snapshot()))  # crosses a process boundary
+    assert metrics.summary() == {"counters": {}, "timings": {}}
+
+    metrics.merge(snap)
+    assert metrics.summary() == before
+    metrics.merge(snap)
+    after = metrics.summary()
+    assert after["counters"]["pages{worker=1}"] == 10
+    t = after["timings"]["extract_seconds"]
+    assert (t["count"], t["min"], t["max"]) == (4, 0.02, 0.3)
+    assert t["total"] == pytest.approx(0.64)
+
+
+def test_prometheus_text():
+    counter("http.requests", path="/a")
+    counter("http.requests", path="/b")
+    counter("odd", msg='say "hi"\\now\n')
+    for v in (0.2, 0.7, 3.0):
+        observe("lat_seconds", v, buckets=(0.5, 1.0))
+    lines = metrics.prometheus_text().splitlines()
+
+    assert lines.count("# TYPE http_requests_total counter") == 1
+    assert 'http_requests_total{path="/a"} 1' in lines
+    assert 'odd_total{msg="say \\"hi\\"\\\\now\\n"} 1' in lines
+    assert "# TYPE lat_seconds histogram" in lines
+    i = lines.index("# TYPE lat_seconds histogram")
+    assert lines[i + 1:i + 6] == [
+        'lat_seconds_bucket{le="0.5"} 1',
+        'lat_seconds_bucket{le="1"} 2',                    # cumulative
+        'lat_seconds_bucket{le="+Inf"} 3',
+        "lat_seconds_sum 3.9",
+        "lat_seconds_count 3",
+    ]
+
+
+def test_disabled_is_a_no_op(capsys):
+    metrics.set_enabled(False)
+    counter("c")
+    observe("h", 1.0)
+    assert span("s") is span("t")                          # the shared null span
+    with span("s"):
+        pass
+    assert timed("f")(lambda: 7)() == 7
+    assert list(timed_iter("g", iter([1, 2]))) == [1, 2]
+    metrics.print_summary()
+    assert capsys.readouterr().out == ""
+    metrics.set_enabled(True)
+    assert metrics.summary() == {"counters": {}, "timings": {}}
+
+
+def test_timed_iter_excludes_consumer_time():
+    def produce():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+
+    for _ in timed_iter("gen", produce()):
+        time.sleep(0.05)
+    t = metrics.summary()["timings"]["gen_seconds"]
+    assert t["count"] == 1 and 0.03 <= t["total"] < 0.1
+
+    def broken():
+        yield 1
+        raise ValueError
+    with pytest.raises(ValueError):
+        list(timed_iter("gen", broken()))
+    assert metrics.summary()["counters"] == {"gen_errors": 1}
+
+
+def test_metrics_endpoint():
+    pytest.importorskip("fastapi")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    metrics.install_fastapi(app)
+
+    @app.get("/items/{item}")
+    def item(item: int):
+        return {"item": item}
+
+    client = TestClient(app)
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/x").status_code == 422
+    r = client.get("/metrics")
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = r.text.splitlines()
+    assert 'http_requests_total{method="GET",path="/items/{item}",status="200"} 1' in body
+    assert 'http_requests_total{method="GET",path="/items/{item}",status="422"} 1' in body
+    assert 'http_request_seconds_count{method="GET",path="/items/{item}"} 2' in body
@@ -0,0 +1,76 @@
+"""leaf_cascade threshold calibration and its JSON artifact."""
+
+import json
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from leaf_cascade import FEATURE_NAMES, LeafCascade, calibrate_thresholds
+
+
+def _probs(conf, classes):
+    """Rows predicting `classes` with confidence `conf` over three classes."""
+    probs = np.zeros((len(conf), 3))
+    for i, (p, c) in enumerate(zip(conf, classes)):
+        probs[i] = (1 - p) / 2
+        probs[i, c] = p
+    return probs
+
+
+def test_tied_confidences_are_admitted_together():
+    # class 0 exits: 0.95 right, then a 0.9 tie of one right and one wrong answer
+    probs = _probs([0.95, 0.9, 0.9, 0.8], [0, 0, 0, 0])
+    y = np.array([0, 0, 1, 0])
+    assert calibrate_thresholds(probs, y, target=1.0, min_support=1)[0] == 0.95
+    assert calibrate_thresholds(probs, y, target=0.75, min_support=1)[0] == 0.8
+
+
+def test_min_support():
+    probs = _probs([0.99, 0.97, 0.95, 0.9, 0.85], [1] * 5)
+    y = np.array([1, 1, 1, 2, 1])
+    assert calibrate_thresholds(probs, y, target=1.0, min_support=2)[1] == 0.95
+    assert calibrate_thresholds(probs, y, target=1.0, min_support=3)[1] == 0.95
+    assert calibrate_thresholds(probs, y, target=1.0, min_support=4)[1] == math.inf
+    assert calibrate_thresholds(probs, y, target=0.8, min_support=5)[1] == 0.85
+
+
+def test_classes_that_never_exit_are_inf():
+    probs = _probs([0.9, 0.8, 0.7], [0, 0, 1])
+    y = np.array([0, 0, 2])                       # class 1 is never right, class 2 never predicted
+    assert calibrate_thresholds(probs, y, target=0.9, min_support=1) == [0.8, math.inf, math.inf]
+
+
+def test_save_load_round_trip(tmp_path):
+    rng = np.random.RandomState(0)
+    F = len(FEATURE_NAMES)
+    cascade = LeafCascade(["Healthy", "Late_Blight", "Not_a_leaf"], rng.rand(F), rng.rand(F) + 0.5,
+                          rng.randn(F, 3), rng.randn(3), [0.9, math.inf, 0.75], meta={"target": 0.98})
+    path = cascade.save(str(tmp_path / "cascade.json"))
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f)["thresholds"] == [0.9, None, 0.75]
+
+    loaded = LeafCascade.load(path)
+    assert loaded.vocab == cascade.vocab and loaded.meta == cascade.meta
+    assert loaded.thresholds.tolist() == [0.9, math.inf, 0.75]
+    X = rng.rand(5, F)
+    assert np.array_equal(loaded.predict_proba(X), cascade.predict_proba(X))
+    probs = cascade.predict_proba(X)
+    assert np.array_equal(loaded.confident(probs), cascade.confident(probs))
+
+
+def test_load_rejects_other_features(tmp_path):
+    F = len(FEATURE_NAMES)
+    cascade = LeafCascade(["a", "b"], np.zeros(F), np.ones(F), np.zeros((F, 2)), np.zeros(2), [0.5, 0.5])
+    d = cascade.to_dict()
+    d["features"] = d["features"][:-1]
+    path = tmp_path / "old.json"
+    path.write_text(json.dumps(d))
+    with pytest.raises(ValueError):
+        LeafCascade.load(str(path))
@@ -0,0 +1,69 @@
+"""fused_preprocess against the five stage functions chained like the notebook's transforms."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from leaf_transforms import (clahe_contrast, fused_preprocess, gray_world_wb, leaf_mask_refine,
+                             resize_square, smart_lesion_crop, suppress_skin_bg)
+
+SIZE = 256
+
+
+def _leaf(seed, h=480, w=640):
+    """Green leaf with lesions on a blurred, color-cast background."""
+    rng = np.random.RandomState(seed)
+    a = cv2.GaussianBlur(rng.randint(60, 200, (h, w, 3)).astype(np.uint8), (0, 0), 9)
+    a[:, :, 2] = np.clip(a[:, :, 2].astype(int) + rng.randint(-40, 40), 0, 255)
+    cx, cy = w // 2 + rng.randint(-40, 40), h // 2 + rng.randint(-30, 30)
+    cv2.ellipse(a, (cx, cy), (int(w * .33), int(h * .3)), rng.randint(0, 180), 0, 360, (50, 150, 45), -1)
+    for _ in range(rng.randint(2, 8)):
+        cv2.circle(a, (cx + rng.randint(-120, 120), cy + rng.randint(-80, 80)), rng.randint(5, 18),
+                   (120, 70, 30), -1)
+    return np.clip(a.astype(int) + rng.randint(-12, 12, a.shape), 0, 255).astype(np.uint8)
+
+
+def _no_leaf(seed):
+    rng = np.random.RandomState(seed)
+    return np.clip(np.full((480, 640, 3), (185, 160, 140)) + rng.randint(-20, 20, (480, 640, 3)),
+                   0, 255).astype(np.uint8)
+
+
+def _chained(a):
+    """GrayWorldWB → LeafMaskRefine → SuppressSkinAndBG → SmartLesionCrop → CLAHEContrast at p=1,
+    each followed by Resize(SIZE) with the leaf mask carried along."""
+    reasons = {}
+    a, reasons["GrayWorldWB"] = gray_world_wb(a)
+    a = resize_square(a, SIZE)
+    a, mask, reasons["LeafMaskRefine"] = leaf_mask_refine(a)
+    a = resize_square(a, SIZE)
+    mask = resize_square(mask, SIZE, mask=True) if mask is not None else None
+    a, mask, reasons["SuppressSkinAndBG"] = suppress_skin_bg(a, mask)
+    crop, box, reasons["SmartLesionCrop"] = smart_lesion_crop(a, mask)
+    if box is not None and mask is not None:
+        x0, y0, x1, y1 = box
+        mask = resize_square(mask[y0:y1, x0:x1], SIZE, mask=True)
+    a, reasons["CLAHEContrast"] = clahe_contrast(resize_square(crop, SIZE))
+    mask = mask if mask is not None else np.zeros((SIZE, SIZE), np.uint8)
+    return {"image": resize_square(a, SIZE), "leaf_mask": mask, "reasons": reasons}
+
+
+@pytest.mark.parametrize("image", [_leaf(s) for s in range(6)] + [_no_leaf(0)])
+def test_fused_matches_chained_stages(image):
+    fused, chained = fused_preprocess(image, SIZE), _chained(image)
+    assert fused["reasons"] == chained["reasons"]   # every stage takes the same branch
+    assert fused["image"].shape == chained["image"].shape == (SIZE, SIZE, 3)
+    diff = np.abs(fused["image"].astype(np.int16) - chained["image"]).mean()
+    assert diff < 2.0                               # 0.6-1.0 / 255 on these leaves
+
+    f, c = fused["leaf_mask"] > 0, chained["leaf_mask"] > 0
+    if chained["reasons"]["LeafMaskRefine"] is None:
+        assert (f & c).sum() / (f | c).sum() > 0.99
+    else:
+        assert not f.any() and not c.any()
@@ -0,0 +1,114 @@
+"""owm_client against a local stand-in for the OWM forecast endpoint."""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("aiohttp")
+
+import demo_risk_rules
+from owm_client import DiskCache, OWMForecastClient, cache_key
+
+FORECAST = [{"dt_txt": "2025-09-04 00:00:00", "main": {"temp": 30, "humidity": 85},
+             "wind": {"speed": 2}, "rain": {"3h": 0.0}}]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # q=<city> picks the behaviour: "flaky" → 503 twice, then 200; "missing" → 404
+    def do_GET(self):
+        city = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        server = self.server
+        with server.lock:
+            server.hits[city] = server.hits.get(city, 0) + 1
+            n = server.hits[city]
+        if city == "missing":
+            self._reply(404, {"cod": "404", "message": "city not found"})
+        elif city == "flaky" and n <= 2:
+            self._reply(503, {"message": "unavailable"})
+        else:
+            self._reply(200, {"cod": "200", "list": FORECAST})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def owm():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.hits, server.lock = {}, threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/data/2.5/forecast"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _fetch_many(url, locations, **kwargs):
+    async def run():
+        async with OWMForecastClient("test-key", base_url=url, backoff=0.01, **kwargs) as client:
+            return await client.fetch_many(locations)
+    return asyncio.run(run())
+
+
+def test_retries_on_503(owm):
+    assert _fetch_many(owm.url, ["flaky"]) == {"flaky": FORECAST}
+    assert owm.hits["flaky"] == 3
+
+
+def test_404_is_none_without_retry(owm):
+    assert _fetch_many(owm.url, ["missing"]) == {"missing": None}
+    assert owm.hits["missing"] == 1
+
+
+def test_ttl_cache_hit(owm):
+    async def run():
+        async with OWMForecastClient("test-key", base_url=owm.url) as client:
+            first = await client.fetch("Lucknow")
+            second, third = await asyncio.gather(client.fetch("lucknow "), client.fetch("LUCKNOW"))
+            return first, second, third
+    first, second, third = asyncio.run(run())
+    assert first == second == third == FORECAST
+    assert owm.hits["Lucknow"] == 1
+
+
+def test_disk_cache_survives_restart(owm, tmp_path):
+    assert _fetch_many(owm.url, ["Delhi"], cache_dir=str(tmp_path)) == {"Delhi": FORECAST}
+    # a fresh client (new process) is served from disk, not the network
+    assert _fetch_many(owm.url, ["Delhi"], cache_dir=str(tmp_path)) == {"Delhi": FORECAST}
+    assert owm.hits["Delhi"] == 1
+
+
+def test_malformed_disk_entry_is_a_miss(tmp_path):
+    disk = DiskCache(str(tmp_path))
+    for blob in ({"stored_at": 1e12}, ["not", "a", "dict"], {"list": []}):
+        with open(disk._path(cache_key("Pune")), "w", encoding="utf-8") as f:
+            json.dump(blob, f)
+        assert disk.get(cache_key("Pune")) is None
+
+
+def test_sample_forecast_fallback(owm, monkeypatch):
+    import owm_client
+    monkeypatch.setattr(demo_risk_rules, "fetch_forecasts",
+                        lambda cities, key, **kw: owm_client.fetch_forecasts(
+                            cities, key, base_url=owm.url, backoff=0.01, **kw))
+    forecasts = demo_risk_rules.forecasts_with_fallback(["Lucknow", "missing"], "test-key")
+    assert forecasts == {"Lucknow": FORECAST, "missing": demo_risk_rules.sample_forecast}
+    assert demo_risk_rules.forecasts_with_fallback(["Lucknow"], "") == \
+        {"Lucknow": demo_risk_rules.sample_forecast}
@@ -0,0 +1,162 @@
+"""risk_grid scoring and tile cache, and the risk_api endpoints, with a fake OWM fetcher."""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+np = pytest.importorskip("numpy")
+
+import risk_grid
+from risk_grid import BANDS, NO_DATA, RiskTileCache, score_forecasts, tile_bbox, tile_of
+from risk_rules import DEFAULT_DISEASES, compute_daily_risks_from_owm
+
+
+def _forecast(seed, start_hour=0):
+    """40 three-hourly buckets; some lack humidity, rain or wind."""
+    rng = random.Random(seed)
+    rows = []
+    for k in range(start_hour // 3, start_hour // 3 + 40):
+        row = {"dt_txt": f"2025-09-{4 + k // 8:02d} {3 * (k % 8):02d}:00:00",
+               "main": {"temp": rng.uniform(12, 34), "humidity": rng.uniform(55, 100)},
+               "wind": {"speed": rng.uniform(0, 9)}}
+        if rng.random() < 0.4:
+            row["rain"] = {"3h": rng.uniform(0, 5)}
+        p = rng.random()
+        if p < 0.15:
+            del row["main"]["humidity"]
+        elif p < 0.2:
+            del row["wind"]
+        rows.append(row)
+    return rows
+
+
+class FakeFetcher:
+    def __init__(self, fail=False):
+        self.calls, self.fail = 0, fail
+
+    def __call__(self, locations):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("OWM unavailable")
+        return {loc: _forecast(hash(loc)) for loc in locations}
+
+
+class Clock:
+    def __init__(self, monkeypatch):
+        self.now = time.time()
+        monkeypatch.setattr(time, "time", lambda: self.now)
+
+
+def test_score_forecasts_matches_risk_rules():
+    forecasts = [_forecast(i, start_hour=random.Random(i).choice([0, 0, 9])) for i in range(30)]
+    forecasts[4] = None                                   # failed fetch
+    for row in forecasts[7]:
+        row.pop("rain", None)                             # no rain at all
+        row["main"].pop("humidity", None)                 # no humidity at all
+    days, scores, bands = score_forecasts(forecasts)
+    for i, fl in enumerate(forecasts):
+        if fl is None:
+            assert (scores[i] == NO_DATA).all() and (bands[i] == NO_DATA).all()
+            continue
+        per_day = compute_daily_risks_from_owm(fl, engine="python")["per_day"]
+        for day in per_day:
+            k = days.index(day["date"])
+            for j, dis in enumerate(DEFAULT_DISEASES):
+                r = day["risks"][dis]
+                assert scores[i, k, j] == round(r["risk_score"])
+                assert BANDS[bands[i, k, j]] == r["risk_band"]
+        missing = [k for k, d in enumerate(days) if d not in {x["date"] for x in per_day}]
+        assert (scores[i, missing] == NO_DATA).all()
+
+
+def test_tile_cache_hit_and_ttl(monkeypatch):
+    clock = Clock(monkeypatch)
+    fetch = FakeFetcher()
+    tiles = RiskTileCache(fetch, ttl=600)
+    tile = tile_of(26.85, 80.95)
+    assert not tiles.cached(tile)
+    first = tiles.cell(26.85, 80.95)
+    assert fetch.calls == 1 and tiles.cached(tile)
+    assert tiles.cell(26.86, 80.96) == first and fetch.calls == 1   # same tile: array read
+
+    clock.now += 601
+    assert not tiles.cached(tile)
+    tiles.cell(26.85, 80.95)
+    assert fetch.calls == 2
+
+
+def test_tile_cache_reloads_from_directory(monkeypatch, tmp_path):
+    clock = Clock(monkeypatch)
+    fetch = FakeFetcher()
+    tiles = RiskTileCache(fetch, ttl=600, directory=str(tmp_path))
+    grid = tiles.tile_at(26.85, 80.95)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    restarted = RiskTileCache(fetch, ttl=600, directory=str(tmp_path))
+    again = restarted.tile_at(26.85, 80.95)
+    assert fetch.calls == 1
+    assert again.days == grid.days and np.array_equal(again.scores, grid.scores)
+    assert np.array_equal(again.bands, grid.bands)
+
+    clock.now += 601                                      # stale file: recompute
+    RiskTileCache(fetch, ttl=600, directory=str(tmp_path)).tile_at(26.85, 80.95)
+    assert fetch.calls == 2
+
+
+def test_tile_matches_cell_forecast():
+    tiles = RiskTileCache(FakeFetcher())
+    lat, lon = 26.85, 80.95
+    cell = tiles.cell(lat, lon)
+    spec = risk_grid.GridSpec(tile_bbox(tile_of(lat, lon)))
+    center = spec.centers()[cell["cell"][0] * spec.shape[1] + cell["cell"][1]]
+    expected = compute_daily_risks_from_owm(_forecast(hash(center)), engine="python")["per_day"]
+    assert [d["date"] for d in cell["per_day"]] == [d["date"] for d in expected]
+    for got, want in zip(cell["per_day"], expected):
+        for dis in DEFAULT_DISEASES:
+            assert got["risks"][dis]["risk_score"] == round(want["risks"][dis]["risk_score"])
+
+
+@pytest.fixture
+def api(monkeypatch):
+    pytest.importorskip("fastapi")
+    os.environ.setdefault("RISK_TILE_DIR", tempfile.mkdtemp())
+    sys.path.insert(0, os.path.join(REPO_DIR, "nlp_layer", "api"))
+    import risk_api
+    from fastapi.testclient import TestClient
+
+    def use(fetch):
+        monkeypatch.setattr(risk_api, "tiles", RiskTileCache(fetch))
+        return TestClient(risk_api.app)
+    return use
+
+
+def test_risk_endpoints(api):
+    fetch = FakeFetcher()
+    client = api(fetch)
+    cell = client.get("/risk/cell", params={"lat": 26.85, "lon": 80.95})
+    assert cell.status_code == 200
+    body = cell.json()
+    assert body["tile"] == list(tile_of(26.85, 80.95))
+    assert len(body["per_day"]) == 5 and set(body["per_day"][1]["risks"]) == set(DEFAULT_DISEASES)
+
+    tile = client.get("/risk/tile", params={"lat": 26.9, "lon": 80.6}).json()
+    assert fetch.calls == 1                                 # same tile, served from memory
+    ny, nx = tile["shape"]
+    assert np.asarray(tile["scores"]).shape == (len(tile["days"]), len(DEFAULT_DISEASES), ny, nx)
+
+    assert client.get("/risk/cell", params={"lat": 95, "lon": 0}).status_code == 422
+
+
+def test_risk_endpoints_report_fetch_failure(api):
+    client = api(FakeFetcher(fail=True))
+    for path in ("/risk/cell", "/risk/tile"):
+        r = client.get(path, params={"lat": 26.85, "lon": 80.95})
+        assert r.status_code == 502
+        assert "OWM unavailable" in r.json()["detail"]
@@ -0,0 +1,106 @@
+"""risk_rules: the streaming accumulator against the one-shot scorer."""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from risk_rules import RiskAccumulator, compute_daily_risks_batch, compute_daily_risks_from_owm
+
+
+def _forecast(days=5, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for d in range(days):
+        for h in range(0, 24, 3):
+            row = {"dt_txt": f"2025-09-{4 + d:02d} {h:02d}:00:00",
+                   "main": {"temp": rng.uniform(12, 32), "humidity": rng.uniform(60, 100)},
+                   "wind": {"speed": rng.uniform(0, 9)}}
+            if rng.random() < 0.4:
+                row["rain"] = {"3h": rng.uniform(0, 6)}
+            rows.append(row)
+    return rows
+
+
+def _ragged(seed):
+    """Forecast with gaps: missing fields, rain=None, late start, a date-only row."""
+    rng = random.Random(seed)
+    rows = _forecast(days=rng.randint(1, 6), seed=seed)[rng.randint(0, 7):]
+    for row in rows:
+        k = rng.random()
+        if k < 0.1:
+            del row["main"]["humidity"]
+        elif k < 0.15:
+            del row["wind"]
+        elif k < 0.2:
+            row["rain"] = {"3h": None}
+        elif k < 0.25:
+            row["main"]["temp"] = rng.choice([18.0, 24.0, 27.0, 35.0])  # rule edges
+    if rows and rng.random() < 0.3:
+        rows.append(_favorable(rows[-1]["dt_txt"].split(" ")[0]))
+    return rows
+
+
+def _favorable(date):
+    return {"date": date, "main": {"temp": 20.0, "humidity": 95.0}, "wind": {"speed": 3.0}}
+
+
+def test_date_only_rows_are_all_kept():
+    rows = [_favorable("2025-09-04") for _ in range(6)]
+    expected = compute_daily_risks_from_owm(rows, engine="python")
+    assert expected["per_day"][0]["risks"]["Late blight"]["daily_index"] == 4
+
+    acc = RiskAccumulator()
+    acc.ingest(rows)
+    assert len(acc) == 6
+    assert acc.result() == expected
+
+
+def test_shuffled_ingest_matches_one_shot():
+    rows = _forecast()
+    expected = compute_daily_risks_from_owm(rows, engine="python")
+    shuffled = list(rows)
+    random.Random(1).shuffle(shuffled)
+
+    acc = RiskAccumulator()
+    for i in range(0, len(shuffled), 7):
+        acc.ingest(shuffled[i:i + 7])
+    assert acc.result() == expected  # exact: rows are summed in time order
+
+
+def test_resent_slot_replaces_and_state_round_trips():
+    rows = _forecast(days=3)
+    acc = RiskAccumulator()
+    acc.ingest(rows)
+    acc.ingest(dict(rows[4], main={"temp": 21.0, "humidity": 99.0}))
+    acc.ingest([_favorable("2025-09-06"), _favorable("2025-09-06")])
+    assert len(acc) == len(rows) + 2
+
+    updated = list(rows)
+    updated[4] = dict(rows[4], main={"temp": 21.0, "humidity": 99.0})
+    expected = compute_daily_risks_from_owm(updated + [_favorable("2025-09-06")] * 2, engine="python")
+    assert acc.result() == expected
+
+    restored = RiskAccumulator.from_bytes(acc.to_bytes())
+    assert len(restored) == len(acc)
+    assert restored.result() == expected
+
+
+def test_numpy_engine_matches_python():
+    pytest.importorskip("numpy")
+    forecasts = {f"loc{i}": _ragged(i) for i in range(60)}
+    for fl in forecasts.values():
+        assert compute_daily_risks_from_owm(fl, engine="numpy") == \
+            compute_daily_risks_from_owm(fl, engine="python")
+    expected = compute_daily_risks_batch(forecasts, engine="python")
+    assert compute_daily_risks_batch(forecasts, engine="numpy") == expected
+    assert compute_daily_risks_batch(forecasts, engine="auto") == expected
+    assert list(compute_daily_risks_batch(forecasts, engine="auto")) == list(forecasts)
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        compute_daily_risks_from_owm(_forecast(days=1), engine="gpu")